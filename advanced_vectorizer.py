@@ -1,4 +1,6 @@
 import os
+import sys
+import argparse
 import cv2
 import numpy as np
 import torch
@@ -8,6 +10,7 @@ from typing import List, Dict, Tuple
 import glob
 from tqdm import tqdm
 from vector_db import ChromaVectorDB
+from index_registry import CURRENT_FILE, new_version_name, publish_version
 
 class ImageVectorizer:
     """使用预训练的视觉模型进行图像向量化"""
@@ -68,13 +71,29 @@ class ImageVectorizer:
 
 
 def build_advanced_vector_database(images_dir: str = "images", 
-                                   model_name: str = "google/vit-base-patch16-224"):
-    """构建高级向量数据库"""
+                                   model_name: str = "google/vit-base-patch16-224",
+                                   db_path: str = "./chroma_db",
+                                   versioned: bool = False,
+                                   publish: bool = True,
+                                   hnsw_params: Dict | None = None):
+    """构建高级向量数据库
+
+    versioned=True 时构建到 db_path 下新的版本目录（如 v20250101-120000），完成后写入 CURRENT 发布；
+    运行中的服务通过 POST /admin/reload、SIGHUP 或 INDEX_WATCH_INTERVAL 切换到新版本，不中断服务。
+    hnsw_params: 新集合的 HNSW 参数（见 vector_db.HNSW_PARAMS），记录在集合元数据中。
+    """
     print("=== 构建高级汉字图像向量数据库 ===")
     
     # 初始化组件
     vectorizer = ImageVectorizer(model_name)
-    vector_db = ChromaVectorDB()
+    version = None
+    if versioned:
+        version = new_version_name()
+        print(f"构建新版本: {os.path.join(db_path, version)}")
+        vector_db = ChromaVectorDB(db_path=os.path.join(db_path, version), allow_memory_fallback=False,
+                                   hnsw_params=hnsw_params)
+    else:
+        vector_db = ChromaVectorDB(db_path=db_path, hnsw_params=hnsw_params)
     
     # 获取所有图像文件
     image_paths = glob.glob(os.path.join(images_dir, "*.png"))
@@ -89,11 +108,7 @@ def build_advanced_vector_database(images_dir: str = "images",
             return vector_db, vectorizer
         
         # 清空现有数据
-        vector_db.client.delete_collection(vector_db.collection_name)
-        vector_db.collection = vector_db.client.create_collection(
-            name=vector_db.collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        vector_db.recreate_collection()
     
     # 批量处理图像
     batch_size = 100
@@ -131,8 +146,35 @@ def build_advanced_vector_database(images_dir: str = "images",
             vector_db.add_images(batch_paths[:len(batch_vectors)], batch_vectors, batch_metadatas)
     
     print(f"向量数据库构建完成！共处理 {vector_db.get_stats()['total_images']} 张图片")
+    print(f"HNSW 参数: {vector_db.hnsw_config()}")
+    if version is not None:
+        if publish:
+            publish_version(db_path, version)
+            print(f"已发布版本 {version}（{os.path.join(db_path, 'CURRENT')}）")
+        else:
+            print(f"未发布：确认后将 {version} 写入 {os.path.join(db_path, 'CURRENT')} 即可发布")
     return vector_db, vectorizer
 
+def update_search_ef(db_path: str, ef_search: int) -> int:
+    """把已有集合的 ef_search 写入集合配置（不重新构建）；返回进程退出码
+
+    API 的 HNSW_EF_SEARCH 只在进程内多取候选，不改动集合；要调低检索宽度、或让其他工具也使用新值，
+    在部署前运行本函数。版本目录发布后不可修改，版本化索引请用 --versioned 构建新版本。
+    """
+    if os.path.isfile(os.path.join(db_path, CURRENT_FILE)) or \
+            os.path.isfile(os.path.join(os.path.dirname(os.path.abspath(db_path)), CURRENT_FILE)):
+        print(f"错误: {db_path} 是版本化索引，发布后的版本不可修改；请用 --versioned --hnsw-search-ef 构建新版本。")
+        return 2
+    if not os.path.isfile(os.path.join(db_path, "chroma.sqlite3")):
+        print(f"错误: {db_path} 中没有向量库，请先构建。")
+        return 1
+    vector_db = ChromaVectorDB(db_path=db_path, allow_memory_fallback=False)
+    old = vector_db.hnsw_config().get("ef_search")
+    vector_db.set_search_ef(ef_search)
+    print(f"已将集合 {vector_db.collection_name} 的 ef_search 从 {old} 改为 {vector_db.hnsw_config().get('ef_search')}")
+    print("正在运行的服务重启后生效")
+    return 0
+
 def search_similar_characters(query_char: str, 
                             vector_db: ChromaVectorDB, 
                             vectorizer: ImageVectorizer, 
@@ -164,8 +206,41 @@ def search_similar_characters(query_char: str,
     return results
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建汉字图像向量数据库")
+    parser.add_argument('--images-dir', default='images', help='字形图片目录 (默认: images)')
+    parser.add_argument('--model', default='google/vit-base-patch16-224', help='ViT 或 CLIP 模型名')
+    parser.add_argument('--db-path', default=os.environ.get('CHROMA_DB_PATH', './chroma_db'),
+                        help='ChromaDB 目录 (默认: $CHROMA_DB_PATH 或 ./chroma_db)')
+    parser.add_argument('--versioned', action='store_true',
+                        help='构建到新的版本目录并发布（服务可热切换，不影响正在提供服务的版本）')
+    parser.add_argument('--no-publish', action='store_true', help='与 --versioned 一起使用：只构建，不更新 CURRENT')
+    # HNSW 参数（省略时使用 Chroma 默认值）；用 ann_benchmark.py 比较不同取值的召回率与延迟
+    parser.add_argument('--hnsw-m', type=int, default=None, help='HNSW 每个节点的邻居数 M（越大召回越高、内存越多）')
+    parser.add_argument('--hnsw-construction-ef', type=int, default=None, help='构建时的候选宽度 ef_construction')
+    parser.add_argument('--hnsw-search-ef', type=int, default=None,
+                        help='检索时的默认 ef_search（服务可用 HNSW_EF_SEARCH 或请求参数 ef_search 调高）')
+    parser.add_argument('--update-search-ef', type=int, default=None, metavar='EF',
+                        help='不重新构建：把已有集合的 ef_search 改为 EF 后退出（仅非版本化目录）')
+    parser.add_argument('--hnsw-threads', type=int, default=None, help='构建 HNSW 的线程数')
+    parser.add_argument('--hnsw-batch-size', type=int, default=None, help='写入 HNSW 前在内存中累积的向量数')
+    parser.add_argument('--hnsw-sync-threshold', type=int, default=None, help='累积多少向量后把 HNSW 同步到磁盘')
+    args = parser.parse_args()
+
+    hnsw_params = {"M": args.hnsw_m, "construction_ef": args.hnsw_construction_ef,
+                   "search_ef": args.hnsw_search_ef, "num_threads": args.hnsw_threads,
+                   "batch_size": args.hnsw_batch_size, "sync_threshold": args.hnsw_sync_threshold}
+    bad = [k for k, v in hnsw_params.items() if v is not None and v <= 0]
+    if bad:
+        parser.error(f"HNSW 参数必须为正整数: {', '.join(bad)}")
+    if args.update_search_ef is not None:
+        if args.update_search_ef <= 0:
+            parser.error("--update-search-ef 必须为正整数")
+        sys.exit(update_search_ef(args.db_path, args.update_search_ef))
+
     # 构建高级向量数据库
-    vector_db, vectorizer = build_advanced_vector_database()
+    vector_db, vectorizer = build_advanced_vector_database(args.images_dir, args.model, args.db_path,
+                                                           versioned=args.versioned, publish=not args.no_publish,
+                                                           hnsw_params=hnsw_params)
     
     # 测试搜索
     test_chars = ['行', '二', '人']
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Recall / latency benchmark of approximate (HNSW) search against exact search.
+
+The stored embeddings are read once from the Chroma DB. A seeded sample of them
+serves as queries, and their exact top-K (self excluded) from EmbeddingIndex is
+the ground truth. Then, for every engine and every (M, ef_construction) pair,
+a fresh index is built over the whole corpus and queried once per ef_search:
+
+  index    the collection as it is (its own build parameters; no rebuild)
+  chroma   Chroma collections in a temporary PersistentClient directory
+  hnswlib  hnswlib directly, when installed (the library Chroma wraps)
+  faiss    faiss IndexHNSWFlat, when installed
+  exact    brute force through EmbeddingIndex, the baseline
+
+Reported per row: recall@K, build time, memory (RSS growth during the build,
+plus on-disk size for Chroma), per-query latency p50/p99 and QPS for single
+queries, as sent by the API. Output is a table, and JSON with --out.
+
+Examples:
+  uv run python ann_benchmark.py
+  uv run python ann_benchmark.py --m 8,16,32 --ef-construction 100,200 --ef-search 10,50,100,200
+  uv run python ann_benchmark.py --engines index,exact --queries 2000 --top-k 20 --out ann.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import hnswlib  # type: ignore
+except Exception:  # pragma: no cover
+    hnswlib = None  # type: ignore
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+
+from embedding_index import EmbeddingIndex
+from index_registry import resolve_index_dir
+
+ENGINES = ("index", "chroma", "hnswlib", "faiss", "exact")
+_ADD_BATCH = 5000
+
+
+def parse_ints(value: str) -> List[int]:
+    try:
+        out = [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise ValueError(f"expected comma-separated integers, got '{value}'")
+    if not out or min(out) <= 0:
+        raise ValueError(f"expected positive integers, got '{value}'")
+    return out
+
+
+def _rss_mb() -> Optional[float]:
+    """Resident set size of this process (Linux /proc); None elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _dir_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / 1024 / 1024
+
+
+def ground_truth(index: EmbeddingIndex, rows: np.ndarray, k: int) -> np.ndarray:
+    """Exact top-k rows for the sampled rows, self excluded."""
+    truth, _ = index.topk(index.matrix[rows], k, exclude=rows)
+    return truth
+
+
+def recall(found: Sequence[np.ndarray], truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    if k == 0:
+        return 1.0
+    hits = sum(len(np.intersect1d(f[:k], t, assume_unique=True)) for f, t in zip(found, truth))
+    return hits / (k * len(truth))
+
+
+def time_queries(query: Callable[[int], np.ndarray], rows: np.ndarray) -> Dict:
+    """Run one query per sampled row; returns found row arrays and latency stats."""
+    found: List[np.ndarray] = []
+    lat = np.empty(len(rows))
+    started = time.perf_counter()
+    for i, row in enumerate(rows.tolist()):
+        t0 = time.perf_counter()
+        found.append(query(row))
+        lat[i] = time.perf_counter() - t0
+    wall = time.perf_counter() - started
+    p50, p99 = np.percentile(lat * 1000, [50, 99]) if len(lat) else (0.0, 0.0)
+    return {"found": found, "p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3),
+            "qps": round(len(rows) / wall, 1) if wall > 0 else None}
+
+
+def _drop_self(rows: np.ndarray, self_row: int, k: int) -> np.ndarray:
+    return rows[rows != self_row][:k]
+
+
+# ---- engines ----
+
+class ChromaEngine:
+    """One Chroma collection built with the given HNSW parameters in a scratch directory."""
+
+    def __init__(self, index: EmbeddingIndex, m: int, ef_construction: int, threads: int, workdir: str):
+        from vector_db import ChromaVectorDB
+
+        self.index = index
+        self.path = tempfile.mkdtemp(prefix=f"chroma-m{m}-ef{ef_construction}-", dir=workdir)
+        self.db = ChromaVectorDB(db_path=self.path, collection_name="ann_benchmark", allow_memory_fallback=False,
+                                 hnsw_params={"space": index.space, "M": m, "construction_ef": ef_construction,
+                                              "num_threads": threads})
+        for start in range(0, len(index), _ADD_BATCH):
+            stop = min(start + _ADD_BATCH, len(index))
+            self.db.collection.add(ids=index.ids[start:stop], embeddings=index.matrix[start:stop])
+
+    def set_ef(self, ef: int):
+        self.db.set_search_ef(ef)
+
+    def query(self, row: int, k: int) -> np.ndarray:
+        res = self.db.collection.query(query_embeddings=self.index.matrix[row:row + 1], n_results=k + 1,
+                                    include=[])
+        found = np.fromiter((self.index.row_of[i.upper()] for i in res["ids"][0]), dtype=np.int64)
+        return _drop_self(found, row, k)
+
+    def disk_mb(self) -> float:
+        return _dir_mb(self.path)
+
+    def close(self):
+        self.db.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class CollectionEngine:
+    """The served collection, queried as built."""
+
+    def __init__(self, db, index: EmbeddingIndex):
+        self.db = db
+        self.index = index
+
+    def params(self) -> Dict:
+        hnsw = self.db.hnsw_config()
+        return {"m": hnsw.get("max_neighbors"), "ef_construction": hnsw.get("ef_construction"),
+                "ef_search": hnsw.get("ef_search")}
+
+    def query(self, row: int, k: int) -> np.ndarray:
+        res = self.db.collection.query(query_embeddings=self.index.matrix[row:row + 1], n_results=k + 1,
+                                       include=[])
+        found = np.fromiter((self.index.row_of[i.upper()] for i in res["ids"][0]), dtype=np.int64)
+        return _drop_self(found, row, k)
+
+
+class HnswlibEngine:
+    def __init__(self, index: EmbeddingIndex, m: int, ef_construction: int, threads: int):
+        if hnswlib is None:
+            raise RuntimeError("hnswlib is not installed. Please install 'hnswlib'.")
+        self.index = index
+        self.ann = hnswlib.Index(space=index.space, dim=index.dim)
+        self.ann.init_index(max_elements=len(index), ef_construction=ef_construction, M=m)
+        self.ann.add_items(index.matrix, np.arange(len(index)), num_threads=threads)
+
+    def set_ef(self, ef: int):
+        self.ann.set_ef(ef)
+
+    def query(self, row: int, k: int) -> np.ndarray:
+        labels, _ = self.ann.knn_query(self.index.matrix[row:row + 1], k=min(k + 1, len(self.index)))
+        return _drop_self(labels[0].astype(np.int64), row, k)
+
+
+class FaissEngine:
+    def __init__(self, index: EmbeddingIndex, m: int, ef_construction: int, threads: int):
+        if faiss is None:
+            raise RuntimeError("faiss is not installed. Please install 'faiss-cpu'.")
+        self.index = index
+        # cosine rows are unit-normalized, so inner product ranks them identically
+        metric = faiss.METRIC_L2 if index.space == "l2" else faiss.METRIC_INNER_PRODUCT
+        faiss.omp_set_num_threads(threads)
+        self.ann = faiss.IndexHNSWFlat(index.dim, m, metric)
+        self.ann.hnsw.efConstruction = ef_construction
+        self.ann.add(index.matrix)
+
+    def set_ef(self, ef: int):
+        self.ann.hnsw.efSearch = ef
+
+    def query(self, row: int, k: int) -> np.ndarray:
+        _, labels = self.ann.search(self.index.matrix[row:row + 1], min(k + 1, len(self.index)))
+        return _drop_self(labels[0].astype(np.int64), row, k)
+
+
+ENGINE_CLASSES = {"hnswlib": HnswlibEngine, "faiss": FaissEngine}
+
+
+# ---- sweep ----
+
+def run(db, index: EmbeddingIndex, engines: Sequence[str], ms: Sequence[int], efcs: Sequence[int],
+        efs: Sequence[int], n_queries: int, k: int, threads: int, seed: int) -> Dict:
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(index), size=min(n_queries, len(index)), replace=False))
+    k = min(k, len(index) - 1)
+    t0 = time.perf_counter()
+    truth = ground_truth(index, rows, k)
+    truth_s = time.perf_counter() - t0
+    results: List[Dict] = []
+
+    def add_row(engine: str, params: Dict, timed: Dict, build_s: Optional[float] = None,
+                rss: Optional[float] = None, disk: Optional[float] = None):
+        row = {"engine": engine, **params, "recall": round(recall(timed["found"], truth), 4),
+               "build_s": None if build_s is None else round(build_s, 2),
+               "rss_mb": None if rss is None else round(rss, 1), "disk_mb": None if disk is None else round(disk, 1),
+               "p50_ms": timed["p50_ms"], "p99_ms": timed["p99_ms"], "qps": timed["qps"]}
+        results.append(row)
+        print(format_row(row), file=sys.stderr)
+
+    if "exact" in engines:
+        def exact(row: int) -> np.ndarray:
+            found, _ = index.topk(index.matrix[row:row + 1], k, exclude=np.array([row]))
+            return found[0]
+
+        add_row("exact", {"m": None, "ef_construction": None, "ef_search": None}, time_queries(exact, rows))
+    if "index" in engines:
+        served = CollectionEngine(db, index)
+        add_row("index", served.params(), time_queries(lambda r: served.query(r, k), rows))
+
+    if "chroma" in engines:
+        workdir = tempfile.mkdtemp(prefix="ann-benchmark-")
+        try:
+            for m in ms:
+                for efc in efcs:
+                    rss0 = _rss_mb()
+                    t0 = time.perf_counter()
+                    engine = ChromaEngine(index, m, efc, threads, workdir)
+                    build_s = time.perf_counter() - t0
+                    rss = None if rss0 is None else _rss_mb() - rss0
+                    try:
+                        for ef in efs:
+                            engine.set_ef(ef)
+                            add_row("chroma", {"m": m, "ef_construction": efc, "ef_search": ef},
+                                    time_queries(lambda r: engine.query(r, k), rows), build_s, rss,
+                                    engine.disk_mb())
+                    finally:
+                        engine.close()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, cls in ENGINE_CLASSES.items():
+        if name not in engines:
+            continue
+        for m in ms:
+            for efc in efcs:
+                rss0 = _rss_mb()
+                t0 = time.perf_counter()
+                engine = cls(index, m, efc, threads)
+                build_s = time.perf_counter() - t0
+                rss = None if rss0 is None else _rss_mb() - rss0
+                for ef in efs:
+                    # hnswlib refuses ef < k; both libraries search at least k candidates anyway
+                    engine.set_ef(max(ef, k + 1))
+                    add_row(name, {"m": m, "ef_construction": efc, "ef_search": ef},
+                            time_queries(lambda r: engine.query(r, k), rows), build_s, rss)
+                del engine
+
+    return {"vectors": len(index), "dim": index.dim, "space": index.space, "queries": len(rows), "top_k": k,
+            "seed": seed, "ground_truth_s": round(truth_s, 2), "results": results}
+
+
+def _available(engine: str) -> bool:
+    return {"hnswlib": hnswlib, "faiss": faiss}.get(engine, True) is not None
+
+
+HEADER = (f"{'engine':<8} {'M':>4} {'efC':>5} {'efS':>5} {'recall':>7} {'build_s':>8} {'rss_mb':>7} "
+          f"{'disk_mb':>8} {'p50_ms':>8} {'p99_ms':>8} {'qps':>8}")
+
+
+def format_row(r: Dict) -> str:
+    def cell(v, width, fmt=""):
+        return f"{'-' if v is None else format(v, fmt):>{width}}"
+
+    return (f"{r['engine']:<8} {cell(r['m'], 4)} {cell(r['ef_construction'], 5)} {cell(r['ef_search'], 5)} "
+            f"{cell(r['recall'], 7, '.4f')} {cell(r['build_s'], 8, '.2f')} {cell(r['rss_mb'], 7, '.1f')} "
+            f"{cell(r['disk_mb'], 8, '.1f')} {cell(r['p50_ms'], 8, '.3f')} {cell(r['p99_ms'], 8, '.3f')} "
+            f"{cell(r['qps'], 8, '.1f')}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Recall@K / build / latency of HNSW settings against exact search.")
+    parser.add_argument('--db-path', default=os.environ.get('CHROMA_DB_PATH', './chroma_db'),
+                        help='ChromaDB directory (default: $CHROMA_DB_PATH or ./chroma_db)')
+    parser.add_argument('--collection', default='hanzi_images', help='Collection name (default: hanzi_images)')
+    parser.add_argument('--engines', default=None,
+                        help=f'Comma-separated subset of {",".join(ENGINES)} (default: all available)')
+    parser.add_argument('--m', default='16', help='HNSW M values to build (default: 16)')
+    parser.add_argument('--ef-construction', default='100', help='ef_construction values (default: 100)')
+    parser.add_argument('--ef-search', default='10,50,100,200', help='ef_search values (default: 10,50,100,200)')
+    parser.add_argument('--queries', type=int, default=500, help='Sampled query vectors (default: 500)')
+    parser.add_argument('--top-k', type=int, default=10, help='K of recall@K (default: 10)')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                        help='Build threads (default: all cores)')
+    parser.add_argument('--seed', type=int, default=0, help='Query sample seed (default: 0)')
+    parser.add_argument('--out', default=None, help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    try:
+        ms, efcs, efs = parse_ints(args.m), parse_ints(args.ef_construction), parse_ints(args.ef_search)
+        if args.engines:
+            engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+            unknown = set(engines) - set(ENGINES)
+            if unknown:
+                raise ValueError(f"unknown engine(s): {', '.join(sorted(unknown))} (expected {', '.join(ENGINES)})")
+        else:
+            engines = [e for e in ENGINES if _available(e)]
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 2
+    missing = [e for e in engines if not _available(e)]
+    if missing:
+        print(f"错误: 未安装 {', '.join(missing)}，无法测试该引擎。")
+        return 2
+    if args.queries <= 0 or args.top_k <= 0:
+        print("错误: --queries 和 --top-k 必须为正数。")
+        return 2
+
+    db_path, _ = resolve_index_dir(args.db_path)
+    from vector_db import ChromaVectorDB
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):  # keep stdout for the JSON report
+        db = ChromaVectorDB(db_path=db_path, collection_name=args.collection, allow_memory_fallback=False)
+    index = EmbeddingIndex.from_vector_db(db)
+    if len(index) < 2:
+        print("错误: 向量库为空，请先运行 advanced_vectorizer.py 构建。")
+        return 1
+    print(f"已加载 {len(index)} 个向量 (维度 {index.dim}, 距离 {index.space})，用时 {time.perf_counter() - t0:.1f}s",
+          file=sys.stderr)
+    print(HEADER, file=sys.stderr)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            report = run(db, index, engines, ms, efcs, efs, args.queries, args.top_k, max(1, args.threads),
+                         args.seed)
+    finally:
+        db.close()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.out}", file=sys.stderr)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,46 +1,160 @@
-from typing import List
-from fastapi import FastAPI, HTTPException
+import time
+
+# 启动耗时统计的起点（模块导入耗时见 GET /readyz；导入明细见 startup_profile.py）
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse, Response
-from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+import asyncio
 import os
+import sys
+import hmac
+import signal
+import threading
 import numpy as np
 
-# Use the advanced vectorizer (ChromaDB + ViT/CLIP)
-from vector_db import ChromaVectorDB
-from svg_renderer import SvgGlyphRenderer
+# chromadb 导入约需 1 秒：只在打开 Chroma 索引时导入（WARM_START 使用快照时完全不导入）
+if TYPE_CHECKING:
+    from vector_db import ChromaVectorDB
+from embedding_index import EmbeddingIndex, cross_distances, normalize, paired_distances
+from confusability import ReferenceSet, missing_glyphs, top_matches
+from index_registry import IndexRegistry, IndexSpec, LoadedIndex, parse_index_specs, resolve_index_dir
+from codepoint_filter import CodepointFilter
+from snapshot import SNAPSHOT_FILE, NeighborTable, SnapshotDB, source_identity
+from svg_renderer import SvgGlyphRenderer, default_coverage_cache, svg_to_symbol
+from glyph_store import GlyphStore
+from compression import CompressionMiddleware, negotiate
+import metrics
+from metrics import MetricsMiddleware, cache_lookup, stage
+from result_codec import (EMPTY_NEIGHBORS, Neighbors, batch_response, json_response, search_payload, similarities,
+                          similarity)
+from query_stream import QueryStreamResponse
 
 IMAGES_DIR = os.environ.get("IMAGES_DIR", "images")
 CHROMA_DB_PATH = os.environ.get("CHROMA_DB_PATH", "./chroma_db")
+# Several named indexes: "name=path[#collection],..." (unset: a single "default" index at CHROMA_DB_PATH)
+INDEXES = os.environ.get("INDEXES")
+DEFAULT_INDEX = os.environ.get("DEFAULT_INDEX")
+# Estimated memory budget for loaded indexes; least recently used ones are evicted (0 = unlimited)
+INDEX_MEMORY_MB = int(os.environ.get("INDEX_MEMORY_MB", "0"))
+# Poll versioned index roots (CURRENT pointer) and hot-reload changed ones every N seconds (0 = off)
+INDEX_WATCH_INTERVAL = float(os.environ.get("INDEX_WATCH_INTERVAL", "0"))
+# Token for /admin endpoints (header X-Admin-Token); admin endpoints are disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# WARM_START=1 serves each index from its snapshot.npz (build_snapshot.py) without importing chromadb;
+# indexes without a snapshot fall back to Chroma
+WARM_START = os.environ.get("WARM_START", "0").lower() in ("1", "true", "yes")
 MODEL_NAME = os.environ.get("MODEL_NAME", "google/vit-base-patch16-224")
 TOP_K_DEFAULT = int(os.environ.get("TOP_K", "10"))
 FONTS_DIR = os.environ.get("FONTS_DIR")
+# Parsed font coverage reused across workers and restarts (default: .font_coverage.npz in the fonts directory;
+# "0" disables it)
+FONT_COVERAGE_CACHE = os.environ.get("FONT_COVERAGE_CACHE")
+# Pre-rendered glyphs consulted before live font rendering (see glyph_store.py)
+SVG_DIR = os.environ.get("SVG_DIR")
+SVG_BUNDLE_PATH = os.environ.get("SVG_BUNDLE_PATH")
+GLYPH_CACHE_SIZE = int(os.environ.get("GLYPH_CACHE_SIZE", "4096"))
+GLYPH_BATCH_MAX = int(os.environ.get("GLYPH_BATCH_MAX", "200"))
+# EXACT_SEARCH=1 loads all embeddings into memory for exact, vectorized search
+EXACT_SEARCH = os.environ.get("EXACT_SEARCH", "0").lower() in ("1", "true", "yes")
+# Default HNSW search width for requests without ef_search, applied in-process by over-fetching candidates
+# (0 = the collection's own ef_search; change that with advanced_vectorizer.py --update-search-ef)
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", "0"))
+# Upper bound for the per-request ef_search
+HNSW_EF_SEARCH_MAX = int(os.environ.get("HNSW_EF_SEARCH_MAX", "1000"))
+# Cap on results returned by threshold (min_similarity) searches when max_results is not given
+RANGE_MAX_RESULTS = int(os.environ.get("RANGE_MAX_RESULTS", "1000"))
+# /similarity/pairs and /similarity/matrix request limits
+SIMILARITY_MAX_PAIRS = int(os.environ.get("SIMILARITY_MAX_PAIRS", "10000"))
+SIMILARITY_MAX_SIDE = int(os.environ.get("SIMILARITY_MAX_SIDE", "1000"))
+# Protected names for /confusability when a request sends no references (one per line)
+CONFUSABLE_REFERENCES = os.environ.get("CONFUSABLE_REFERENCES")
+CONFUSABLE_MAX_REFERENCES = int(os.environ.get("CONFUSABLE_MAX_REFERENCES", "100000"))
+# Confusable-skeleton table built by build_skeleton.py (default: skeleton.npz shipped in each index directory)
+SKELETON_TABLE = os.environ.get("SKELETON_TABLE")
+SKELETON_MAX_TEXTS = int(os.environ.get("SKELETON_MAX_TEXTS", "1000"))
+# Request profiling (profiling.py): enabled when PROFILE_DIR is set. Every PROFILE_SAMPLE_RATE-th request
+# (0 = none) and requests sending "X-Profile: 1" with a valid X-Admin-Token are profiled
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+PROFILE_SAMPLE_RATE = int(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "500"))
+PROFILE_ENGINE = os.environ.get("PROFILE_ENGINE")  # pyinstrument (default when installed) / cprofile
+# Response compression: bodies below the threshold are sent as-is
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "512"))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "5"))
 
 app = FastAPI(title="Hanzi Similarity API", version="0.3.0")
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_SIZE,
+                   gzip_level=COMPRESS_GZIP_LEVEL, brotli_quality=COMPRESS_BROTLI_QUALITY)
+if PROFILE_DIR:
+    from profiling import ProfilingMiddleware
+
+    app.add_middleware(ProfilingMiddleware, directory=PROFILE_DIR, sample_every=PROFILE_SAMPLE_RATE,
+                       keep=PROFILE_KEEP, token=ADMIN_TOKEN, engine=PROFILE_ENGINE)
+# outermost: latency includes compression (and profiling)
+app.add_middleware(MetricsMiddleware)
 
 # Globals
-vector_db: ChromaVectorDB | None = None
+indexes: IndexRegistry | None = None
 svg_renderer: SvgGlyphRenderer | None = None
+glyph_store: GlyphStore | None = None
+# 默认索引打开并完成一次预热查询后才就绪（GET /readyz）
+ready = False
+startup_timings: Dict[str, float] = {}
+
+
+class SearchFilter(BaseModel):
+    blocks: List[str] | None = None  # Unicode 区块名（如 "CJK Unified Ideographs"）或分组 radicals / punctuation / ideographs
+    ranges: List[str] | None = None  # 码点范围，如 "4E00-9FFF"
+    allow: List[str] | None = None  # 允许的字符或Unicode列表
+    exclude_blocks: List[str] | None = None
+    exclude_ranges: List[str] | None = None
 
 
 class QueryChar(BaseModel):
     char: str
-    top_k: int | None = None
+    top_k: int | None = Field(None, ge=1)
+    min_similarity: float | None = None  # 相似度阈值 (0-100)，设置后返回所有不低于阈值的结果
+    max_results: int | None = None  # 阈值检索的结果上限
+    filter: SearchFilter | None = None  # 只返回符合条件的近邻（仍返回 top_k 个）
+    ef_search: int | None = None  # HNSW 检索宽度：调高召回率、换取延迟（只能高于索引的 ef_search）
+    index: str | None = None  # 索引名（INDEXES），省略时使用默认索引
 
 
 class QueryUnicode(BaseModel):
     unicode: str  # e.g., "U+4E00" or "4E00"
-    top_k: int | None = None
+    top_k: int | None = Field(None, ge=1)
+    min_similarity: float | None = None  # 相似度阈值 (0-100)，设置后返回所有不低于阈值的结果
+    max_results: int | None = None  # 阈值检索的结果上限
+    filter: SearchFilter | None = None  # 只返回符合条件的近邻（仍返回 top_k 个）
+    ef_search: int | None = None  # HNSW 检索宽度：调高召回率、换取延迟（只能高于索引的 ef_search）
+    index: str | None = None  # 索引名（INDEXES），省略时使用默认索引
 
 
 class BatchQueryChar(BaseModel):
     chars: List[str]  # 批量字符列表
-    top_k: int | None = None
+    top_k: int | None = Field(None, ge=1)
+    min_similarity: float | None = None  # 相似度阈值 (0-100)，设置后返回所有不低于阈值的结果
+    max_results: int | None = None  # 阈值检索的结果上限
+    filter: SearchFilter | None = None  # 只返回符合条件的近邻（仍返回 top_k 个）
+    ef_search: int | None = None  # HNSW 检索宽度：调高召回率、换取延迟（只能高于索引的 ef_search）
+    index: str | None = None  # 索引名（INDEXES），省略时使用默认索引
 
 
 class BatchQueryUnicode(BaseModel):
     unicodes: List[str]  # 批量Unicode列表，例如 ["U+4E00", "4E01"]
-    top_k: int | None = None
+    top_k: int | None = Field(None, ge=1)
+    min_similarity: float | None = None  # 相似度阈值 (0-100)，设置后返回所有不低于阈值的结果
+    max_results: int | None = None  # 阈值检索的结果上限
+    filter: SearchFilter | None = None  # 只返回符合条件的近邻（仍返回 top_k 个）
+    ef_search: int | None = None  # HNSW 检索宽度：调高召回率、换取延迟（只能高于索引的 ef_search）
+    index: str | None = None  # 索引名（INDEXES），省略时使用默认索引
 
 
 class ResultItem(BaseModel):
@@ -60,11 +174,102 @@ class BatchSearchResponse(BaseModel):
     results: List[List[ResultItem]]  # 每个查询对应一个结果列表
 
 
+class PairsQuery(BaseModel):
+    pairs: List[List[str]]  # 字符或Unicode对，例如 [["己", "已"], ["4E00", "U+4E01"]]
+    index: str | None = None
+
+
+class MatrixQuery(BaseModel):
+    a: str | List[str]  # 字符串（逐字）或字符/Unicode列表
+    b: str | List[str] | None = None  # 省略时与 a 相同
+    index: str | None = None
+
+
+class PairResult(BaseModel):
+    a: str
+    b: str
+    distance: float | None  # 任一字符不在向量库中时为 null
+    similarity: float | None
+
+
+class PairsResponse(BaseModel):
+    results: List[PairResult]
+    missing: List[str]  # 向量库中不存在的Unicode
+
+
+class MatrixResponse(BaseModel):
+    a: List[str]
+    b: List[str]
+    distance: List[List[float | None]]  # len(a) × len(b)
+    similarity: List[List[float | None]]
+    missing: List[str]
+
+
+class ConfusabilityQuery(BaseModel):
+    query: str
+    references: List[str] | None = None  # 省略时使用服务端 CONFUSABLE_REFERENCES 列表
+    limit: int = 20
+    min_score: float = 0.0  # 0-100
+    index: str | None = None
+
+
+class ConfusableMatch(BaseModel):
+    reference: str
+    score: float  # 0-100，逐位相似度之和 / 较长字符串的长度
+    positions: List[float]  # 每个位置的相似度 (0-100)
+
+
+class ConfusabilityResponse(BaseModel):
+    query: str
+    compared: int
+    results: List[ConfusableMatch]
+    missing: List[str]  # 查询中没有字形向量的字符（只与自身匹配）
+
+
+class SkeletonQuery(BaseModel):
+    texts: List[str]
+    index: str | None = None
+
+
+class SkeletonResult(BaseModel):
+    text: str
+    skeleton: str
+
+
+class SkeletonResponse(BaseModel):
+    min_similarity: float  # 构建聚类表时使用的相似度阈值
+    results: List[SkeletonResult]
+
+
 @app.on_event("startup")
 async def startup_event():
-    global vector_db, svg_renderer
-    # allow memory fallback to avoid Windows path ACL issues
-    vector_db = ChromaVectorDB(db_path=CHROMA_DB_PATH, allow_memory_fallback=True)
+    global indexes, svg_renderer, glyph_store, ready
+    started = time.perf_counter()
+    startup_timings["imports_ms"] = round((started - _IMPORT_STARTED) * 1000, 1)
+    if INDEXES:
+        specs = parse_index_specs(INDEXES)
+    else:
+        specs = [IndexSpec("default", CHROMA_DB_PATH, skeleton_path=SKELETON_TABLE)]
+    indexes = IndexRegistry(specs, _open_index, default=DEFAULT_INDEX, memory_budget_mb=INDEX_MEMORY_MB)
+    # 默认索引启动时打开，其他索引首次请求时再载入
+    try:
+        t = time.perf_counter()
+        with indexes.use() as ix:
+            startup_timings["open_index_ms"] = round((time.perf_counter() - t) * 1000, 1)
+            t = time.perf_counter()
+            ready = _warmup_query(ix)
+            startup_timings["warmup_query_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    except Exception as e:
+        print(f"警告: 无法打开默认索引 {indexes.default}: {e}")
+    # SIGHUP：重新载入已发布新版本的索引（Windows 无此信号）
+    if hasattr(signal, "SIGHUP"):
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGHUP, lambda: threading.Thread(target=_reload_changed, daemon=True).start())
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+    if INDEX_WATCH_INTERVAL > 0:
+        threading.Thread(target=_watch_indexes, name="index-watch", daemon=True).start()
 
     # Mount static UI and images if available
     static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "static"))
@@ -81,39 +286,215 @@ async def startup_event():
     # Prepare SVG renderer with project fonts (configurable)
     fonts_dir = FONTS_DIR or os.path.abspath(os.path.join(os.path.dirname(__file__), "fonts"))
     if os.path.isdir(fonts_dir):
-        svg_renderer = SvgGlyphRenderer(fonts_dir)
+        coverage_cache = FONT_COVERAGE_CACHE or default_coverage_cache(fonts_dir)
+        if coverage_cache.lower() in ("0", "false", "no", "off"):
+            coverage_cache = None
+        svg_renderer = SvgGlyphRenderer(fonts_dir, coverage_cache=coverage_cache)
+    svg_dir = SVG_DIR or os.path.abspath(os.path.join(os.path.dirname(__file__), "svg"))
+    try:
+        glyph_store = GlyphStore(svg_dir=svg_dir, bundle_path=SVG_BUNDLE_PATH, cache_size=GLYPH_CACHE_SIZE)
+        if glyph_store.bundle is not None:
+            print(f"已加载SVG字形包: {glyph_store.bundle.path} ({len(glyph_store.bundle)} 个字形, {glyph_store.bundle_kind})")
+    except Exception as e:
+        print(f"警告: 无法加载预渲染字形: {e}")
+        glyph_store = GlyphStore(cache_size=GLYPH_CACHE_SIZE)
+    startup_timings["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print("启动耗时: " + ", ".join(f"{k[:-3]} {v:.0f}ms" for k, v in startup_timings.items())
+          + ("" if ready else "（未就绪）"))
+
+
+def _warmup_query(ix: LoadedIndex) -> bool:
+    """用索引中的第一个向量走一遍真实检索路径；成功后服务才标记为就绪"""
+    if ix.db.exact_index is not None:
+        uhex = ix.db.exact_index.ids[0] if len(ix.db.exact_index) else None
+    else:
+        page = ix.db.collection.get(limit=1)
+        uhex = (page.get("ids") or [None])[0]
+    if uhex is None:
+        print(f"警告: 索引 {ix.name} 为空，服务未就绪")
+        return False
+    try:
+        _find_similar_by_unicode_hex(ix, str(uhex).upper(), TOP_K_DEFAULT)
+    except Exception as e:
+        print(f"警告: 预热查询失败 {ix.name}: {e}")
+        return False
+    return True
 
 
-def _ensure_ready():
-    if vector_db is None:
+def _snapshot_stale(db: SnapshotDB, path: str, collection: str) -> str | None:
+    """快照与同目录向量库的来源标识不一致时返回原因；目录中没有 chroma.sqlite3（只发布快照）时视为有效"""
+    try:
+        current = source_identity(path, collection)
+    except Exception as e:
+        return f"无法读取向量库来源标识: {e}"
+    if current is None or current == db.source:
+        return None
+    return f"快照来源 {db.source or '未记录'}，向量库现为 {current}"
+
+
+def _open_index(spec: IndexSpec) -> LoadedIndex:
+    path, version = resolve_index_dir(spec.db_path)
+    snapshot_path = os.path.join(path, SNAPSHOT_FILE)
+    db = None
+    if WARM_START and os.path.isfile(snapshot_path):
+        db = SnapshotDB.load(snapshot_path)
+        if db.collection_name != spec.collection:
+            print(f"警告: 快照 {snapshot_path} 来自集合 {db.collection_name}，索引配置为 {spec.collection}")
+        stale = _snapshot_stale(db, path, spec.collection)
+        if stale:
+            print(f"警告: 快照 {snapshot_path} 已过期（{stale}），请重新运行 build_snapshot.py；使用 Chroma 打开索引 {spec.name}")
+            db.close()
+            db = None
+    elif WARM_START:
+        print(f"警告: 未找到快照 {snapshot_path}（build_snapshot.py 生成），使用 Chroma 打开索引 {spec.name}")
+    if db is None:
+        from vector_db import ChromaVectorDB
+
+        # allow memory fallback to avoid Windows path ACL issues
+        db = ChromaVectorDB(db_path=path, collection_name=spec.collection, allow_memory_fallback=True)
+    ix = LoadedIndex(spec, db, version=version)
+    print(f"已打开索引 {spec.name}: {snapshot_path if ix.snapshot else path} ({ix.vectors} 个向量, 维度 {ix.dim})")
+    if EXACT_SEARCH and not ix.snapshot:
+        try:
+            index = db.load_exact_index()
+            print(f"已载入精确检索索引: {len(index)} 个向量 (维度 {index.dim})")
+        except Exception as e:
+            print(f"警告: 无法载入精确检索索引，使用HNSW检索: {e}")
+    if ix.skeleton_table is not None:
+        table = ix.skeleton_table
+        print(f"已加载混淆骨架表: {spec.name} ({table.clusters} 个簇, {len(table)} 个映射)")
+    # 预热：首个真实请求不再承担 HNSW 载入
+    try:
+        ix.warm()
+    except Exception as e:
+        print(f"警告: 索引预热失败 {spec.name}: {e}")
+    return ix
+
+
+def _reload_changed():
+    try:
+        for r in indexes.reload_changed():
+            print(f"已切换索引 {r['name']}: {r['previous']} -> {r['version']}")
+    except Exception as e:
+        print(f"警告: 重新载入索引失败: {e}")
+
+
+def _watch_indexes():
+    while True:
+        time.sleep(INDEX_WATCH_INTERVAL)
+        if indexes is not None:
+            _reload_changed()
+
+
+@contextmanager
+def _use_index(name: str | None) -> Iterator[LoadedIndex]:
+    """按名称取得索引并在请求期间持有（被淘汰的索引等到最后一个请求结束才关闭）"""
+    if indexes is None:
         raise HTTPException(503, detail="Vector service not initialized")
+    try:
+        ix = indexes.acquire(name)
+    except KeyError:
+        raise HTTPException(404, detail=f"unknown index: {name}")
+    except Exception as e:
+        raise HTTPException(500, detail=f"load index error: {e}")
+    try:
+        _ensure_ready(ix)
+        yield ix
+    finally:
+        indexes.release(ix)
+
+
+def _ensure_ready(ix: LoadedIndex):
     # Ensure collection has data
     try:
-        stats = vector_db.get_stats()
+        stats = ix.db.get_stats()
         if stats.get("total_images", 0) == 0:
             raise HTTPException(503, detail="Vector database is empty. Build it with advanced_vectorizer.py first.")
     except Exception as e:
         raise HTTPException(500, detail=f"Vector DB error: {e}")
 
 
-def _calculate_similarity(distance: float) -> float:
-    """
-    计算相似度百分比，与前端保持一致
-    相似度 = max(0, min(100, (1 - distance) * 100))
-    """
-    if not isinstance(distance, (int, float)):
-        return 0.0
-    similarity = max(0.0, min(1.0, 1.0 - distance))
-    return round(similarity * 100, 1)
+def _range_params(min_similarity: float | None, max_results: int | None):
+    """阈值检索参数 -> (max_distance, 上限)；未设置 min_similarity 时返回 None（普通 top_k 检索）"""
+    if min_similarity is None:
+        return None
+    if not 0 <= min_similarity <= 100:
+        raise HTTPException(400, detail="min_similarity must be between 0 and 100")
+    if max_results is not None and max_results < 1:
+        raise HTTPException(400, detail="max_results must be >= 1")
+    # 相似度保留一位小数：放宽 0.05 个百分点取候选，再按相同公式精确过滤；阈值 0 时全部命中（相似度下限为 0）
+    max_distance = 1.0 - (min_similarity - 0.05) / 100.0 if min_similarity > 0 else float("inf")
+    return max_distance, max_results or RANGE_MAX_RESULTS
+
+
+def _ef_search(ef_search: int | None) -> int | None:
+    if ef_search is not None and not 1 <= ef_search <= HNSW_EF_SEARCH_MAX:
+        raise HTTPException(400, detail=f"ef_search must be between 1 and {HNSW_EF_SEARCH_MAX}")
+    return ef_search
+
+
+def _neighbors(ids, dists, metas=None, this_id: str | None = None, limit: int | None = None) -> Neighbors:
+    # 列式结果：不为每个近邻构造 Pydantic 模型
+    out = Neighbors([], [], [])
+    for i, (rid, dist) in enumerate(zip(ids, dists)):
+        rid_s = str(rid).upper()
+        if rid_s == this_id:
+            continue
+        try:
+            ch = chr(int(rid_s, 16))
+        except Exception:
+            m = metas[i] if metas else None
+            ch = m.get("character") if isinstance(m, dict) else "?"
+        out.chars.append(ch)
+        out.unicodes.append(rid_s)
+        out.distances.append(float(dist))
+        if limit is not None and out.count >= limit:
+            break
+    return out
+
+
+def _search_filter(f: SearchFilter | None) -> CodepointFilter | None:
+    if f is None:
+        return None
+    try:
+        return CodepointFilter.build(f.blocks, f.ranges, f.allow, f.exclude_blocks, f.exclude_ranges)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+
+
+def _find_similar_exact(index: EmbeddingIndex, uhex: str, top_k: int, rng,
+                        flt: CodepointFilter | None = None, table: NeighborTable | None = None) -> Neighbors:
+    row = index.row_of.get(uhex)
+    if row is None:
+        raise HTTPException(404, detail=f"embedding not found for U+{uhex}")
+    if table is not None and rng is None and flt is None:
+        # 快照中预先计算的近邻表：top_k 不超过表宽时直接查表
+        with stage("search", "table_lookup"):
+            hit = table.lookup(row, top_k)
+        cache_lookup("neighbor_table", "hit" if hit is not None else "miss")
+        if hit is not None:
+            with stage("search", "result_shaping"):
+                return _neighbors([index.ids[r] for r in hit[0].tolist()], hit[1].tolist())
+    q = index.matrix[row:row + 1]
+    with stage("search", "exact_query"):
+        mask = index.row_mask(flt) if flt is not None else None
+        if rng is None:
+            rows, dists = index.topk(q, top_k, exclude=np.array([row]), mask=mask)
+            rows, dists = rows[0], dists[0]
+        else:
+            rows, dists = index.range_search(q[0], rng[0], rng[1], exclude=row, mask=mask)
+    with stage("search", "result_shaping"):
+        return _neighbors([index.ids[r] for r in rows], dists.tolist())
 
 
-def _find_similar_by_unicode_hex(uhex: str, top_k: int) -> List[ResultItem]:
-    assert vector_db is not None
+def _find_similar_hnsw(vector_db: "ChromaVectorDB", uhex: str, top_k: int, rng,
+                       ef_search: int | None = None) -> Neighbors:
     # 从向量数据库中取出该字符的向量，而不是在API中做模型推理
     try:
-        data = vector_db.collection.get(
-            where={"unicode_code": uhex}, include=["embeddings", "metadatas"]
-        )
+        with stage("search", "embedding_fetch"):
+            data = vector_db.collection.get(
+                where={"unicode_code": uhex}, include=["embeddings", "metadatas"]
+            )
     except Exception as e:
         raise HTTPException(500, detail=f"load embedding error: {e}")
 
@@ -135,131 +516,416 @@ def _find_similar_by_unicode_hex(uhex: str, top_k: int) -> List[ResultItem]:
     meta0 = metadatas[0] if metadatas else {"unicode_code": uhex}
     this_id = str(meta0.get("unicode_code", uhex)).upper()
 
-    # 查询相似，取 top_k+1 并跳过自身
+    if rng is not None:
+        try:
+            with stage("search", "ann_query"):
+                ids, dists = vector_db.search_range(emb, rng[0], rng[1], exclude_id=this_id)
+        except Exception as e:
+            raise HTTPException(500, detail=f"similarity query error: {e}")
+        with stage("search", "result_shaping"):
+            return _neighbors(ids, dists)
+
+    # 查询相似，取 top_k+1 并跳过自身。Chroma 不支持按查询设置 ef_search，但 HNSW 的检索宽度是
+    # max(ef_search, n_results)：多取 ef_search 个候选再截断，等同于用该 ef_search 检索。
+    # 请求未指定时用 HNSW_EF_SEARCH，只在本进程内生效，不改动集合配置
     try:
-        res = vector_db.collection.query(query_embeddings=[emb.tolist()], n_results=top_k + 1)
+        with stage("search", "ann_query"):
+            res = vector_db.collection.query(query_embeddings=[emb.tolist()],
+                                             n_results=max(top_k + 1, ef_search or HNSW_EF_SEARCH),
+                                             include=["metadatas", "distances"])
     except Exception as e:
         raise HTTPException(500, detail=f"similarity query error: {e}")
 
     r_ids = (res.get("ids") or [[]])[0]
     r_dists = (res.get("distances") or [[]])[0]
     r_metas = (res.get("metadatas") or [[]])[0]
+    with stage("search", "result_shaping"):
+        return _neighbors(r_ids, r_dists, r_metas, this_id=this_id, limit=top_k)
 
-    out: List[ResultItem] = []
-    for rid, dist, m in zip(r_ids, r_dists, r_metas):
-        rid_s = str(rid).upper()
-        if rid_s == this_id:
-            continue
-        try:
-            ch = chr(int(rid_s, 16))
-        except Exception:
-            ch = m.get("character") if isinstance(m, dict) else "?"
-        distance_val = float(dist)
-        similarity_val = _calculate_similarity(distance_val)
-        out.append(ResultItem(
-            char=ch, 
-            unicode=f"U+{rid_s}", 
-            distance=distance_val,
-            similarity=similarity_val
-        ))
-        if len(out) >= top_k:
-            break
+
+def _find_similar_by_unicode_hex(ix: LoadedIndex, uhex: str, top_k: int, min_similarity: float | None = None,
+                                 max_results: int | None = None, flt: CodepointFilter | None = None,
+                                 ef_search: int | None = None) -> Neighbors:
+    rng = _range_params(min_similarity, max_results)
+    if flt is not None:
+        # 过滤条件作为行掩码下推到内存矩阵的检索内核：只计算符合条件的行，结果数不因过滤而减少
+        out = _find_similar_exact(_matrix_index(ix), uhex, top_k, rng, flt)
+    elif ix.db.exact_index is not None:
+        out = _find_similar_exact(ix.db.exact_index, uhex, top_k, rng,
+                                  table=ix.db.neighbor_table if ix.snapshot else None)
+    else:
+        out = _find_similar_hnsw(ix.db, uhex, top_k, rng, ef_search)
+    if rng is not None:
+        keep = [i for i, d in enumerate(out.distances) if similarity(d) >= min_similarity]
+        if len(keep) < out.count:
+            out = Neighbors([out.chars[i] for i in keep], [out.unicodes[i] for i in keep],
+                            [out.distances[i] for i in keep])
     return out
 
 
+async def _find_similar(ix: LoadedIndex, uhex: str, top_k: int, min_similarity: float | None,
+                        max_results: int | None, flt: CodepointFilter | None, ef_search: int | None) -> Neighbors:
+    """带过滤的检索在线程池中执行：内存矩阵首次使用时从 Chroma 载入全部向量，且可能等待 /confusability 持有的 ix.lock"""
+    if flt is None:
+        return _find_similar_by_unicode_hex(ix, uhex, top_k, min_similarity, max_results, None, ef_search)
+    return await run_in_threadpool(_find_similar_by_unicode_hex, ix, uhex, top_k, min_similarity, max_results,
+                                   flt, ef_search)
+
+
 @app.post("/search/char", response_model=SearchResponse)
 async def search_by_char(payload: QueryChar):
-    _ensure_ready()
     if not payload.char or len(payload.char) != 1:
         raise HTTPException(400, detail="char must be a single character")
     top_k = payload.top_k or TOP_K_DEFAULT
     code_hex = f"{ord(payload.char):04X}"
-    results = _find_similar_by_unicode_hex(code_hex, top_k)
-    return SearchResponse(query=payload.char, results=results)
+    with _use_index(payload.index) as ix:
+        results = await _find_similar(ix, code_hex, top_k, payload.min_similarity, payload.max_results,
+                                      _search_filter(payload.filter), _ef_search(payload.ef_search))
+    return json_response(search_payload(payload.char, results))
 
 
 @app.post("/search/unicode", response_model=SearchResponse)
 async def search_by_unicode(payload: QueryUnicode):
-    _ensure_ready()
     u = payload.unicode.upper().replace("U+", "").strip()
     if not u or any(c not in '0123456789ABCDEF' for c in u):
         raise HTTPException(400, detail="invalid unicode hex")
     top_k = payload.top_k or TOP_K_DEFAULT
-    results = _find_similar_by_unicode_hex(u, top_k)
+    with _use_index(payload.index) as ix:
+        results = await _find_similar(ix, u, top_k, payload.min_similarity, payload.max_results,
+                                      _search_filter(payload.filter), _ef_search(payload.ef_search))
     try:
         ch = chr(int(u, 16))
     except Exception:
         ch = "?"
-    return SearchResponse(query=ch, results=results)
+    return json_response(search_payload(ch, results))
 
 
 @app.post("/search/batch/char", response_model=BatchSearchResponse)
-async def batch_search_by_char(payload: BatchQueryChar):
-    _ensure_ready()
+async def batch_search_by_char(request: Request, payload: BatchQueryChar):
     if not payload.chars:
         raise HTTPException(400, detail="chars list cannot be empty")
     if len(payload.chars) > 100:  # 限制批量查询数量
         raise HTTPException(400, detail="maximum 100 characters allowed per batch")
     
     top_k = payload.top_k or TOP_K_DEFAULT
+    _range_params(payload.min_similarity, payload.max_results)  # 参数错误直接返回400，不按单项失败处理
+    flt = _search_filter(payload.filter)
+    ef_search = _ef_search(payload.ef_search)
     queries = []
     results = []
     
     for char in payload.chars:
         if not char or len(char) != 1:
             raise HTTPException(400, detail=f"invalid character: '{char}' must be a single character")
-        
-        try:
-            code_hex = f"{ord(char):04X}"
-            char_results = _find_similar_by_unicode_hex(code_hex, top_k)
-            queries.append(char)
-            results.append(char_results)
-        except Exception as e:
-            # 对于无法处理的字符，返回空结果
-            queries.append(char)
-            results.append([])
+
+    with _use_index(payload.index) as ix:
+        for char in payload.chars:
+            try:
+                code_hex = f"{ord(char):04X}"
+                char_results = await _find_similar(ix, code_hex, top_k, payload.min_similarity,
+                                                   payload.max_results, flt, ef_search)
+                queries.append(char)
+                results.append(char_results)
+            except Exception as e:
+                # 对于无法处理的字符，返回空结果
+                queries.append(char)
+                results.append(EMPTY_NEIGHBORS)
     
-    return BatchSearchResponse(queries=queries, results=results)
+    return batch_response(request.headers.get("accept"), queries, results)
 
 
 @app.post("/search/batch/unicode", response_model=BatchSearchResponse)
-async def batch_search_by_unicode(payload: BatchQueryUnicode):
-    _ensure_ready()
+async def batch_search_by_unicode(request: Request, payload: BatchQueryUnicode):
     if not payload.unicodes:
         raise HTTPException(400, detail="unicodes list cannot be empty")
     if len(payload.unicodes) > 100:  # 限制批量查询数量
         raise HTTPException(400, detail="maximum 100 unicodes allowed per batch")
     
     top_k = payload.top_k or TOP_K_DEFAULT
+    _range_params(payload.min_similarity, payload.max_results)  # 参数错误直接返回400，不按单项失败处理
+    flt = _search_filter(payload.filter)
+    ef_search = _ef_search(payload.ef_search)
     queries = []
     results = []
     
+    uhexes = []
     for unicode_str in payload.unicodes:
         u = unicode_str.upper().replace("U+", "").strip()
         if not u or any(c not in '0123456789ABCDEF' for c in u):
             raise HTTPException(400, detail=f"invalid unicode hex: '{unicode_str}'")
-        
-        try:
-            unicode_results = _find_similar_by_unicode_hex(u, top_k)
+        uhexes.append(u)
+
+    with _use_index(payload.index) as ix:
+        for unicode_str, u in zip(payload.unicodes, uhexes):
             try:
-                ch = chr(int(u, 16))
-            except Exception:
-                ch = "?"
-            queries.append(ch)
-            results.append(unicode_results)
-        except Exception as e:
-            # 对于无法处理的Unicode，返回空结果
-            queries.append(unicode_str)
-            results.append([])
+                unicode_results = await _find_similar(ix, u, top_k, payload.min_similarity,
+                                                      payload.max_results, flt, ef_search)
+                try:
+                    ch = chr(int(u, 16))
+                except Exception:
+                    ch = "?"
+                queries.append(ch)
+                results.append(unicode_results)
+            except Exception as e:
+                # 对于无法处理的Unicode，返回空结果
+                queries.append(unicode_str)
+                results.append(EMPTY_NEIGHBORS)
     
-    return BatchSearchResponse(queries=queries, results=results)
+    return batch_response(request.headers.get("accept"), queries, results)
+
+
+def _parse_query_token(token: str):
+    """单个字符按字符处理，其余按十六进制码点（可带 U+ 前缀）；返回 (字符, 4位以上大写十六进制)"""
+    if len(token) == 1:
+        return token, f"{ord(token):04X}"
+    u = token.upper().replace("U+", "").strip()
+    if not u or len(u) > 6 or any(c not in '0123456789ABCDEF' for c in u):
+        raise ValueError("invalid unicode hex")
+    ch = chr(int(u, 16))  # > U+10FFFF 抛出 ValueError
+    return ch, f"{ord(ch):04X}"
+
+
+def _stream_query(token: str, top_k: int, min_similarity: float | None = None,
+                  max_results: int | None = None, flt: CodepointFilter | None = None,
+                  index: str | None = None, ef_search: int | None = None) -> dict:
+    try:
+        ch, u = _parse_query_token(token)
+    except ValueError:
+        return {"query": token, "error": "invalid unicode hex"}
+    try:
+        # 每个查询单独持有索引：长时间的流不会阻止索引被淘汰或替换
+        with _use_index(index) as ix:
+            return search_payload(ch, _find_similar_by_unicode_hex(ix, u, top_k, min_similarity, max_results, flt,
+                                                                   ef_search))
+    except HTTPException as he:
+        return {"query": ch, "error": he.detail}
+
+
+def _csv(value: str | None) -> List[str] | None:
+    return [p.strip() for p in value.split(",") if p.strip()] if value else None
+
+
+@app.post("/search/stream")
+async def search_stream(top_k: int | None = Query(None, ge=1), min_similarity: float | None = None,
+                        max_results: int | None = None, blocks: str | None = None, ranges: str | None = None,
+                        exclude_blocks: str | None = None, exclude_ranges: str | None = None,
+                        index: str | None = None, ef_search: int | None = None):
+    """流式批量查询：请求体逐块读取，每个查询完成即输出一行 NDJSON，不限数量。过滤参数为逗号分隔列表。"""
+    # 只校验索引名：读取请求体之前不打开（也不淘汰）任何索引，每个查询再各自持有
+    if indexes is None:
+        raise HTTPException(503, detail="Vector service not initialized")
+    try:
+        indexes.resolve(index)
+    except KeyError:
+        raise HTTPException(404, detail=f"unknown index: {index}")
+    k = top_k or TOP_K_DEFAULT
+    _range_params(min_similarity, max_results)
+    ef = _ef_search(ef_search)
+    flt = _search_filter(SearchFilter(blocks=_csv(blocks), ranges=_csv(ranges),
+                                      exclude_blocks=_csv(exclude_blocks), exclude_ranges=_csv(exclude_ranges)))
+    return QueryStreamResponse(lambda token: _stream_query(token, k, min_similarity, max_results, flt, index, ef))
+
+
+def _parse_tokens(tokens: List[str]):
+    chars, uhexes = [], []
+    for t in tokens:
+        try:
+            ch, u = _parse_query_token(t)
+        except ValueError:
+            raise HTTPException(400, detail=f"invalid character or unicode: '{t}'")
+        chars.append(ch)
+        uhexes.append(u)
+    return chars, uhexes
+
+
+def _lookup_vectors(vector_db: "ChromaVectorDB | SnapshotDB", uhexes: List[str]):
+    """一次查询取出全部所需向量；返回 (按 uhexes 顺序的归一化矩阵, 是否找到的掩码, 缺失列表)"""
+    unique = list(dict.fromkeys(uhexes))
+    try:
+        ids, matrix = vector_db.get_embeddings(unique)
+    except Exception as e:
+        raise HTTPException(500, detail=f"load embedding error: {e}")
+    pos = {str(i).upper(): r for r, i in enumerate(ids)}
+    found = np.array([u in pos for u in uhexes], dtype=bool)
+    missing = [f"U+{u}" for u in unique if u not in pos]
+    if not len(ids):
+        return np.zeros((len(uhexes), 1), dtype=np.float32), found, missing
+    vecs = normalize(matrix, vector_db.distance_space())
+    return vecs[[pos.get(u, 0) for u in uhexes]], found, missing
+
+
+def _nullable(values: np.ndarray, mask: np.ndarray) -> list:
+    out = values.tolist()
+    if not mask.all():
+        # 缺失的向量以 null 表示
+        out = np.where(mask, np.asarray(out, dtype=object), None).tolist()
+    return out
+
+
+@app.post("/similarity/pairs", response_model=PairsResponse)
+async def similarity_pairs(payload: PairsQuery):
+    if not payload.pairs:
+        raise HTTPException(400, detail="pairs list cannot be empty")
+    if len(payload.pairs) > SIMILARITY_MAX_PAIRS:
+        raise HTTPException(400, detail=f"maximum {SIMILARITY_MAX_PAIRS} pairs allowed per request")
+    if any(len(p) != 2 for p in payload.pairs):
+        raise HTTPException(400, detail="each pair must have exactly 2 items")
+    chars, uhexes = _parse_tokens([t for p in payload.pairs for t in p])
+    with _use_index(payload.index) as ix:
+        vecs, found, missing = _lookup_vectors(ix.db, uhexes)
+        space = ix.db.distance_space()
+    n = len(payload.pairs)
+    dist = paired_distances(vecs[0::2], vecs[1::2], space).astype(np.float64)
+    ok = found[0::2] & found[1::2]
+    d_list = _nullable(dist, ok)
+    s_list = _nullable(similarities(dist), ok)
+    results = [{"a": chars[2 * i], "b": chars[2 * i + 1], "distance": d_list[i], "similarity": s_list[i]}
+               for i in range(n)]
+    return json_response({"results": results, "missing": missing})
+
+
+@app.post("/similarity/matrix", response_model=MatrixResponse)
+async def similarity_matrix(payload: MatrixQuery):
+    a = list(payload.a) if isinstance(payload.a, str) else payload.a
+    b = a if payload.b is None else (list(payload.b) if isinstance(payload.b, str) else payload.b)
+    if not a or not b:
+        raise HTTPException(400, detail="a and b cannot be empty")
+    if len(a) > SIMILARITY_MAX_SIDE or len(b) > SIMILARITY_MAX_SIDE:
+        raise HTTPException(400, detail=f"maximum {SIMILARITY_MAX_SIDE} items allowed per side")
+    a_chars, a_hex = _parse_tokens(a)
+    b_chars, b_hex = _parse_tokens(b)
+    with _use_index(payload.index) as ix:
+        vecs, found, missing = _lookup_vectors(ix.db, a_hex + b_hex)
+        space = ix.db.distance_space()
+    dist = cross_distances(vecs[:len(a)], vecs[len(a):], space).astype(np.float64)
+    ok = found[:len(a), None] & found[None, len(a):]
+    return json_response({"a": a_chars, "b": b_chars, "distance": _nullable(dist, ok),
+                          "similarity": _nullable(similarities(dist), ok), "missing": missing})
+
+
+def _matrix_index(ix: LoadedIndex) -> EmbeddingIndex:
+    """全部向量的内存矩阵；EXACT_SEARCH=1 时与检索共用，否则首次使用时载入"""
+    try:
+        return ix.matrix()
+    except Exception as e:
+        raise HTTPException(500, detail=f"load embedding matrix error: {e}")
+
+
+def _server_references(ix: LoadedIndex) -> ReferenceSet:
+    if not CONFUSABLE_REFERENCES:
+        raise HTTPException(400, detail="references required (server has no CONFUSABLE_REFERENCES list)")
+    try:
+        return ix.references(CONFUSABLE_REFERENCES)
+    except OSError as e:
+        raise HTTPException(500, detail=f"load references error: {e}")
+
+
+def _check_text(texts: List[str], field: str):
+    """JSON 允许单独的代理码点（如 "\\ud800"），它们无法编码为 UTF-8/UTF-32，提前返回 400 而不是 500"""
+    for t in texts:
+        try:
+            t.encode("utf-8")
+        except UnicodeEncodeError:
+            raise HTTPException(400, detail=f"{field} contains a lone surrogate (invalid unicode)")
+
+
+@app.post("/confusability", response_model=ConfusabilityResponse)
+def confusability(payload: ConfusabilityQuery):
+    # 同步函数：在线程池中执行，首次载入向量矩阵时不阻塞事件循环
+    if not payload.query:
+        raise HTTPException(400, detail="query cannot be empty")
+    if payload.limit < 1:
+        raise HTTPException(400, detail="limit must be >= 1")
+    if payload.references is not None and len(payload.references) > CONFUSABLE_MAX_REFERENCES:
+        raise HTTPException(400, detail=f"maximum {CONFUSABLE_MAX_REFERENCES} references allowed per request")
+    _check_text([payload.query], "query")
+    _check_text(payload.references or [], "references")
+    with _use_index(payload.index) as ix:
+        index = _matrix_index(ix)
+        if payload.references is None:
+            refs = _server_references(ix)
+        else:
+            refs = ReferenceSet(payload.references, index)
+        # 评分与缺字检查也在持有索引期间完成，否则重载或淘汰可能在中途关闭该索引
+        results = top_matches(index, payload.query, refs, limit=payload.limit, min_score=payload.min_score)
+        return json_response({"query": payload.query, "compared": len(refs), "results": results,
+                              "missing": missing_glyphs(index, payload.query)})
+
+
+@app.post("/skeleton", response_model=SkeletonResponse)
+async def skeleton(payload: SkeletonQuery):
+    # 骨架相同即视觉可混淆：注册时对 skeleton(name) 做集合查找即可
+    if len(payload.texts) > SKELETON_MAX_TEXTS:
+        raise HTTPException(400, detail=f"maximum {SKELETON_MAX_TEXTS} texts allowed per request")
+    _check_text(payload.texts, "texts")
+    with _use_index(payload.index) as ix:
+        skeleton_table = ix.skeleton_table
+    if skeleton_table is None:
+        raise HTTPException(503, detail="Skeleton table not found. Build it with build_skeleton.py first.")
+    results = [{"text": t, "skeleton": skeleton_table.skeleton(t)} for t in payload.texts]
+    return json_response({"min_similarity": skeleton_table.min_similarity, "results": results})
+
+
+@app.get("/indexes")
+async def list_indexes():
+    """已配置的索引及其载入状态（内存为估算值）"""
+    if indexes is None:
+        raise HTTPException(503, detail="Vector service not initialized")
+    return {"default": indexes.default, "memory_budget_mb": INDEX_MEMORY_MB or None, "indexes": indexes.stats()}
+
+
+def _check_admin(token: str | None):
+    if not ADMIN_TOKEN:
+        raise HTTPException(403, detail="admin endpoints are disabled (set ADMIN_TOKEN)")
+    # 按字节比较：compare_digest 对含非 ASCII 字符的 str 抛 TypeError；Starlette 以 latin-1 解码请求头
+    if not token or not hmac.compare_digest(token.encode("latin-1"), ADMIN_TOKEN.encode()):
+        raise HTTPException(401, detail="invalid admin token")
+
+
+@app.post("/admin/reload")
+def admin_reload(request: Request, index: str | None = None, force: bool = False):
+    """载入已发布的新版本索引并原子切换；进行中的请求在旧版本上完成。同步函数：在线程池中执行，不阻塞事件循环"""
+    _check_admin(request.headers.get("x-admin-token"))
+    if indexes is None:
+        raise HTTPException(503, detail="Vector service not initialized")
+    names = [index] if index else [i["name"] for i in indexes.stats() if i["loaded"]]
+    results = []
+    for name in names:
+        try:
+            results.append(indexes.reload(name, force=force))
+        except KeyError:
+            raise HTTPException(404, detail=f"unknown index: {name}")
+        except Exception as e:
+            raise HTTPException(500, detail=f"reload index error: {e}")
+        if results[-1]["reloaded"]:
+            print(f"已切换索引 {name}: {results[-1]['previous']} -> {results[-1]['version']}")
+    return {"results": results}
+
+
+@app.get("/readyz")
+async def readyz():
+    """就绪检查：默认索引已打开且预热查询成功后返回 200，否则 503；附启动各阶段耗时"""
+    body = {"ready": ready, "warm_start": WARM_START, "startup": startup_timings,
+            "modules": {m: m in sys.modules for m in ("chromadb", "torch")}}
+    if not ready:
+        return json_response(body, status_code=503)
+    return body
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus 指标（多 worker 时设置 PROMETHEUS_MULTIPROC_DIR 汇总所有 worker）"""
+    try:
+        return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+    except RuntimeError as e:
+        raise HTTPException(503, detail=str(e))
 
 
 @app.get("/healthz")
 async def healthz():
     try:
-        _ensure_ready()
-        return {"ok": True}
+        with _use_index(None):
+            return {"ok": True}
     except HTTPException as he:
         return {"ok": False, "detail": he.detail}
 
@@ -269,20 +935,91 @@ async def root_redirect():
     return RedirectResponse(url="/ui/")
 
 
-@app.get("/glyph/svg/{uhex}")
-async def glyph_svg(uhex: str, size: int = 128, fill: str = "#000"):
+def _parse_uhex(uhex: str) -> int:
     # uhex: e.g. '884C' or 'U+884C'
     u = uhex.upper().replace("U+", "").strip()
     if not u or any(c not in '0123456789ABCDEF' for c in u):
         raise HTTPException(400, detail="invalid unicode hex")
-    cp = int(u, 16)
-    global svg_renderer
+    return int(u, 16)
+
+
+def _load_glyph(cp: int, size: int, fill: str, compact: bool) -> bytes:
+    """SVG bytes for cp: pre-rendered store first (memory/mmap read), live font rendering on a miss."""
+    if glyph_store is not None:
+        data = glyph_store.get(cp, size=size, padding=8, fill=fill, compact=compact)
+        if data is not None:
+            return data
+        glyph_store.record_miss(cp)
     if svg_renderer is None:
         raise HTTPException(503, detail="SVG renderer not initialized (fonts directory missing)")
     try:
-        svg = svg_renderer.render_svg(cp, size=size, padding=8, fill=fill)
-        return Response(content=svg, media_type="image/svg+xml")
+        svg = svg_renderer.render_svg(cp, size=size, padding=8, fill=fill, compact=compact)
     except FileNotFoundError as e:
         raise HTTPException(404, detail=str(e))
     except Exception as e:
         raise HTTPException(500, detail=f"svg render error: {e}")
+    if glyph_store is not None:
+        glyph_store.put(cp, size, 8, fill, svg, compact)
+    return svg.encode("utf-8")
+
+
+def _glyph_response(request: Request, cp: int, svg: bytes, size: int, fill: str, compact: bool) -> Response:
+    """SVG response, using the store's precompressed variant when the client accepts one."""
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding and glyph_store is not None and len(svg) >= COMPRESS_MIN_SIZE:
+        body = glyph_store.get_encoded(cp, size=size, padding=8, fill=fill, compact=compact, encoding=encoding)
+        if body is not None:
+            return Response(content=body, media_type="image/svg+xml",
+                            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+    return Response(content=svg, media_type="image/svg+xml")
+
+
+# Declared before /glyph/svg/{uhex} so "batch" is not captured as a codepoint
+@app.get("/glyph/svg/batch")
+def glyph_svg_batch(codes: str, size: int = 128, fill: str = "#000", compact: bool = True):
+    """All requested glyphs in one SVG sprite: one <symbol id="uXXXX"> per codepoint.
+
+    Use with `<svg viewBox="0 0 {size} {size}"><use href="#u4E2D"/></svg>` after inlining the sprite.
+    Codepoints no font covers are skipped and listed in the X-Glyphs-Missing header.
+    """
+    # 同步函数：在线程池中执行；冷缓存时逐个实时渲染可达数秒，不能阻塞事件循环（/healthz、/readyz 等）
+    cps: List[int] = []
+    for tok in codes.split(","):
+        if tok.strip():
+            cp = _parse_uhex(tok)
+            if cp not in cps:
+                cps.append(cp)
+    if not cps:
+        raise HTTPException(400, detail="codes cannot be empty")
+    if len(cps) > GLYPH_BATCH_MAX:
+        raise HTTPException(400, detail=f"maximum {GLYPH_BATCH_MAX} glyphs allowed per batch")
+    symbols: List[str] = []
+    missing: List[str] = []
+    for cp in cps:
+        try:
+            svg = _load_glyph(cp, size, fill, compact)
+        except HTTPException as he:
+            if he.status_code != 404:
+                raise
+            missing.append(f"{cp:04X}")
+            continue
+        symbols.append(svg_to_symbol(svg.decode("utf-8"), f"u{cp:04X}"))
+    body = "<svg xmlns='http://www.w3.org/2000/svg' style='display:none'>" + "".join(symbols) + "</svg>"
+    headers = {"X-Glyphs-Missing": ",".join(missing)} if missing else None
+    return Response(content=body, media_type="image/svg+xml", headers=headers)
+
+
+@app.get("/glyph/svg/{uhex}")
+def glyph_svg(request: Request, uhex: str, size: int = 128, fill: str = "#000", compact: bool = False):
+    # 同步函数：在线程池中执行；读取字形库、缓存未命中时的实时渲染与 brotli/gzip 编码都不能阻塞事件循环
+    cp = _parse_uhex(uhex)
+    svg = _load_glyph(cp, size, fill, compact)
+    return _glyph_response(request, cp, svg, size, fill, compact)
+
+
+@app.get("/glyph/stats")
+async def glyph_stats():
+    """Pre-rendered glyph store hit/miss counters and most frequently missed codepoints."""
+    if glyph_store is None:
+        raise HTTPException(503, detail="glyph store not initialized")
+    return glyph_store.stats()
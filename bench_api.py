@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Load test / latency benchmark for the API, in-process or against a running server.
+
+Traffic replays a Zipf-distributed codepoint population (a few hot glyphs, a
+long tail), mixed across endpoints:
+
+  search         POST /search/char
+  batch_char     POST /search/batch/char     (--batch-size characters)
+  batch_unicode  POST /search/batch/unicode  (--batch-size codepoints)
+  glyph          GET  /glyph/svg/{hex}
+
+The request schedule is generated up front from --seed, so two runs (e.g. on two
+commits) send exactly the same requests. Results are one JSON document: QPS,
+latency percentiles overall and per endpoint, status codes, plus the git commit
+and configuration. --compare prints the change against a previous result.
+
+Without --url the app is imported and driven through ASGI directly in this
+process (startup runs first and is not timed). Configure it with the usual
+environment (CHROMA_DB_PATH, WARM_START, ...). The population is then the
+default index's codepoints. With --url, --population picks the range.
+
+Examples:
+  uv run python bench_api.py --requests 5000 --concurrency 16 --out bench.json
+  uv run python bench_api.py --url http://127.0.0.1:8000 --duration 30 --mix search=1
+  uv run python bench_api.py --requests 5000 --compare bench.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import http.client
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from codepoint_filter import parse_range
+
+ENDPOINTS = ("search", "batch_char", "batch_unicode", "glyph")
+DEFAULT_MIX = "search=0.5,batch_char=0.1,batch_unicode=0.1,glyph=0.3"
+
+# (endpoint, method, path, body)
+Request = Tuple[str, str, str, bytes]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in value.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint in --mix: '{name}' (expected {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("--mix needs at least one positive weight")
+    return mix
+
+
+def zipf_sampler(population: Sequence[int], s: float, rng: np.random.Generator):
+    """Draw codepoints with P(rank r) ~ 1 / r**s; which codepoint is hot is a seeded permutation."""
+    ranked = np.asarray(population, dtype=np.int64)[rng.permutation(len(population))]
+    weights = 1.0 / np.arange(1, len(ranked) + 1, dtype=np.float64) ** s
+    cdf = np.cumsum(weights / weights.sum())
+
+    def draw(n: int) -> np.ndarray:
+        return ranked[np.minimum(np.searchsorted(cdf, rng.random(n)), len(ranked) - 1)]
+
+    return draw
+
+
+def build_schedule(population: Sequence[int], n: int, mix: Dict[str, float], zipf: float, batch_size: int,
+                   top_k: int, seed: int) -> List[Request]:
+    rng = np.random.default_rng(seed)
+    draw = zipf_sampler(population, zipf, rng)
+    names = list(mix)
+    p = np.array([mix[k] for k in names]) / sum(mix.values())
+    kinds = rng.choice(len(names), size=n, p=p)
+    out: List[Request] = []
+    for kind in kinds.tolist():
+        name = names[kind]
+        if name == "search":
+            cp = int(draw(1)[0])
+            out.append((name, "POST", "/search/char", json.dumps({"char": chr(cp), "top_k": top_k}).encode()))
+        elif name == "batch_char":
+            chars = [chr(int(cp)) for cp in draw(batch_size)]
+            out.append((name, "POST", "/search/batch/char", json.dumps({"chars": chars, "top_k": top_k}).encode()))
+        elif name == "batch_unicode":
+            codes = [f"U+{int(cp):04X}" for cp in draw(batch_size)]
+            out.append((name, "POST", "/search/batch/unicode",
+                        json.dumps({"unicodes": codes, "top_k": top_k}).encode()))
+        else:
+            out.append((name, "GET", f"/glyph/svg/{int(draw(1)[0]):04X}", b""))
+    return out
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: List[Tuple[str, int, float]] = []  # (endpoint, status, seconds); status 0 = transport error
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, status: int, seconds: float):
+        with self._lock:
+            self.samples.append((endpoint, status, seconds))
+
+
+def summarize(samples: Sequence[Tuple[str, int, float]], wall: float) -> Dict:
+    if not samples:
+        return {"requests": 0}
+    lat = np.array([s[2] for s in samples]) * 1000
+    statuses: Dict[str, int] = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sum(n for code, n in statuses.items() if code.startswith("2"))
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+    return {
+        "requests": len(samples),
+        "ok": ok,
+        "errors": len(samples) - ok,
+        "qps": round(len(samples) / wall, 1) if wall > 0 else None,
+        "latency_ms": {"mean": round(float(lat.mean()), 3), "p50": round(float(p50), 3),
+                       "p95": round(float(p95), 3), "p99": round(float(p99), 3), "max": round(float(lat.max()), 3)},
+        "status": statuses,
+    }
+
+
+def _schedule_iter(schedule: List[Request], total: Optional[int], deadline: Optional[float]):
+    """Thread-safe feed: the schedule once per --requests, cycled until the deadline for --duration."""
+    lock = threading.Lock()
+    source = iter(schedule) if total is not None else itertools.cycle(schedule)
+
+    def next_request() -> Optional[Request]:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        with lock:
+            return next(source, None)
+
+    return next_request
+
+
+# ---- in-process: drive the ASGI app directly ----
+
+async def _asgi_call(app, method: str, target: str, body: bytes) -> int:
+    path, _, query = target.partition("?")
+    headers = [(b"host", b"bench"), (b"accept-encoding", b"gzip")]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+             "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+             "headers": headers, "client": ("127.0.0.1", 0), "server": ("bench", 80)}
+    delivered = False
+    status = 0
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # disconnect watchers wait here until the response completes and cancels them
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def _index_codepoints(api_main) -> List[int]:
+    with api_main._use_index(None) as ix:
+        if ix.db.exact_index is not None:
+            return ix.db.exact_index.codepoints.tolist()
+        return ix.matrix().codepoints.tolist()
+
+
+async def run_in_process(make_schedule: Callable[[Sequence[int]], List[Request]], population: Optional[List[int]],
+                         concurrency: int, total: Optional[int], duration: Optional[float],
+                         warmup: int) -> Tuple[Recorder, float, int]:
+    """Start the app once; without a population, use the default index's codepoints."""
+    import api_main
+
+    app = api_main.app
+    async with app.router.lifespan_context(app):
+        if population is None:
+            population = _index_codepoints(api_main)
+        if not population:
+            raise ValueError("码点集合为空（向量库为空？）")
+        schedule = make_schedule(population)
+        for _, method, path, body in schedule[:warmup]:
+            await _asgi_call(app, method, path, body)
+        rec = Recorder()
+        started = time.perf_counter()
+        next_request = _schedule_iter(schedule, total, started + duration if duration else None)
+
+        async def worker():
+            while True:
+                req = next_request()
+                if req is None:
+                    return
+                name, method, path, body = req
+                t0 = time.perf_counter()
+                try:
+                    status = await _asgi_call(app, method, path, body)
+                except Exception:
+                    status = 0
+                rec.add(name, status, time.perf_counter() - t0)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return rec, time.perf_counter() - started, len(population)
+
+
+# ---- remote: keep-alive connections, one per thread ----
+
+def run_remote(url: str, schedule: List[Request], concurrency: int, total: Optional[int],
+               duration: Optional[float], warmup: int) -> Tuple[Recorder, float]:
+    parsed = urllib.parse.urlsplit(url)
+    conn_cls = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    prefix = parsed.path.rstrip("/")
+
+    def call(conn, method: str, path: str, body: bytes) -> int:
+        headers = {"Accept-Encoding": "gzip"}
+        if body:
+            headers["Content-Type"] = "application/json"
+        conn.request(method, prefix + path, body=body or None, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+
+    warm = conn_cls(parsed.hostname, parsed.port, timeout=60)
+    for _, method, path, body in schedule[:warmup]:
+        call(warm, method, path, body)
+    warm.close()
+
+    rec = Recorder()
+    started = time.perf_counter()
+    next_request = _schedule_iter(schedule, total, started + duration if duration else None)
+
+    def worker():
+        conn = conn_cls(parsed.hostname, parsed.port, timeout=60)
+        while True:
+            req = next_request()
+            if req is None:
+                break
+            name, method, path, body = req
+            t0 = time.perf_counter()
+            try:
+                status = call(conn, method, path, body)
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+                conn = conn_cls(parsed.hostname, parsed.port, timeout=60)
+            rec.add(name, status, time.perf_counter() - t0)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return rec, time.perf_counter() - started
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(current: Dict, baseline: Dict):
+    def row(name: str, cur: Dict, base: Dict):
+        if not cur.get("requests") or not base.get("requests"):
+            return
+        parts = [f"{name:<14}"]
+        for key in ("p50", "p95", "p99"):
+            c, b = cur["latency_ms"][key], base["latency_ms"][key]
+            parts.append(f"{key} {b:.2f}->{c:.2f}ms ({(c / b - 1) * 100 if b else 0:+.0f}%)")
+        if cur.get("qps") and base.get("qps"):
+            parts.append(f"qps {base['qps']:.0f}->{cur['qps']:.0f} ({(cur['qps'] / base['qps'] - 1) * 100:+.0f}%)")
+        print("  ".join(parts), file=sys.stderr)
+
+    print(f"对比 {baseline.get('commit')} -> {current.get('commit')}:", file=sys.stderr)
+    row("total", current["total"], baseline.get("total", {}))
+    for name, cur in current["endpoints"].items():
+        row(name, cur, baseline.get("endpoints", {}).get(name, {}))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay Zipf-distributed traffic against the API and report latency.")
+    parser.add_argument('--url', default=None, help='Server base URL (default: drive api_main in-process)')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests to send (default: 2000)')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Run for this many seconds instead, cycling the schedule')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients (default: 8)')
+    parser.add_argument('--warmup', type=int, default=50, help='Untimed requests sent first (default: 50)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Endpoint weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of codepoint popularity (default: 1.1)')
+    parser.add_argument('--population', default=None,
+                        help='Codepoint range, e.g. 4E00-9FFF (default: index codepoints in-process, else 4E00-9FFF)')
+    parser.add_argument('--batch-size', type=int, default=20, help='Codepoints per batch request (default: 20)')
+    parser.add_argument('--top-k', type=int, default=10, help='top_k of search requests (default: 10)')
+    parser.add_argument('--seed', type=int, default=0, help='Schedule seed (default: 0)')
+    parser.add_argument('--out', default=None, help='Write the JSON result here (default: stdout)')
+    parser.add_argument('--compare', default=None, help='Previous JSON result to compare against (printed to stderr)')
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+        population: Optional[List[int]] = None
+        if args.population:
+            lo, hi = parse_range(args.population)
+            population = list(range(lo, hi + 1))
+        elif args.url:
+            population = list(range(0x4E00, 0xA000))
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    def make_schedule(cps: Sequence[int]) -> List[Request]:
+        return build_schedule(cps, max(args.requests, args.warmup), mix, args.zipf, args.batch_size,
+                              args.top_k, args.seed)
+
+    total = None if args.duration else args.requests
+    concurrency = max(1, args.concurrency)
+    try:
+        if args.url:
+            rec, wall = run_remote(args.url, make_schedule(population), concurrency, total, args.duration,
+                                   args.warmup)
+            size = len(population)
+        else:
+            # the app logs to stdout; keep stdout for the JSON result
+            with contextlib.redirect_stdout(sys.stderr):
+                rec, wall, size = asyncio.run(run_in_process(make_schedule, population, concurrency, total,
+                                                             args.duration, args.warmup))
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+    result = {
+        "commit": git_commit(),
+        "target": args.url or "in-process",
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"requests": total, "duration_s": args.duration, "concurrency": concurrency, "mix": mix,
+                   "zipf": args.zipf, "population": size, "batch_size": args.batch_size,
+                   "top_k": args.top_k, "seed": args.seed, "warmup": args.warmup,
+                   "warm_start": os.environ.get("WARM_START")},
+        "wall_s": round(wall, 3),
+        "total": summarize(rec.samples, wall),
+        "endpoints": {name: summarize([s for s in rec.samples if s[0] == name], wall) for name in mix},
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
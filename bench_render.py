@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark of SvgGlyphRenderer and the SVG generator.
+
+Three measurements, written as one JSON report (stdout, or --out):
+
+  faces     SvgGlyphRenderer._load_faces() on a fresh renderer, repeated: the
+            cmap of every font is parsed into range-encoded coverage; then
+            the same from a warm coverage cache. Also reports codepoints per
+            face and the runs / memory of the coverage.
+  render    per-glyph latency of the render stages on a seeded sample of
+            covered codepoints, bucketed by glyph complexity (path commands
+            in the outline): face select, font open + cmap, glyph_outline
+            (both of those plus the draw), compose_svg standard and compact.
+  generate  end-to-end throughput of generate_hanzi_svgs.py for every
+            --gen-modes x --gen-workers pair, run as a subprocess the way it
+            is used. `startup_s` (a one-glyph run) is the fixed cost of
+            interpreter start, imports and face loading; `net_glyphs_per_s`
+            excludes it.
+
+--synthetic builds a reproducible font set instead of reading --fonts-dir:
+one face over U+4E00..U+9FFF plus fallback faces from U+20000 on, each with
+glyphs of 1, 4, 16 and 64 contours (about 10 to 640 path commands) assigned
+round-robin, so every complexity bucket is populated and results compare
+across machines.
+
+Examples:
+  uv run python bench_render.py --synthetic --out render.json
+  uv run python bench_render.py --fonts-dir fonts --glyphs 1000 --gen-workers 1,4,8
+  uv run python bench_render.py --synthetic --skip-generate --load-repeats 10
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+except Exception:  # pragma: no cover
+    FontBuilder = None  # type: ignore
+    TTGlyphPen = None  # type: ignore
+
+import metrics
+from bench_api import git_commit
+from codepoint_set import CodepointSet
+from svg_renderer import SvgGlyphRenderer, compose_svg
+
+# (upper bound on path commands, label); the synthetic levels land one per bucket
+COMPLEXITY_BUCKETS: Tuple[Tuple[float, str], ...] = ((16, "<=16"), (64, "17-64"), (256, "65-256"),
+                                                     (float("inf"), ">256"))
+SYNTHETIC_LEVELS = (1, 4, 16, 64)
+SYNTHETIC_VARIANTS = 8  # distinct glyphs per level
+_COMMAND_RE = re.compile(r"[MLHVCSQTZmlhvcsqtz]")
+
+
+def parse_ints(value: str) -> List[int]:
+    try:
+        out = [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise ValueError(f"expected comma-separated integers, got '{value}'")
+    if not out or min(out) <= 0:
+        raise ValueError(f"expected positive integers, got '{value}'")
+    return out
+
+
+def percentiles(seconds: Sequence[float]) -> Dict:
+    ms = np.asarray(seconds) * 1000
+    if not len(ms):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"n": len(ms), "mean": round(float(ms.mean()), 4), "p50": round(float(p50), 4),
+            "p95": round(float(p95), 4), "p99": round(float(p99), 4), "max": round(float(ms.max()), 4)}
+
+
+def complexity_bucket(commands: int) -> str:
+    for upper, label in COMPLEXITY_BUCKETS:
+        if commands <= upper:
+            return label
+    return COMPLEXITY_BUCKETS[-1][1]
+
+
+# ---- synthetic font set ----
+
+def _draw_strokes(pen, strokes: int, variant: int):
+    """`strokes` closed contours on a grid: a rectangle with quadratic corners each."""
+    cols = int(np.ceil(np.sqrt(strokes)))
+    cell = 900 // cols
+    r = max(2, cell // 8)
+    for i in range(strokes):
+        x0 = 50 + (i % cols) * cell + (variant * 7) % max(1, cell // 4)
+        y0 = 50 + (i // cols) * cell
+        x1, y1 = x0 + cell * 3 // 4, y0 + cell // 2 + variant % max(1, cell // 4)
+        pen.moveTo((x0 + r, y0))
+        pen.lineTo((x1 - r, y0))
+        pen.qCurveTo((x1, y0), (x1, y0 + r))
+        pen.lineTo((x1, y1 - r))
+        pen.qCurveTo((x1, y1), (x1 - r, y1))
+        pen.lineTo((x0 + r, y1))
+        pen.qCurveTo((x0, y1), (x0, y1 - r))
+        pen.lineTo((x0, y0 + r))
+        pen.qCurveTo((x0, y0), (x0 + r, y0))
+        pen.closePath()
+
+
+def build_synthetic_font(path: str, codepoints: Sequence[int], family: str):
+    if FontBuilder is None:
+        raise RuntimeError("fonttools is not installed. Please install 'fonttools'.")
+    names = [f"s{level}v{v}" for level in SYNTHETIC_LEVELS for v in range(SYNTHETIC_VARIANTS)]
+    glyphs = {".notdef": TTGlyphPen(None).glyph()}
+    for level in SYNTHETIC_LEVELS:
+        for v in range(SYNTHETIC_VARIANTS):
+            pen = TTGlyphPen(None)
+            _draw_strokes(pen, level, v)
+            glyphs[f"s{level}v{v}"] = pen.glyph()
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder([".notdef", *names])
+    fb.setupCharacterMap({cp: names[i % len(names)] for i, cp in enumerate(codepoints)})
+    fb.setupGlyf(glyphs)
+    fb.setupHorizontalMetrics({name: (1000, 0) for name in glyphs})
+    fb.setupHorizontalHeader(ascent=880, descent=-120)
+    fb.setupNameTable({"familyName": family, "styleName": "Regular"})
+    fb.setupOS2(sTypoAscender=880, sTypoDescender=-120, usWinAscent=880, usWinDescent=120)
+    fb.setupPost()
+    fb.save(path)
+
+
+def build_synthetic_fonts(directory: str, faces: int, fallback_cover: int) -> List[str]:
+    """Face 0 covers the main CJK block; faces 1.. cover consecutive runs from U+20000 on."""
+    paths = []
+    for i in range(faces):
+        if i == 0:
+            cps = range(0x4E00, 0xA000)
+        else:
+            start = 0x20000 + (i - 1) * fallback_cover
+            cps = range(start, start + fallback_cover)
+        path = os.path.join(directory, f"bench-{i:02d}.ttf")
+        build_synthetic_font(path, cps, f"Bench {i:02d}")
+        paths.append(path)
+    return paths
+
+
+# ---- measurements ----
+
+def _coverage_kb(faces) -> float:
+    return sum(f.codepoints.nbytes for f in faces if f.codepoints) / 1024
+
+
+def _time_loads(fonts_dir: str, repeats: int, coverage_cache: Optional[str]) -> Tuple[List[float], SvgGlyphRenderer]:
+    times = []
+    renderer = None
+    for _ in range(repeats):
+        renderer = SvgGlyphRenderer(fonts_dir, coverage_cache=coverage_cache)
+        t0 = time.perf_counter()
+        renderer._load_faces()  # type: ignore[attr-defined]
+        times.append(time.perf_counter() - t0)
+    return times, renderer
+
+
+def bench_faces(fonts_dir: str, repeats: int) -> Tuple[Dict, SvgGlyphRenderer]:
+    """Cmap parsing (no cache) and loading from a warm coverage cache in a scratch file."""
+    times, renderer = _time_loads(fonts_dir, repeats, None)
+    cache_dir = tempfile.mkdtemp(prefix="bench-render-cache-")
+    try:
+        cache = os.path.join(cache_dir, "coverage.npz")
+        SvgGlyphRenderer(fonts_dir, coverage_cache=cache)._load_faces()  # type: ignore[attr-defined]
+        cached_times, _ = _time_loads(fonts_dir, repeats, cache)
+        cache_kb = os.path.getsize(cache) / 1024
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    faces = [{"file": os.path.basename(f.path), "ttc_index": f.ttc_index,
+              "codepoints": len(f.codepoints or ())} for f in renderer.faces]
+    return {"repeats": repeats, "load_ms": percentiles(times), "cached_load_ms": percentiles(cached_times),
+            "cache_kb": round(cache_kb, 1), "faces": faces, "codepoints": sum(f["codepoints"] for f in faces),
+            "coverage_runs": sum(f.codepoints.runs for f in renderer.faces if f.codepoints),
+            "coverage_kb": round(_coverage_kb(renderer.faces), 2)}, renderer
+
+
+def sample_codepoints(renderer: SvgGlyphRenderer, n: int, seed: int) -> List[int]:
+    pool = CodepointSet.union_all(face.codepoints for face in renderer.faces).to_numpy()
+    rng = np.random.default_rng(seed)
+    return rng.choice(pool, size=min(n, len(pool)), replace=False).tolist()
+
+
+def bench_render(renderer: SvgGlyphRenderer, codepoints: Sequence[int], repeats: int, size: int) -> Dict:
+    stages = ("face_select", "font_open", "outline", "compose", "compose_compact")
+    per_bucket: Dict[str, Dict[str, List[float]]] = {}
+    commands: Dict[str, List[int]] = {}
+    skipped = 0
+    for cp in codepoints:
+        try:
+            d, bounds = renderer.glyph_outline(cp)
+        except FileNotFoundError:
+            skipped += 1
+            continue
+        n_commands = len(_COMMAND_RE.findall(d))
+        label = complexity_bucket(n_commands)
+        commands.setdefault(label, []).append(n_commands)
+        samples = per_bucket.setdefault(label, {s: [] for s in stages})
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            face = renderer._select_face(cp)  # type: ignore[attr-defined]
+            t1 = time.perf_counter()
+            renderer._open_font(face).getBestCmap()  # type: ignore[attr-defined]
+            t2 = time.perf_counter()
+            d, bounds = renderer.glyph_outline(cp)
+            t3 = time.perf_counter()
+            compose_svg(d, bounds, size=size)
+            t4 = time.perf_counter()
+            compose_svg(d, bounds, size=size, compact=True)
+            t5 = time.perf_counter()
+            for name, dt in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+                samples[name].append(dt)
+    buckets = []
+    for _, label in COMPLEXITY_BUCKETS:
+        if label not in per_bucket:
+            continue
+        buckets.append({"complexity": label, "glyphs": len(commands[label]),
+                        "mean_commands": round(float(np.mean(commands[label])), 1),
+                        **{name: percentiles(per_bucket[label][name]) for name in stages}})
+    everything = {name: percentiles([t for b in per_bucket.values() for t in b[name]]) for name in stages}
+    return {"glyphs": len(codepoints) - skipped, "skipped": skipped, "repeats": repeats, "size": size,
+            "all": everything, "buckets": buckets}
+
+
+def _run_generator(fonts_dir: str, codepoints: Sequence[int], mode: str, workers: int, fmt: str) -> Tuple[float, int]:
+    out_dir = tempfile.mkdtemp(prefix="bench-render-gen-")
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate_hanzi_svgs.py"),
+           "--fonts-dir", fonts_dir, "--out", out_dir, "--mode", mode, "--workers", str(workers),
+           "--format", fmt, "--allow-missing", "--codes", ",".join(f"{cp:04X}" for cp in codepoints)]
+    try:
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        wall = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    if proc.returncode not in (0, 4):
+        tail = (proc.stdout + proc.stderr).strip().splitlines()[-3:]
+        raise RuntimeError(f"generate_hanzi_svgs.py exited with {proc.returncode}: {' | '.join(tail)}")
+    return wall, proc.returncode
+
+
+def bench_generate(fonts_dir: str, codepoints: Sequence[int], modes: Sequence[str], workers: Sequence[int],
+                   fmt: str) -> Dict:
+    startup_s, _ = _run_generator(fonts_dir, codepoints[:1], "thread", 1, fmt)
+    rows = []
+    for mode in modes:
+        for n in workers:
+            wall, code = _run_generator(fonts_dir, codepoints, mode, n, fmt)
+            net = wall - startup_s
+            row = {"mode": mode, "workers": n, "glyphs": len(codepoints), "wall_s": round(wall, 3),
+                   "glyphs_per_s": round(len(codepoints) / wall, 1),
+                   "net_glyphs_per_s": round(len(codepoints) / net, 1) if net > 0 else None,
+                   "render_errors": code == 4}
+            rows.append(row)
+            print(f"  {mode:<8} {n:>3} 个worker: {row['wall_s']:>7.2f}s  {row['glyphs_per_s']:>8.1f} 字/秒  "
+                  f"(扣除启动 {row['net_glyphs_per_s'] or 0:>8.1f} 字/秒)", file=sys.stderr)
+    return {"format": fmt, "startup_s": round(startup_s, 3), "results": rows}
+
+
+def _print_render_table(report: Dict):
+    print(f"  {'complexity':<10} {'glyphs':>6} {'cmds':>6} {'select':>8} {'open':>8} {'outline':>8} "
+          f"{'compose':>8} {'compact':>8}   (p50 ms)", file=sys.stderr)
+    for b in report["buckets"]:
+        cells = " ".join(f"{b[s].get('p50', 0):>8.3f}"
+                         for s in ("face_select", "font_open", "outline", "compose", "compose_compact"))
+        print(f"  {b['complexity']:<10} {b['glyphs']:>6} {b['mean_commands']:>6.0f} {cells}", file=sys.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark font face loading, glyph rendering and SVG generation.")
+    parser.add_argument('--fonts-dir', default=os.environ.get('FONTS_DIR') or 'fonts',
+                        help='Fonts directory (default: fonts or $FONTS_DIR)')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Benchmark a generated, reproducible font set instead of --fonts-dir')
+    parser.add_argument('--synthetic-faces', type=int, default=3,
+                        help='Faces in the synthetic set (default: 3)')
+    parser.add_argument('--synthetic-cover', type=int, default=20000,
+                        help='Codepoints per synthetic fallback face (default: 20000)')
+    parser.add_argument('--load-repeats', type=int, default=5, help='Face loading repetitions (default: 5)')
+    parser.add_argument('--glyphs', type=int, default=300, help='Sampled codepoints for render latency (default: 300)')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed renders per sampled glyph (default: 3)')
+    parser.add_argument('--size', type=int, default=128, help='SVG size for compose (default: 128)')
+    parser.add_argument('--gen-glyphs', type=int, default=2000, help='Codepoints per generator run (default: 2000)')
+    parser.add_argument('--gen-modes', default='thread,process', help='Generator modes (default: thread,process)')
+    parser.add_argument('--gen-workers', default=f"1,{os.cpu_count() or 1}",
+                        help='Generator worker counts (default: 1 and all cores)')
+    parser.add_argument('--gen-format', choices=['files', 'bundle'], default='bundle',
+                        help='Generator output format (default: bundle, which keeps file system noise out)')
+    parser.add_argument('--skip-generate', action='store_true', help='Skip the generate_hanzi_svgs.py runs')
+    parser.add_argument('--seed', type=int, default=0, help='Codepoint sample seed (default: 0)')
+    parser.add_argument('--out', default=None, help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    try:
+        workers = parse_ints(args.gen_workers)
+        modes = [m.strip() for m in args.gen_modes.split(",") if m.strip()]
+        unknown = set(modes) - {"thread", "process"}
+        if unknown:
+            raise ValueError(f"unknown mode(s): {', '.join(sorted(unknown))} (expected thread, process)")
+        if min(args.load_repeats, args.glyphs, args.repeats, args.gen_glyphs, args.synthetic_faces,
+               args.synthetic_cover) <= 0:
+            raise ValueError("counts and repeats must be positive")
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 2
+
+    workdir = None
+    try:
+        if args.synthetic:
+            workdir = tempfile.mkdtemp(prefix="bench-render-fonts-")
+            t0 = time.perf_counter()
+            build_synthetic_fonts(workdir, args.synthetic_faces, args.synthetic_cover)
+            print(f"已生成 {args.synthetic_faces} 个合成字体，用时 {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+            fonts_dir = workdir
+        else:
+            fonts_dir = args.fonts_dir
+            if not os.path.isdir(fonts_dir):
+                print(f"错误: 字体目录不存在: {fonts_dir}（可使用 --synthetic）")
+                return 2
+
+        faces, renderer = bench_faces(fonts_dir, args.load_repeats)
+        if not renderer.faces:
+            print(f"错误: 字体目录 {fonts_dir} 中未找到可用字体。")
+            return 2
+        print(f"加载 {len(faces['faces'])} 个字体 ({faces['codepoints']} 个码点，覆盖 "
+              f"{faces['coverage_runs']} 个区间 {faces['coverage_kb']} KB): p50 {faces['load_ms']['p50']:.1f}ms，"
+              f"读缓存 p50 {faces['cached_load_ms']['p50']:.1f}ms ({faces['cache_kb']} KB)", file=sys.stderr)
+
+        sample = sample_codepoints(renderer, max(args.glyphs, args.gen_glyphs), args.seed)
+        with contextlib.redirect_stdout(sys.stderr):
+            render = bench_render(renderer, sorted(sample[:args.glyphs]), args.repeats, args.size)
+        _print_render_table(render)
+
+        generate = None
+        if not args.skip_generate:
+            print("generate_hanzi_svgs.py 吞吐量:", file=sys.stderr)
+            try:
+                generate = bench_generate(fonts_dir, sorted(sample[:args.gen_glyphs]), modes, workers,
+                                          args.gen_format)
+            except RuntimeError as e:
+                print(f"错误: {e}")
+                return 1
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fonts": "synthetic" if args.synthetic else os.path.abspath(args.fonts_dir),
+        "config": {"synthetic_faces": args.synthetic_faces if args.synthetic else None,
+                   "synthetic_cover": args.synthetic_cover if args.synthetic else None,
+                   "seed": args.seed, "cpu_count": os.cpu_count(), "python": sys.version.split()[0],
+                   "metrics_enabled": metrics.ENABLED},
+        "faces": faces,
+        "render": render,
+        "generate": generate,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.out}", file=sys.stderr)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
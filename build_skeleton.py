@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Build the confusable-skeleton table from the glyph embeddings (see skeleton.py).
+
+Exact top-k neighbors are computed for every vector with the same blocked matrix
+products as export_neighbors.py; neighbors within --min-similarity are then
+clustered and each glyph is mapped to its cluster representative. The table is
+written next to the Chroma DB by default, so it ships with the index and the API
+picks it up at startup (SKELETON_TABLE).
+
+Examples:
+  uv run python build_skeleton.py --min-similarity 90
+  uv run python build_skeleton.py --db-path ./chroma_db --out ./chroma_db/skeleton.npz --neighbors 64
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+from export_neighbors import auto_block_rows, iter_blocks
+from index_registry import resolve_index_dir
+from skeleton import SKELETON_FILE, SkeletonTable, cluster_representatives
+
+
+def build(index: EmbeddingIndex, min_similarity: float, neighbors: int, workers: int,
+          block_rows: int) -> SkeletonTable:
+    n = len(index)
+    k = min(neighbors, n - 1)
+    rows = np.empty((n, k), dtype=np.int64)
+    dists = np.empty((n, k), dtype=np.float32)
+    for start, r, d in iter_blocks(index, k, block_rows, workers):
+        rows[start:start + len(r)] = r
+        dists[start:start + len(r)] = d
+    leader = cluster_representatives(index.codepoints, rows, dists, 1.0 - min_similarity / 100.0)
+    return SkeletonTable.from_clusters(index.codepoints, leader, min_similarity, index.space)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cluster lookalike glyphs and write the confusable-skeleton table.")
+    parser.add_argument('--db-path', default=os.environ.get('CHROMA_DB_PATH', './chroma_db'),
+                        help='ChromaDB directory (default: $CHROMA_DB_PATH or ./chroma_db)')
+    parser.add_argument('--collection', default='hanzi_images', help='Collection name (default: hanzi_images)')
+    parser.add_argument('--out', default=None, help=f'Output file (default: {SKELETON_FILE} in the index directory)')
+    parser.add_argument('--min-similarity', type=float, default=90.0,
+                        help='Similarity (0-100) required to join a cluster (default: 90)')
+    parser.add_argument('--neighbors', type=int, default=32,
+                        help='Nearest neighbors examined per glyph (default: 32)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Threads computing neighbor blocks (default: min(4, cores))')
+    parser.add_argument('--memory-mb', type=int, default=512,
+                        help='Budget for in-flight distance blocks (default: 512)')
+    args = parser.parse_args()
+
+    if not 0 < args.min_similarity <= 100:
+        print("错误: --min-similarity 必须在 (0, 100] 之间。")
+        return 2
+    # versioned roots: build for the published version (CURRENT), or pass a version directory
+    db_path, _ = resolve_index_dir(args.db_path)
+    out = args.out or os.path.join(db_path, SKELETON_FILE)
+
+    from vector_db import ChromaVectorDB
+
+    t0 = time.perf_counter()
+    db = ChromaVectorDB(db_path=db_path, collection_name=args.collection, allow_memory_fallback=False)
+    index = EmbeddingIndex.from_vector_db(db)
+    n = len(index)
+    if n < 2:
+        print("错误: 向量库为空或只有一个向量，请先运行 advanced_vectorizer.py 构建。")
+        return 1
+    workers = max(1, args.workers)
+    print(f"已加载 {n} 个向量 (维度 {index.dim}, 距离 {index.space})，用时 {time.perf_counter() - t0:.1f}s")
+
+    t1 = time.perf_counter()
+    table = build(index, args.min_similarity, args.neighbors, workers, auto_block_rows(n, workers, args.memory_mb))
+    table.save(out)
+    largest = int(np.unique(table.skeletons, return_counts=True)[1].max()) + 1 if len(table) else 1
+    print(f"完成: 相似度 ≥ {args.min_similarity:g}% 聚为 {table.clusters} 个簇，{len(table)} 个字映射到代表字，"
+          f"最大簇 {largest} 个字，用时 {time.perf_counter() - t1:.1f}s，输出 {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Write the warm-start snapshot of an index (see snapshot.py).
+
+All embeddings are read once from the Chroma DB; each vector's --neighbors
+nearest neighbors are computed exactly with the blocked matrix products of
+export_neighbors.py. The snapshot is written next to the Chroma DB by default,
+so it ships with the index (and with each version of a versioned root); the
+API serves from it when started with WARM_START=1.
+
+Examples:
+  uv run python build_snapshot.py
+  uv run python build_snapshot.py --db-path ./indexes/vit-serif --neighbors 100 --workers 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+from export_neighbors import auto_block_rows, iter_blocks
+from index_registry import resolve_index_dir
+from snapshot import SNAPSHOT_FILE, save_snapshot, source_identity
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Write the warm-start snapshot (ids, vectors, neighbor table).")
+    parser.add_argument('--db-path', default=os.environ.get('CHROMA_DB_PATH', './chroma_db'),
+                        help='ChromaDB directory (default: $CHROMA_DB_PATH or ./chroma_db)')
+    parser.add_argument('--collection', default='hanzi_images', help='Collection name (default: hanzi_images)')
+    parser.add_argument('--out', default=None, help=f'Output file (default: {SNAPSHOT_FILE} in the index directory)')
+    parser.add_argument('--neighbors', type=int, default=50,
+                        help='Precomputed neighbors per glyph; top_k up to this is a table lookup (default: 50, 0 = none)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Threads computing neighbor blocks (default: min(4, cores))')
+    parser.add_argument('--memory-mb', type=int, default=512,
+                        help='Budget for in-flight distance blocks (default: 512)')
+    args = parser.parse_args()
+
+    if args.neighbors < 0:
+        print("错误: --neighbors 不能为负数。")
+        return 2
+    # versioned roots: snapshot the published version (CURRENT), or pass a version directory
+    db_path, _ = resolve_index_dir(args.db_path)
+    out = args.out or os.path.join(db_path, SNAPSHOT_FILE)
+
+    from vector_db import ChromaVectorDB
+
+    t0 = time.perf_counter()
+    db = ChromaVectorDB(db_path=db_path, collection_name=args.collection, allow_memory_fallback=False)
+    # recorded before reading: a write racing the read leaves the snapshot marked stale rather than trusted
+    source = source_identity(db_path, args.collection)
+    index = EmbeddingIndex.from_vector_db(db)
+    n = len(index)
+    if n == 0:
+        print("错误: 向量库为空，请先运行 advanced_vectorizer.py 构建。")
+        return 1
+    print(f"已加载 {n} 个向量 (维度 {index.dim}, 距离 {index.space})，用时 {time.perf_counter() - t0:.1f}s")
+
+    t1 = time.perf_counter()
+    k = min(args.neighbors, n - 1)
+    rows = np.empty((n, k), dtype=np.int32)
+    dists = np.empty((n, k), dtype=np.float32)
+    if k:
+        workers = max(1, args.workers)
+        for start, r, d in iter_blocks(index, k, auto_block_rows(n, workers, args.memory_mb), workers):
+            rows[start:start + len(r)] = r
+            dists[start:start + len(r)] = d
+    save_snapshot(out, index, args.collection, rows, dists, source)
+    print(f"完成: {n} 个向量，每个 {k} 个近邻，{os.path.getsize(out) / 1024 / 1024:.1f} MB，"
+          f"用时 {time.perf_counter() - t1:.1f}s，输出 {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Codepoint filters for neighbor search: Unicode blocks, ranges and allowlists.
+
+A filter is normalized into merged include / exclude range lists plus a sorted
+allowlist, so equal filters compare (and hash) equal however they were written.
+`EmbeddingIndex.row_mask()` turns a filter into a boolean mask over index rows
+once and caches it; searches then score only the masked rows, so a filtered
+query still returns exactly top_k results without over-fetching.
+
+A row passes when it matches any include criterion (block, range or allowlist;
+no include criteria means everything) and no exclude criterion.
+
+    flt = CodepointFilter.build(blocks=["CJK Unified Ideographs"], exclude_blocks=["radicals"])
+    mask = flt.mask(index.codepoints)
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+Range = Tuple[int, int]
+
+# Blocks the corpus draws from (generate_hanzi_svgs.DEFAULT_RANGES) and their neighbors
+BLOCKS: Dict[str, Range] = {
+    "CJK Radicals Supplement": (0x2E80, 0x2EFF),
+    "Kangxi Radicals": (0x2F00, 0x2FDF),
+    "Ideographic Description Characters": (0x2FF0, 0x2FFF),
+    "CJK Symbols and Punctuation": (0x3000, 0x303F),
+    "CJK Strokes": (0x31C0, 0x31EF),
+    "CJK Unified Ideographs Extension A": (0x3400, 0x4DBF),
+    "CJK Unified Ideographs": (0x4E00, 0x9FFF),
+    "CJK Compatibility Ideographs": (0xF900, 0xFAFF),
+    "Halfwidth and Fullwidth Forms": (0xFF00, 0xFFEF),
+    "CJK Unified Ideographs Extension B": (0x20000, 0x2A6DF),
+    "CJK Unified Ideographs Extension C": (0x2A700, 0x2B73F),
+    "CJK Unified Ideographs Extension D": (0x2B740, 0x2B81F),
+    "CJK Unified Ideographs Extension E": (0x2B820, 0x2CEAF),
+    "CJK Unified Ideographs Extension F": (0x2CEB0, 0x2EBEF),
+    "CJK Compatibility Ideographs Supplement": (0x2F800, 0x2FA1F),
+    "CJK Unified Ideographs Extension G": (0x30000, 0x3134F),
+}
+
+# Shorthands for block groups
+GROUPS: Dict[str, List[str]] = {
+    "radicals": ["CJK Radicals Supplement", "Kangxi Radicals"],
+    "punctuation": ["CJK Symbols and Punctuation", "Halfwidth and Fullwidth Forms"],
+    "ideographs": [name for name in BLOCKS if name.startswith("CJK Unified Ideographs")],
+}
+
+_RANGE = re.compile(r"^(?:U\+)?([0-9A-F]{1,6})(?:\s*(?:-|\.\.)\s*(?:U\+)?([0-9A-F]{1,6}))?$")
+
+
+def _key(name: str) -> str:
+    return " ".join(name.replace("_", " ").replace("-", " ").lower().split())
+
+
+_BLOCK_KEYS = {_key(name): [r] for name, r in BLOCKS.items()}
+_BLOCK_KEYS.update({_key(g): [BLOCKS[n] for n in names] for g, names in GROUPS.items()})
+
+
+def block_ranges(names: Iterable[str]) -> List[Range]:
+    """Ranges of named blocks; names are case-insensitive, '_' / '-' count as spaces."""
+    out: List[Range] = []
+    for name in names:
+        found = _BLOCK_KEYS.get(_key(name))
+        if found is None:
+            raise ValueError(f"unknown block: '{name}'")
+        out.extend(found)
+    return out
+
+
+def parse_range(text: str) -> Range:
+    """"4E00-9FFF", "U+4E00..U+9FFF" or a single codepoint "4E00"."""
+    m = _RANGE.match(text.strip().upper())
+    if not m:
+        raise ValueError(f"invalid codepoint range: '{text}'")
+    lo = int(m.group(1), 16)
+    hi = int(m.group(2), 16) if m.group(2) else lo
+    if lo > hi or hi > 0x10FFFF:
+        raise ValueError(f"invalid codepoint range: '{text}'")
+    return lo, hi
+
+
+def parse_codepoint_token(token: str) -> int:
+    """A single character, or a hex codepoint with optional U+ prefix."""
+    if len(token) == 1:
+        return ord(token)
+    lo, hi = parse_range(token)
+    if lo != hi:
+        raise ValueError(f"invalid character or unicode: '{token}'")
+    return lo
+
+
+def merge_ranges(ranges: Iterable[Range]) -> Tuple[Range, ...]:
+    out: List[List[int]] = []
+    for lo, hi in sorted(ranges):
+        if out and lo <= out[-1][1] + 1:
+            out[-1][1] = max(out[-1][1], hi)
+        else:
+            out.append([lo, hi])
+    return tuple((lo, hi) for lo, hi in out)
+
+
+def in_ranges(codepoints: np.ndarray, ranges: Sequence[Range]) -> np.ndarray:
+    """Vectorized membership of codepoints in sorted, merged ranges."""
+    if not ranges:
+        return np.zeros(len(codepoints), dtype=bool)
+    bounds = np.asarray(ranges, dtype=np.int64)
+    cps = np.asarray(codepoints, dtype=np.int64)
+    i = np.searchsorted(bounds[:, 0], cps, side="right") - 1
+    return (i >= 0) & (cps <= bounds[np.maximum(i, 0), 1])
+
+
+class CodepointFilter(NamedTuple):
+    include: Tuple[Range, ...]
+    allow: Tuple[int, ...]
+    exclude: Tuple[Range, ...]
+
+    @classmethod
+    def build(cls, blocks: Optional[Iterable[str]] = None, ranges: Optional[Iterable[str]] = None,
+              allow: Optional[Iterable[str]] = None, exclude_blocks: Optional[Iterable[str]] = None,
+              exclude_ranges: Optional[Iterable[str]] = None) -> Optional["CodepointFilter"]:
+        """Normalized filter from request parameters; None when no parameter is set. Raises ValueError."""
+        if not any((blocks, ranges, allow, exclude_blocks, exclude_ranges)):
+            return None
+        include = block_ranges(blocks or []) + [parse_range(r) for r in ranges or []]
+        exclude = block_ranges(exclude_blocks or []) + [parse_range(r) for r in exclude_ranges or []]
+        allowed = sorted({parse_codepoint_token(t) for t in allow or []})
+        return cls(merge_ranges(include), tuple(allowed), merge_ranges(exclude))
+
+    def mask(self, codepoints: np.ndarray) -> np.ndarray:
+        """Boolean mask of codepoints passing the filter."""
+        if self.include or self.allow:
+            keep = in_ranges(codepoints, self.include)
+            if self.allow:
+                keep |= np.isin(codepoints, np.asarray(self.allow, dtype=np.int64))
+        else:
+            keep = np.ones(len(codepoints), dtype=bool)
+        if self.exclude:
+            keep &= ~in_ranges(codepoints, self.exclude)
+        return keep
@@ -0,0 +1,190 @@
+"""
+Range-encoded codepoint sets for font coverage.
+
+A CJK font's cmap holds 30k-60k codepoints, nearly all in a few hundred runs.
+`CodepointSet` keeps those runs as sorted, merged half-open [start, end)
+pairs (numpy arrays, plus lists of the same for scalar lookups): under 100
+bytes per run instead of roughly 60 bytes per member in a Python `set[int]`,
+so a face of a large CJK font fits in a few KB.
+
+- `cp in s` is a bisect over the run starts (scalar lookups stay in Python).
+- `s.contains(array)` is the vectorized membership mask.
+- `|`, `&`, `-` are computed on the run boundaries without expanding members.
+- `s.count_in(ranges)` counts members per inclusive (lo, hi) range, e.g. the
+  coverage of every DEFAULT_RANGES block, from prefix sums over the runs.
+
+    covered = CodepointSet.union_all(face.codepoints for face in renderer.faces)
+    missing = CodepointSet.from_ranges(DEFAULT_RANGES) - covered
+    per_block = covered.count_in(DEFAULT_RANGES)
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Callable, Iterable, Iterator, Sequence, Tuple
+
+import numpy as np
+
+Range = Tuple[int, int]  # inclusive, as in codepoint_filter
+
+
+class CodepointSet:
+    """Immutable set of codepoints stored as sorted, disjoint, non-adjacent [start, end) runs."""
+
+    __slots__ = ("starts", "ends", "_starts_list", "_ends_list")
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        """Runs must already be normalized; use the from_* constructors otherwise."""
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self._starts_list = self.starts.tolist()
+        self._ends_list = self.ends.tolist()
+
+    # ---- construction ----
+
+    @classmethod
+    def empty(cls) -> "CodepointSet":
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    @classmethod
+    def from_codepoints(cls, codepoints: Iterable[int]) -> "CodepointSet":
+        if isinstance(codepoints, np.ndarray):
+            cps = np.unique(codepoints.astype(np.int64, copy=False))
+        else:
+            cps = np.unique(np.fromiter(codepoints, dtype=np.int64))
+        if not len(cps):
+            return cls.empty()
+        breaks = np.flatnonzero(np.diff(cps) != 1) + 1
+        return cls(cps[np.r_[0, breaks]], cps[np.r_[breaks - 1, len(cps) - 1]] + 1)
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[Range]) -> "CodepointSet":
+        """From inclusive (lo, hi) ranges in any order, overlapping or not."""
+        pairs = np.asarray(list(ranges), dtype=np.int64).reshape(-1, 2)
+        return cls._normalized(pairs[:, 0], pairs[:, 1] + 1)
+
+    @classmethod
+    def from_array(cls, runs: np.ndarray) -> "CodepointSet":
+        """From an [R, 2] array of [start, end) runs, as written by to_array()."""
+        runs = np.asarray(runs, dtype=np.int64).reshape(-1, 2)
+        return cls._normalized(runs[:, 0], runs[:, 1])
+
+    @classmethod
+    def union_all(cls, sets: Iterable["CodepointSet"]) -> "CodepointSet":
+        sets = [s for s in sets if s is not None]
+        if not sets:
+            return cls.empty()
+        return cls._normalized(np.concatenate([s.starts for s in sets]), np.concatenate([s.ends for s in sets]))
+
+    @classmethod
+    def _normalized(cls, starts: np.ndarray, ends: np.ndarray) -> "CodepointSet":
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        if not len(starts):
+            return cls.empty()
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        reach = np.maximum.accumulate(ends)
+        # a run opens a new group unless it starts inside (or right after) everything before it
+        new = np.r_[True, starts[1:] > reach[:-1]]
+        group_end = np.r_[np.flatnonzero(new)[1:] - 1, len(starts) - 1]
+        return cls(starts[new], reach[group_end])
+
+    def to_array(self) -> np.ndarray:
+        """[R, 2] `<u4` array of [start, end) runs (the coverage cache layout)."""
+        return np.stack([self.starts, self.ends], axis=1).astype("<u4")
+
+    def ranges(self) -> Iterator[Range]:
+        """Inclusive (lo, hi) runs."""
+        for lo, end in zip(self._starts_list, self._ends_list):
+            yield lo, end - 1
+
+    # ---- membership ----
+
+    def __contains__(self, cp: int) -> bool:
+        i = bisect_right(self._starts_list, cp) - 1
+        return i >= 0 and cp < self._ends_list[i]
+
+    def contains(self, codepoints) -> np.ndarray:
+        """Vectorized membership mask."""
+        cps = np.asarray(codepoints, dtype=np.int64)
+        i = np.searchsorted(self.starts, cps, side="right") - 1
+        if not len(self.starts):
+            return np.zeros(cps.shape, dtype=bool)
+        return (i >= 0) & (cps < self.ends[np.maximum(i, 0)])
+
+    def __len__(self) -> int:
+        return int((self.ends - self.starts).sum())
+
+    def __bool__(self) -> bool:
+        return len(self._starts_list) > 0
+
+    def __iter__(self) -> Iterator[int]:
+        for lo, end in zip(self._starts_list, self._ends_list):
+            yield from range(lo, end)
+
+    def to_numpy(self) -> np.ndarray:
+        """All members, ascending."""
+        lengths = self.ends - self.starts
+        if not len(lengths):
+            return np.zeros(0, dtype=np.int64)
+        # arange over all members, shifted per run by (run start - members before it)
+        offsets = np.repeat(self.starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+        return np.arange(int(lengths.sum()), dtype=np.int64) + offsets
+
+    def count_in(self, ranges: Sequence[Range]) -> np.ndarray:
+        """Members inside each inclusive (lo, hi) range."""
+        bounds = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+        return self._rank(bounds[:, 1] + 1) - self._rank(bounds[:, 0])
+
+    def _rank(self, x: np.ndarray) -> np.ndarray:
+        """Number of members below each x."""
+        before = np.r_[0, np.cumsum(self.ends - self.starts)]
+        i = np.searchsorted(self.starts, x, side="left")  # runs starting below x
+        if not len(self.starts):
+            return np.zeros(len(x), dtype=np.int64)
+        overhang = np.where(i > 0, np.maximum(self.ends[np.maximum(i - 1, 0)] - x, 0), 0)
+        return before[i] - overhang
+
+    # ---- set algebra ----
+
+    def _combine(self, other: "CodepointSet", op: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> "CodepointSet":
+        # membership is constant between consecutive boundaries of either set
+        points = np.union1d(np.r_[self.starts, self.ends], np.r_[other.starts, other.ends])
+        if not len(points):
+            return CodepointSet.empty()
+        inside = op(self.contains(points), other.contains(points))
+        before = np.r_[False, inside[:-1]]
+        return CodepointSet(points[inside & ~before], points[~inside & before])
+
+    def __or__(self, other: "CodepointSet") -> "CodepointSet":
+        return CodepointSet.union_all((self, other))
+
+    def __and__(self, other: "CodepointSet") -> "CodepointSet":
+        return self._combine(other, np.logical_and)
+
+    def __sub__(self, other: "CodepointSet") -> "CodepointSet":
+        return self._combine(other, lambda a, b: a & ~b)
+
+    union = __or__
+    intersection = __and__
+    difference = __sub__
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CodepointSet):
+            return NotImplemented
+        return self._starts_list == other._starts_list and self._ends_list == other._ends_list
+
+    __hash__ = None  # type: ignore[assignment]
+
+    @property
+    def runs(self) -> int:
+        return len(self._starts_list)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the run arrays (the Python lists used for scalar lookups come on top)."""
+        return self.starts.nbytes + self.ends.nbytes
+
+    def __repr__(self) -> str:
+        return f"CodepointSet({len(self)} codepoints in {self.runs} runs)"
@@ -0,0 +1,240 @@
+"""
+Negotiated response compression (brotli > gzip) for the API and static UI.
+
+- `CompressionMiddleware`: ASGI middleware compressing JSON/SVG/HTML/CSS/JS/NDJSON
+  bodies above a size threshold. Responses that already carry Content-Encoding
+  (e.g. precompressed glyphs) pass through untouched. Streaming bodies are
+  compressed incrementally with a flush per chunk so NDJSON lines are not held back.
+- `compress()` / `negotiate()`: helpers shared with the glyph store, which keeps
+  precompressed variants of hot SVGs so they are never compressed twice.
+
+Brotli needs the optional 'brotli' package; without it only gzip is offered.
+
+Run `python compression.py` to print bytes-on-wire for a typical 10-result search page.
+"""
+
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    brotli = None  # type: ignore
+
+# Payloads in this service are small text (JSON results, SVG paths, UI assets)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "image/svg+xml",
+    "text/",
+)
+
+# Dynamic levels (per request, including the glyph store's cached variants) favour latency;
+# offline precompression (generate_hanzi_svgs --precompress) uses the maximum.
+DYNAMIC_GZIP_LEVEL = 6
+DYNAMIC_BROTLI_QUALITY = 5
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+
+def available_encodings() -> List[str]:
+    """Supported content codings in server preference order."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encoding: Optional[str], available: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Pick the preferred coding allowed by an Accept-Encoding header (q=0 excludes)."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token] = q
+    for enc in (available if available is not None else available_encodings()):
+        q = accepted.get(enc, accepted.get("*", 0.0))
+        if q > 0:
+            return enc
+    return None
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=STATIC_GZIP_LEVEL if static else DYNAMIC_GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        if brotli is None:
+            raise RuntimeError("brotli is not installed. Please install 'brotli'.")
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY if static else DYNAMIC_BROTLI_QUALITY)
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str, gzip_level: int = DYNAMIC_GZIP_LEVEL, brotli_quality: int = DYNAMIC_BROTLI_QUALITY):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31: gzip container
+            self._c = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush(zlib.Z_FINISH)
+
+
+def _is_compressible(content_type: str) -> bool:
+    ct = content_type.split(";", 1)[0].strip().lower()
+    return any(ct.startswith(t) if t.endswith("/") else ct == t for t in COMPRESSIBLE_TYPES)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for k, v in headers:
+        if k.lower() == name:
+            return v
+    return None
+
+
+def _set_header(headers: List[Tuple[bytes, bytes]], name: bytes, value: Optional[bytes]) -> List[Tuple[bytes, bytes]]:
+    out = [(k, v) for k, v in headers if k.lower() != name]
+    if value is not None:
+        out.append((name, value))
+    return out
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 512, gzip_level: int = DYNAMIC_GZIP_LEVEL,
+                 brotli_quality: int = DYNAMIC_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for k, v in scope.get("headers", []):
+            if k == b"accept-encoding":
+                accept = v.decode("latin-1")
+                break
+        encoding = negotiate(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_msg = None
+        passthrough = False
+        stream: Optional[_StreamCompressor] = None
+
+        async def send_wrapper(message):
+            nonlocal start_msg, passthrough, stream
+            mtype = message["type"]
+            if mtype == "http.response.start":
+                headers = list(message.get("headers", []))
+                ctype = (_header(headers, b"content-type") or b"").decode("latin-1")
+                if (_header(headers, b"content-encoding") is not None or message.get("status") == 206
+                        or not _is_compressible(ctype)):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # hold until the first body chunk decides whether compressing is worthwhile
+                    start_msg = message
+                return
+            if mtype != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if start_msg is not None:
+                headers = list(start_msg.get("headers", []))
+                vary = _header(headers, b"vary")
+                headers = _set_header(headers, b"vary", (vary + b", Accept-Encoding") if vary else b"Accept-Encoding")
+                if not more and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(dict(start_msg, headers=headers))
+                    start_msg = None
+                    await send(message)
+                    return
+                stream = _StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = _set_header(headers, b"content-encoding", encoding.encode("latin-1"))
+                if more:
+                    headers = _set_header(headers, b"content-length", None)
+                    body = stream.chunk(body)
+                else:
+                    body = stream.finish(body)
+                    headers = _set_header(headers, b"content-length", str(len(body)).encode("latin-1"))
+                await send(dict(start_msg, headers=headers))
+                start_msg = None
+                await send({"type": "http.response.body", "body": body, "more_body": more})
+                return
+            assert stream is not None
+            body = stream.chunk(body) if more else stream.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _measure_search_page(fonts_dir: Optional[str] = None, top_k: int = 10,
+                         minimum_size: int = 512) -> List[Tuple[str, int, dict]]:
+    """Bytes on the wire for one UI search: the JSON response plus top_k + 1 glyph SVG responses."""
+    import json
+    import os
+
+    start = 0x4E2D
+    cps = [start + i * 7 for i in range(top_k + 1)]
+    results = [{"char": chr(cp), "unicode": f"U+{cp:04X}", "distance": 0.1234567 + i / 100,
+                "similarity": round((1 - 0.1234567 - i / 100) * 100, 1)} for i, cp in enumerate(cps[1:])]
+    page = [("search JSON", [json.dumps({"query": chr(cps[0]), "results": results}, ensure_ascii=False,
+                                        separators=(",", ":")).encode("utf-8")])]
+    fonts_dir = fonts_dir or os.environ.get("FONTS_DIR") or "fonts"
+    if os.path.isdir(fonts_dir):
+        from svg_renderer import SvgGlyphRenderer
+
+        renderer = SvgGlyphRenderer(fonts_dir)
+        for compact in (False, True):
+            blobs = []
+            for cp in cps:
+                try:
+                    blobs.append(renderer.render_svg(cp, compact=compact).encode("utf-8"))
+                except Exception:
+                    continue
+            if blobs:
+                page.append((f"{len(blobs)} SVG{' (compact)' if compact else ''}", blobs))
+    out = []
+    for name, blobs in page:
+        row = {"identity": sum(len(b) for b in blobs)}
+        for enc in available_encodings():
+            # each glyph is its own response; bodies under the threshold go out uncompressed
+            row[enc] = sum(len(compress(b, enc)) if len(b) >= minimum_size else len(b) for b in blobs)
+        out.append((name, row["identity"], row))
+    return out
+
+
+if __name__ == "__main__":
+    import sys
+
+    rows = _measure_search_page(sys.argv[1] if len(sys.argv) > 1 else None)
+    encs = available_encodings()
+    print(f"{'payload':<24}{'identity':>10}" + "".join(f"{e:>10}" for e in encs))
+    for name, size, row in rows:
+        print(f"{name:<24}{size:>10}" + "".join(f"{row[e]:>10}" for e in encs))
@@ -0,0 +1,120 @@
+"""
+String-level visual confusability (anti-spoofing) from glyph embeddings.
+
+A query string is compared position by position against every reference string
+at once:
+
+    sim(q_j, r_j) = 1                                  if the codepoints are equal
+                  = clamp(1 - distance(q_j, r_j))      if both glyphs are in the index
+                  = 0                                  otherwise (or past either end)
+    score(q, r)   = 100 * sum_j sim(q_j, r_j) / max(len(q), len(r))
+
+References are encoded once into padded codepoint / column matrices
+(`ReferenceSet`), so scoring a query is one small matrix product between the
+query's glyphs and the distinct glyphs used by the references, followed by a
+gather over (reference, position). Insertions and deletions are not aligned;
+lookalike attacks that keep the length are what this targets.
+
+Usage:
+    index = EmbeddingIndex.from_vector_db(db)
+    refs = ReferenceSet(["阿里巴巴", "腾讯"], index)
+    scores, positions = score(index, "阿里巴巳", refs)
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex, cross_distances
+
+
+def _glyph_rows(index: EmbeddingIndex, text: str) -> np.ndarray:
+    return np.array([index.row_of.get(f"{ord(ch):04X}", -1) for ch in text], dtype=np.int64)
+
+
+class ReferenceSet:
+    """Reference strings encoded for vectorized scoring (build once, score many queries)."""
+
+    def __init__(self, strings: Sequence[str], index: EmbeddingIndex, max_len: int = 64):
+        self.strings: List[str] = [s[:max_len] for s in strings]
+        n = len(self.strings)
+        self.lengths = np.fromiter((len(s) for s in self.strings), dtype=np.int64, count=n)
+        width = int(self.lengths.max()) if n else 0
+        self.width = width
+        # codepoints, padded with -1: scatter the concatenated strings into their rows
+        self.codes = np.full((n, width), -1, dtype=np.int64)
+        flat = np.frombuffer("".join(self.strings).encode("utf-32-le"), dtype="<u4")
+        starts = np.repeat(np.cumsum(self.lengths) - self.lengths, self.lengths)
+        self.codes[np.repeat(np.arange(n), self.lengths), np.arange(len(flat)) - starts] = flat
+        # each distinct codepoint becomes one column; cols[i, j] indexes into `rows` (-1 = not in index)
+        uniq, inverse = np.unique(self.codes, return_inverse=True)
+        inverse = inverse.reshape(self.codes.shape)
+        uniq_rows = np.array([index.row_of.get(f"{int(cp):04X}", -1) if cp >= 0 else -1 for cp in uniq],
+                             dtype=np.int64)
+        known = uniq_rows >= 0
+        col_of_uniq = np.full(len(uniq), -1, dtype=np.int64)
+        col_of_uniq[known] = np.arange(int(known.sum()))
+        self.rows = uniq_rows[known]
+        self.cols = col_of_uniq[inverse] if n else np.zeros((0, 0), dtype=np.int64)
+        self.vectors = index.matrix[self.rows]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+def score(index: EmbeddingIndex, query: str, refs: ReferenceSet) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (scores 0-100 per reference, per-position similarity n x max(len(query), width))."""
+    n = len(refs)
+    qlen = len(query)
+    width = max(qlen, refs.width)
+    pos = np.zeros((n, width), dtype=np.float32)
+    if n == 0 or qlen == 0:
+        return np.zeros(n, dtype=np.float32), pos
+    m = min(qlen, refs.width)
+    qcodes = np.array([ord(ch) for ch in query[:m]], dtype=np.int64)
+    qrows = _glyph_rows(index, query[:m])
+    if len(refs.rows):
+        qvecs = index.matrix[np.maximum(qrows, 0)]
+        sims = 1.0 - cross_distances(qvecs, refs.vectors, index.space)  # m x distinct reference glyphs
+        np.clip(sims, 0.0, 1.0, out=sims)
+        cols = refs.cols[:, :m]
+        gathered = sims[np.arange(m)[None, :], np.maximum(cols, 0)]
+        usable = (cols >= 0) & (qrows >= 0)[None, :]
+        pos[:, :m] = np.where(usable, gathered, 0.0)
+    pos[:, :m][refs.codes[:, :m] == qcodes[None, :]] = 1.0
+    scores = pos.sum(axis=1) / np.maximum(refs.lengths, qlen) * 100.0
+    return scores.astype(np.float32), pos
+
+
+def top_matches(index: EmbeddingIndex, query: str, refs: ReferenceSet, limit: int = 20,
+                min_score: float = 0.0) -> List[Dict]:
+    """Most confusable references, highest score first, with per-position similarities."""
+    scores, pos = score(index, query, refs)
+    candidates = np.flatnonzero(scores >= min_score)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    out = []
+    for i in candidates.tolist():
+        ref = refs.strings[i]
+        width = max(len(query), len(ref))
+        out.append({
+            "reference": ref,
+            "score": round(float(scores[i]), 1),
+            "positions": [round(float(v) * 100, 1) for v in pos[i, :width]],
+        })
+    return out
+
+
+def missing_glyphs(index: EmbeddingIndex, text: str) -> List[str]:
+    """Characters of text without an embedding (they only match themselves)."""
+    rows = _glyph_rows(index, text)
+    return list(dict.fromkeys(ch for ch, r in zip(text, rows.tolist()) if r < 0))
+
+
+def load_references(path: str) -> List[str]:
+    """One reference string per line; blank lines and '#' comments are skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
@@ -0,0 +1,196 @@
+"""
+Exact, in-memory neighbor search over the full embedding matrix.
+
+Chroma answers one query at a time through its HNSW index. Whole-corpus jobs
+(neighbor export, pairwise similarity) instead load every embedding once and run
+blocked matrix products: each block of query rows is scored against the whole
+matrix with a single BLAS call, then reduced to top-k with `argpartition`.
+The API uses the same index when started with EXACT_SEARCH=1 (top-k and
+threshold searches then never touch HNSW), and for every filtered search:
+`row_mask()` caches a boolean row mask per `CodepointFilter` and the kernels
+score only the masked rows.
+
+Distances follow the collection's hnsw space so results line up with the API:
+  cosine: 1 - cos(a, b)    l2: ||a - b||^2    ip: 1 - a.b
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import cache_lookup
+
+SPACES = ("cosine", "l2", "ip")
+# distinct filters whose row masks are kept per index
+_MASK_CACHE_SIZE = 64
+
+
+def parse_codepoint(uid: str) -> int:
+    """Vector ids are uppercase hex codepoints ("4E00")."""
+    return int(uid, 16)
+
+
+def normalize(vectors: np.ndarray, space: str) -> np.ndarray:
+    """Unit-normalize rows for the cosine space (other spaces use raw vectors)."""
+    v = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if space == "cosine":
+        norms = np.linalg.norm(v, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        v = v / norms
+    return v
+
+
+def cross_distances(a: np.ndarray, b: np.ndarray, space: str) -> np.ndarray:
+    """len(a) x len(b) distances between normalized row sets, one matrix product."""
+    d = a @ b.T
+    if space == "l2":
+        d *= -2.0
+        d += np.einsum("ij,ij->i", a, a)[:, None]
+        d += np.einsum("ij,ij->i", b, b)[None, :]
+        np.maximum(d, 0.0, out=d)
+    else:
+        np.subtract(1.0, d, out=d)
+    return d
+
+
+def paired_distances(a: np.ndarray, b: np.ndarray, space: str) -> np.ndarray:
+    """Row-wise distances d(a[i], b[i]) between normalized row sets."""
+    if space == "l2":
+        diff = a - b
+        return np.einsum("ij,ij->i", diff, diff)
+    return 1.0 - np.einsum("ij,ij->i", a, b)
+
+
+class EmbeddingIndex:
+    def __init__(self, ids: Sequence[str], embeddings: np.ndarray, space: str = "cosine", prepared: bool = False):
+        """`prepared`: embeddings are already in the index representation (e.g. read back from a snapshot)."""
+        if space not in SPACES:
+            raise ValueError(f"unsupported space: {space}")
+        if len(ids) != len(embeddings):
+            raise ValueError("ids and embeddings must have the same length")
+        self.ids: List[str] = [str(i).upper() for i in ids]
+        self.space = space
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.matrix = normalize(matrix, space) if len(matrix) and not prepared else matrix
+        self._sqnorms = np.einsum("ij,ij->i", matrix, matrix) if space == "l2" else None
+        self.codepoints = np.fromiter((parse_codepoint(i) for i in self.ids), dtype=np.uint32, count=len(self.ids))
+        self.row_of: Dict[str, int] = {uid: i for i, uid in enumerate(self.ids)}
+        self._masks: Dict = {}
+        self._masks_lock = threading.Lock()
+
+    @classmethod
+    def from_vector_db(cls, db, batch_size: int = 5000) -> "EmbeddingIndex":
+        ids, matrix = db.load_embedding_matrix(batch_size)
+        return cls(ids, matrix, space=db.distance_space())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def row_mask(self, flt) -> np.ndarray:
+        """Boolean mask of rows passing a CodepointFilter, computed once per distinct filter."""
+        mask = self._masks.get(flt)
+        cache_lookup("filter_mask", "hit" if mask is not None else "miss")
+        if mask is None:
+            mask = flt.mask(self.codepoints)
+            # filtered searches run in the threadpool: evict and insert as one step
+            with self._masks_lock:
+                if len(self._masks) >= _MASK_CACHE_SIZE:
+                    self._masks.pop(next(iter(self._masks)), None)
+                self._masks[flt] = mask
+        return mask
+
+    def prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """Bring external query vectors into the index's representation."""
+        return normalize(vectors, self.space)
+
+    def distances(self, queries: np.ndarray, cols: Optional[np.ndarray] = None) -> np.ndarray:
+        """Distance block (len(queries) x N, or x len(cols)) for prepared query vectors."""
+        target = self.matrix if cols is None else self.matrix[cols]
+        d = queries @ target.T
+        if self.space == "l2":
+            sq = self._sqnorms if cols is None else self._sqnorms[cols]
+            d *= -2.0
+            d += sq[None, :]
+            d += np.einsum("ij,ij->i", queries, queries)[:, None]
+            np.maximum(d, 0.0, out=d)
+        else:
+            np.subtract(1.0, d, out=d)
+        return d
+
+    def _masked_distances(self, queries: np.ndarray, cols: Optional[np.ndarray]) -> np.ndarray:
+        if cols is None:
+            return self.distances(queries)
+        # gathering matrix rows costs more than scoring them; only worth it for narrow masks
+        if len(cols) * 4 < len(self.ids):
+            return self.distances(queries, cols)
+        return self.distances(queries)[:, cols]
+
+    def _exclude(self, d: np.ndarray, cols: Optional[np.ndarray], exclude: np.ndarray) -> bool:
+        """Set d[i, exclude[i]] to inf where that row is among the scored columns; True if any was."""
+        exclude = np.asarray(exclude, dtype=np.int64)
+        if cols is None:
+            d[np.arange(len(d)), exclude] = np.inf
+            return len(d) > 0
+        pos = np.searchsorted(cols, exclude)
+        hit = pos < len(cols)
+        hit[hit] = cols[pos[hit]] == exclude[hit]
+        d[np.flatnonzero(hit), pos[hit]] = np.inf
+        return bool(hit.any())
+
+    def topk(self, queries: np.ndarray, k: int, exclude: Optional[np.ndarray] = None,
+             mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k (rows, distances), nearest first; `exclude[i]` drops one row per query (e.g. itself).
+
+        With `mask`, only rows where it is True are scored and returned.
+        """
+        cols = None if mask is None else np.flatnonzero(mask)
+        d = self._masked_distances(queries, cols)
+        dropped = exclude is not None and self._exclude(d, cols, exclude)
+        n = d.shape[1]
+        k = min(k, n - (1 if dropped else 0))
+        if k <= 0:
+            empty = np.zeros((len(d), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if k < n:
+            part = np.argpartition(d, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(n), d.shape).copy()
+        pd = np.take_along_axis(d, part, axis=1)
+        order = np.argsort(pd, axis=1, kind="stable")
+        rows = np.take_along_axis(part, order, axis=1)
+        return (rows if cols is None else cols[rows]), np.take_along_axis(pd, order, axis=1)
+
+    def range_search(self, query: np.ndarray, max_distance: float, max_results: int,
+                     exclude: Optional[int] = None, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """All rows within max_distance of one prepared query, nearest first, capped at max_results.
+
+        Pruning is a boolean mask over the distance row; only the survivors are sorted.
+        With `mask`, only rows where it is True are scored.
+        """
+        cols = None if mask is None else np.flatnonzero(mask)
+        d = self._masked_distances(np.atleast_2d(query), cols)[0]
+        within = d <= max_distance
+        if exclude is not None:
+            if cols is None:
+                within[exclude] = False
+            else:
+                pos = np.searchsorted(cols, exclude)
+                if pos < len(cols) and cols[pos] == exclude:
+                    within[pos] = False
+        hits = np.flatnonzero(within)
+        if len(hits) > max_results:
+            hits = hits[np.argpartition(d[hits], max_results - 1)[:max_results]]
+        hits = hits[np.argsort(d[hits], kind="stable")]
+        return (hits if cols is None else cols[hits]), d[hits]
+
+    def topk_rows(self, start: int, stop: int, k: int, exclude_self: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k neighbors for index rows [start, stop) — one block of an all-pairs job."""
+        exclude = np.arange(start, stop) if exclude_self else None
+        return self.topk(self.matrix[start:stop], k, exclude)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Export the full similarity graph: top-k similar glyphs for every vector in the DB.
+
+All embeddings are loaded once from ChromaVectorDB; neighbors are computed exactly
+with blocked matrix products (see embedding_index.py) on a thread pool and written
+block by block, so memory stays bounded by --memory-mb regardless of output size.
+
+Output formats (picked from the --out extension unless --format is given):
+  jsonl    one line per query: {"unicode": "U+4E00", "neighbors": [...], "distances": [...]}
+           (".jsonl.gz" is gzip-compressed)
+  npz      arrays query_codepoints <u4[N], codepoints <u4[N, k], distances <f4[N, k]
+  parquet  edge list: query u32, rank u16, neighbor u32, distance f32 (needs 'pyarrow')
+
+Examples:
+  uv run python export_neighbors.py --out neighbors.parquet --top-k 50
+  uv run python export_neighbors.py --out neighbors.jsonl.gz
+  uv run python export_neighbors.py --out neighbors.npz --workers 8 --memory-mb 2048
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+try:
+    from tqdm.auto import tqdm  # type: ignore
+except Exception:  # pragma: no cover
+    tqdm = None  # type: ignore
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+from embedding_index import EmbeddingIndex
+from index_registry import resolve_index_dir
+from result_codec import dumps
+
+FORMATS = ("jsonl", "npz", "parquet")
+# bytes per distance cell while a block is reduced: float32 scores + int64 argpartition indices
+_BYTES_PER_CELL = 12
+
+
+def detect_format(path: str) -> Optional[str]:
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    ext = os.path.splitext(name)[1].lstrip(".")
+    return ext if ext in FORMATS else None
+
+
+def auto_block_rows(n: int, workers: int, memory_mb: int) -> int:
+    budget = memory_mb * 1024 * 1024
+    return int(max(1, min(4096, budget // max(1, workers * n * _BYTES_PER_CELL))))
+
+
+def iter_blocks(index: EmbeddingIndex, k: int, block_rows: int,
+                workers: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """Yield (start, rows, distances) blocks in order; at most 2 * workers blocks in flight."""
+    n = len(index)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        pending = deque()
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            pending.append((start, ex.submit(index.topk_rows, start, stop, k)))
+            if len(pending) >= 2 * workers:
+                s, fut = pending.popleft()
+                yield (s, *fut.result())
+        while pending:
+            s, fut = pending.popleft()
+            yield (s, *fut.result())
+
+
+class JsonlWriter:
+    def __init__(self, path: str, index: EmbeddingIndex, k: int):
+        self.index = index
+        self.labels = [f"U+{uid}" for uid in index.ids]
+        self._f = gzip.open(path, "wb") if path.lower().endswith(".gz") else open(path, "wb")
+
+    def write(self, start: int, rows: np.ndarray, dists: np.ndarray):
+        labels = self.labels
+        dists = np.round(dists.astype(np.float64), 6).tolist()
+        lines = []
+        for i, (r, d) in enumerate(zip(rows.tolist(), dists)):
+            lines.append(dumps({"unicode": labels[start + i], "neighbors": [labels[j] for j in r], "distances": d}))
+        self._f.write(b"\n".join(lines) + b"\n")
+
+    def close(self):
+        self._f.close()
+
+
+class NpzWriter:
+    """Rows go to memory-mapped .npy files, zipped (stored) into the .npz on close()."""
+
+    def __init__(self, path: str, index: EmbeddingIndex, k: int):
+        self.path = path
+        self.index = index
+        n = len(index)
+        self._tmpdir = tempfile.mkdtemp(prefix="neighbors-", dir=os.path.dirname(os.path.abspath(path)))
+        open_memmap = np.lib.format.open_memmap
+        self.codepoints = open_memmap(os.path.join(self._tmpdir, "codepoints.npy"), mode="w+", dtype="<u4", shape=(n, k))
+        self.distances = open_memmap(os.path.join(self._tmpdir, "distances.npy"), mode="w+", dtype="<f4", shape=(n, k))
+
+    def write(self, start: int, rows: np.ndarray, dists: np.ndarray):
+        stop = start + len(rows)
+        self.codepoints[start:stop] = self.index.codepoints[rows]
+        self.distances[start:stop] = dists
+
+    def close(self):
+        try:
+            for arr in (self.codepoints, self.distances):
+                arr.flush()
+            with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+                with zf.open("query_codepoints.npy", "w", force_zip64=True) as f:
+                    np.lib.format.write_array(f, self.index.codepoints.astype("<u4"))
+                for name in ("codepoints", "distances"):
+                    zf.write(os.path.join(self._tmpdir, f"{name}.npy"), f"{name}.npy")
+        finally:
+            del self.codepoints, self.distances
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class ParquetWriter:
+    def __init__(self, path: str, index: EmbeddingIndex, k: int):
+        if pq is None:
+            raise RuntimeError("pyarrow is not installed. Please install 'pyarrow'.")
+        self.index = index
+        self.schema = pa.schema([("query", pa.uint32()), ("rank", pa.uint16()),
+                                 ("neighbor", pa.uint32()), ("distance", pa.float32())])
+        self._w = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, start: int, rows: np.ndarray, dists: np.ndarray):
+        b, k = rows.shape
+        query = np.repeat(self.index.codepoints[start:start + b], k)
+        rank = np.tile(np.arange(1, k + 1, dtype=np.uint16), b)
+        table = pa.table({"query": query, "rank": rank, "neighbor": self.index.codepoints[rows].ravel(),
+                          "distance": dists.astype(np.float32).ravel()}, schema=self.schema)
+        self._w.write_table(table)
+
+    def close(self):
+        self._w.close()
+
+
+WRITERS = {"jsonl": JsonlWriter, "npz": NpzWriter, "parquet": ParquetWriter}
+
+
+def export(index: EmbeddingIndex, out_path: str, fmt: str, k: int, workers: int, block_rows: int) -> int:
+    """Write the top-k graph to out_path (atomically via a temp sibling); returns queries written."""
+    n = len(index)
+    # keep the extension so writers still see ".gz"
+    head, tail = os.path.split(out_path)
+    tmp = os.path.join(head, f".tmp-{tail}")
+    writer = WRITERS[fmt](tmp, index, k)
+    bar = tqdm(total=n, desc="导出近邻", unit="字") if tqdm is not None else None
+    done = 0
+    t0 = time.perf_counter()
+    try:
+        for start, rows, dists in iter_blocks(index, k, block_rows, workers):
+            writer.write(start, rows, dists)
+            done += len(rows)
+            if bar is not None:
+                bar.update(len(rows))
+            elif done == n or (start // block_rows) % 20 == 0:
+                print(f"  {done}/{n} ({done / max(1e-9, time.perf_counter() - t0):.0f} 字/秒)")
+        writer.close()
+    except BaseException:
+        if bar is not None:
+            bar.close()
+        try:
+            writer.close()
+        except Exception:
+            pass
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if bar is not None:
+        bar.close()
+    os.replace(tmp, out_path)
+    return done
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export the top-k similar glyphs for every vector in the database.")
+    parser.add_argument('--db-path', default=os.environ.get('CHROMA_DB_PATH', './chroma_db'),
+                        help='ChromaDB directory (default: $CHROMA_DB_PATH or ./chroma_db)')
+    parser.add_argument('--collection', default='hanzi_images', help='Collection name (default: hanzi_images)')
+    parser.add_argument('--out', required=True, help='Output file (.jsonl, .jsonl.gz, .npz or .parquet)')
+    parser.add_argument('--format', choices=list(FORMATS), default=None, help='Output format (default: from --out extension)')
+    parser.add_argument('--top-k', type=int, default=50, help='Neighbors per glyph, excluding itself (default: 50)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Threads computing blocks; BLAS may add its own threads (default: min(4, cores))')
+    parser.add_argument('--memory-mb', type=int, default=512,
+                        help='Budget for in-flight distance blocks, used to size --block-rows (default: 512)')
+    parser.add_argument('--block-rows', type=int, default=0, help='Query rows per matrix product (default: auto)')
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.out)
+    if fmt is None:
+        print(f"错误: 无法从文件名推断输出格式: {args.out}，请使用 --format 指定。")
+        return 2
+    if fmt == "parquet" and pq is None:
+        print("错误: 导出 Parquet 需要安装 pyarrow。")
+        return 2
+
+    from vector_db import ChromaVectorDB
+
+    t0 = time.perf_counter()
+    db = ChromaVectorDB(db_path=resolve_index_dir(args.db_path)[0], collection_name=args.collection,
+                        allow_memory_fallback=False)
+    index = EmbeddingIndex.from_vector_db(db)
+    n = len(index)
+    if n < 2:
+        print("错误: 向量库为空或只有一个向量，请先运行 advanced_vectorizer.py 构建。")
+        return 1
+    load_s = time.perf_counter() - t0
+    k = min(args.top_k, n - 1)
+    workers = max(1, args.workers)
+    block_rows = args.block_rows or auto_block_rows(n, workers, args.memory_mb)
+    print(f"已加载 {n} 个向量 (维度 {index.dim}, 距离 {index.space})，用时 {load_s:.1f}s")
+    print(f"准备导出 top-{k} 近邻到 {args.out} ({fmt})，{workers} 个线程，每块 {block_rows} 行")
+
+    t1 = time.perf_counter()
+    done = export(index, args.out, fmt, k, workers, block_rows)
+    elapsed = time.perf_counter() - t1
+    size_mb = os.path.getsize(args.out) / 1024 / 1024
+    print(f"完成: 导出 {done} 个字 × {k} 个近邻，用时 {elapsed:.1f}s "
+          f"({done / max(1e-9, elapsed):.0f} 字/秒)，输出 {size_mb:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,12 @@ import os
 import sys
 import glob
 import argparse
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Tuple
 from PIL import Image, ImageDraw, ImageFont
 from fontTools.ttLib import TTFont, TTCollection
 
+from codepoint_set import CodepointSet
+
 # 生成汉字图片的范围（包含多个中文字符区间）
 # 定义多个Unicode区间
 unicode_ranges = [
@@ -84,10 +86,17 @@ def expand_font_paths(font_paths: List[str]) -> List[str]:
     return result
 
 
+def _cmap_coverage(font) -> CodepointSet:
+    """所有 cmap 子表码点的并集（区间编码）。"""
+    if 'cmap' not in font:
+        return CodepointSet.empty()
+    return CodepointSet.union_all(CodepointSet.from_codepoints(table.cmap) for table in font['cmap'].tables)
+
+
 def build_font_coverage(font_paths: List[str]) -> List[Dict]:
     """读取字体的cmap，构建每个字体可渲染的码点集合。
     支持ttf/otf/ttc。对于ttc，将展开为多个face，分别记录其覆盖。
-    返回列表：[{ 'path': str, 'index': int, 'codepoints': set[int] }]
+    返回列表：[{ 'path': str, 'index': int, 'codepoints': CodepointSet }]
     """
     candidates: List[Dict] = []
     for path in font_paths:
@@ -97,18 +106,12 @@ def build_font_coverage(font_paths: List[str]) -> List[Dict]:
             if path.lower().endswith('.ttc'):
                 coll = TTCollection(path)
                 for idx, font in enumerate(coll.fonts):
-                    cps: Set[int] = set()
-                    if 'cmap' in font:
-                        for table in font['cmap'].tables:
-                            cps.update(table.cmap.keys())
+                    cps = _cmap_coverage(font)
                     if cps:
                         candidates.append({'path': path, 'index': idx, 'codepoints': cps})
             else:
                 font = TTFont(path, lazy=True)
-                cps: Set[int] = set()
-                if 'cmap' in font:
-                    for table in font['cmap'].tables:
-                        cps.update(table.cmap.keys())
+                cps = _cmap_coverage(font)
                 if cps:
                     candidates.append({'path': path, 'index': 0, 'codepoints': cps})
         except Exception as e:
@@ -135,18 +138,17 @@ if not candidates:
 # 预加载PIL字体对象缓存： key=(path,index) -> ImageFont.FreeTypeFont
 pil_font_cache: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = {}
 
-missing_codes = []
 total_to_generate = 0
 for start, end in unicode_ranges:
     total_to_generate += (end - start + 1)
 
 print(f"计划生成 {total_to_generate} 个字符，使用 {len(candidates)} 个字体候选。")
 
-# 先检查覆盖以便在开始绘制之前就失败（避免生成半截）。
-for start, end in unicode_ranges:
-    for code in range(start, end + 1):
-        if select_font_for_codepoint(candidates, code) is None:
-            missing_codes.append(code)
+# 先检查覆盖以便在开始绘制之前就失败（避免生成半截）；在区间上整体计算，不逐码点查找。
+covered = CodepointSet.union_all(item['codepoints'] for item in candidates)
+for (start, end), n in zip(unicode_ranges, covered.count_in(unicode_ranges).tolist()):
+    print(f"  U+{start:04X}..U+{end:04X}: 覆盖 {n}/{end - start + 1}")
+missing_codes = (CodepointSet.from_ranges(unicode_ranges) - covered).to_numpy().tolist()
 
 if missing_codes:
     preview = ', '.join([f"U+{c:04X}" for c in missing_codes[:20]])
@@ -16,13 +16,20 @@ Examples:
 
   # Generate specific codepoints only
   uv run --python 3.13 generate_hanzi_svgs.py --codes 4E00,4E8C,884C
+
+  # Pack everything into one indexed bundle (svg/glyphs.hzsb) instead of ~30k files
+  uv run --python 3.13 generate_hanzi_svgs.py --format bundle --compress gzip
+
+  # Bundle size-independent outlines (the API composes any size/fill from them)
+  uv run --python 3.13 generate_hanzi_svgs.py --format bundle --payload path --compress gzip
 """
 
 import argparse
+import json
 import os
 import sys
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
-from typing import Iterable, List, Set, Sequence
+from typing import Iterable, List, Sequence
 
 # Optional progress bar
 try:
@@ -34,7 +41,11 @@ except Exception:  # pragma: no cover
         # Minimal fallback: passthrough iterable
         return iterable if iterable is not None else []
 
-from svg_renderer import SvgGlyphRenderer
+from svg_renderer import SvgGlyphRenderer, compose_svg, default_coverage_cache
+from codepoint_set import CodepointSet
+from svg_bundle import CODECS, SvgBundleWriter, merge_bundles
+from glyph_store import DIR_META_FILE, encode_outline
+from compression import available_encodings, compress
 
 # Default Unicode ranges (aligned with generate_hanzi_images.py)
 DEFAULT_RANGES = [
@@ -68,6 +79,15 @@ def iter_default_codes(ranges=DEFAULT_RANGES) -> Iterable[int]:
             yield cp
 
 
+def print_range_coverage(covered: CodepointSet, ranges=DEFAULT_RANGES):
+    """Covered / total per range, counted on the coverage runs (no per-codepoint loop)."""
+    counts = covered.count_in(ranges)
+    print("字体覆盖:")
+    for (s, e), n in zip(ranges, counts.tolist()):
+        total = e - s + 1
+        print(f"  U+{s:04X}..U+{e:04X}: {n}/{total} ({n / total * 100:.1f}%)")
+
+
 def shard_list(items: Sequence[int], parts: int) -> List[List[int]]:
     """Split list into at most `parts` shards with near-equal sizes (contiguous chunks)."""
     n = len(items)
@@ -93,37 +113,93 @@ _WORKER_RENDERER = None  # type: ignore[var-annotated]
 _WORKER_PARAMS = None    # type: ignore[var-annotated]
 
 
-def _init_worker(fonts_dir: str, size: int, padding: int, fill: str, out_dir: str):
+def bundle_meta(params: dict) -> dict:
+    """Render parameters recorded in the bundle header / svg_meta.json so readers can verify a match."""
+    return {'size': params['size'], 'padding': params['padding'], 'fill': params['fill'],
+            'kind': params['payload'], 'compact': params['compact'], 'precision': params['precision']}
+
+
+def render_payload(renderer: SvgGlyphRenderer, cp: int, params: dict) -> tuple[bytes, int]:
+    """Render one glyph to its output payload.
+    Returns (payload_bytes, standard_svg_len); the latter is the size of the non-compact
+    SVG and feeds the bytes-saved report for --compact.
+    """
+    d, bounds = renderer.glyph_outline(cp)
+    if params['payload'] == 'path':
+        data = encode_outline(d, bounds)
+        return data, len(data)
+    svg = compose_svg(d, bounds, size=params['size'], padding=params['padding'], fill=params['fill'],
+                      compact=params['compact'], precision=params['precision']).encode('utf-8')
+    if not params['compact']:
+        return svg, len(svg)
+    standard = compose_svg(d, bounds, size=params['size'], padding=params['padding'], fill=params['fill'])
+    return svg, len(standard.encode('utf-8'))
+
+
+def write_svg_file(out_dir: str, cp: int, svg: bytes, precompress: bool = False):
+    fn = os.path.join(out_dir, f"{cp:04X}.svg")
+    variants = [(fn, svg)]
+    if precompress:
+        # .svg.gz / .svg.br next to the file: the API serves these without compressing again
+        exts = {'gzip': '.gz', 'br': '.br'}
+        variants += [(fn + exts[enc], compress(svg, enc, static=True)) for enc in available_encodings()]
+    for path, data in variants:
+        # atomic-ish write
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+def shard_bundle_path(bundle_path: str, shard_index: int) -> str:
+    return f"{bundle_path}.part{shard_index}"
+
+
+def _init_worker(fonts_dir: str, params: dict, coverage_cache: str | None = None):
     """Per-process initializer: build renderer and cache params in globals."""
     global _WORKER_RENDERER, _WORKER_PARAMS
-    _WORKER_RENDERER = SvgGlyphRenderer(fonts_dir)
-    # Preload faces/coverage to avoid re-scan per glyph
+    _WORKER_RENDERER = SvgGlyphRenderer(fonts_dir, coverage_cache=coverage_cache)
+    # Preload faces/coverage to avoid re-scan per glyph (read from the cache the parent just wrote)
     _WORKER_RENDERER._load_faces()  # type: ignore[attr-defined]
-    _WORKER_PARAMS = dict(size=size, padding=padding, fill=fill, out_dir=out_dir)
+    _WORKER_PARAMS = params
 
 
-def _proc_worker(args_tuple) -> tuple[int, int, List[str]]:
+def _proc_worker(args_tuple) -> tuple[int, int, List[str], int, int]:
     """Process worker: render a shard of codepoints.
-    Returns (done_count, error_count, first_errors)
+    Returns (done_count, error_count, first_errors, bytes_written, standard_bytes)
     """
     shard_index, shard = args_tuple
     local_errors = 0
     first_errs: List[str] = []
     params = _WORKER_PARAMS  # type: ignore[name-defined]
     renderer = _WORKER_RENDERER  # type: ignore[name-defined]
-    for cp in shard:
-        fn = os.path.join(params['out_dir'], f"{cp:04X}.svg")
-        try:
-            svg = renderer.render_svg(cp, size=params['size'], padding=params['padding'], fill=params['fill'])
-            tmp = fn + '.tmp'
-            with open(tmp, 'w', encoding='utf-8') as f:
-                f.write(svg)
-            os.replace(tmp, fn)
-        except Exception as e:
-            local_errors += 1
-            if len(first_errs) < 5:
-                first_errs.append(f"U+{cp:04X}: {e}")
-    return (len(shard), local_errors, first_errs)
+    bytes_out = bytes_std = 0
+    bundle = None
+    if params['bundle_path']:
+        # One bundle per shard: payloads are appended, the index is written on close
+        bundle = SvgBundleWriter(shard_bundle_path(params['bundle_path'], shard_index), codec=params['codec'],
+                                 meta=bundle_meta(params))
+    try:
+        for cp in shard:
+            try:
+                data, std_len = render_payload(renderer, cp, params)
+                if bundle is not None:
+                    bundle.add(cp, data)
+                else:
+                    write_svg_file(params['out_dir'], cp, data, params['precompress'])
+                bytes_out += len(data)
+                bytes_std += std_len
+            except Exception as e:
+                local_errors += 1
+                if len(first_errs) < 5:
+                    first_errs.append(f"U+{cp:04X}: {e}")
+    except BaseException:
+        if bundle is not None:
+            bundle.abort()
+        raise
+    if bundle is not None:
+        bundle.close()
+    return (len(shard), local_errors, first_errs, bytes_out, bytes_std)
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Generate Hanzi SVGs concurrently using project fonts.")
@@ -138,13 +214,47 @@ def main() -> int:
     parser.add_argument('--codes', default='', help='Comma-separated codepoints (hex or chars), e.g., 4E00,4E8C,884C or 一,二')
     parser.add_argument('--fonts-dir', default=os.environ.get('FONTS_DIR') or 'fonts', help='Fonts directory (default: fonts or $FONTS_DIR)')
     parser.add_argument('--mode', choices=['process', 'thread'], default='process', help='Concurrency mode (default: process)')
+    parser.add_argument('--coverage-cache', default=os.environ.get('FONT_COVERAGE_CACHE'),
+                        help='Font coverage cache file (default: $FONT_COVERAGE_CACHE or .font_coverage.npz in --fonts-dir)')
+    parser.add_argument('--no-coverage-cache', action='store_true',
+                        help='Always parse the font cmaps; neither read nor write the coverage cache')
+    parser.add_argument('--format', choices=['files', 'bundle'], default='files',
+                        help='Output format: one .svg per glyph, or a single indexed bundle (default: files)')
+    parser.add_argument('--bundle-name', default='glyphs.hzsb', help='Bundle file name inside --out (default: glyphs.hzsb)')
+    parser.add_argument('--compress', choices=list(CODECS), default='none',
+                        help='Per-glyph payload compression for --format bundle (default: none)')
+    parser.add_argument('--payload', choices=['svg', 'path'], default='svg',
+                        help='Bundle payload: rendered SVG, or size-independent outline (default: svg)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Minified SVG: transform baked into quantized relative path data; reports bytes saved')
+    parser.add_argument('--precompress', action='store_true',
+                        help='Also write .svg.gz (and .svg.br when brotli is installed) next to each file '
+                             '(--format files only; bundles use --compress gzip instead)')
+    parser.add_argument('--precision', type=int, default=1,
+                        help='Decimal places kept in --compact coordinates, in output pixels (default: 1)')
     args = parser.parse_args()
 
     out_dir = args.out_dir
     os.makedirs(out_dir, exist_ok=True)
-
-    # Init renderer (will scan fonts and build coverage)
-    renderer = SvgGlyphRenderer(args.fonts_dir)
+    bundle_path = os.path.join(out_dir, args.bundle_name) if args.format == 'bundle' else None
+    if args.payload == 'path' and bundle_path is None:
+        print("错误: --payload path 仅支持 --format bundle。")
+        return 2
+    if args.precompress and bundle_path is not None:
+        print("错误: --precompress 仅支持 --format files；打包格式请使用 --compress gzip。")
+        return 2
+    params = dict(size=args.size, padding=args.padding, fill=args.fill, out_dir=out_dir,
+                  bundle_path=bundle_path, codec=args.compress, payload=args.payload,
+                  compact=args.compact, precision=args.precision, precompress=args.precompress)
+    if bundle_path is None:
+        # Record render parameters so the API glyph store only serves matching requests
+        with open(os.path.join(out_dir, DIR_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(bundle_meta(params), f)
+
+    coverage_cache = None if args.no_coverage_cache else (args.coverage_cache
+                                                          or default_coverage_cache(args.fonts_dir))
+    # Init renderer (will scan fonts and build coverage, or read it from the cache)
+    renderer = SvgGlyphRenderer(args.fonts_dir, coverage_cache=coverage_cache)
     try:
         # force load faces and coverage
         renderer._load_faces()  # type: ignore[attr-defined]
@@ -156,20 +266,19 @@ def main() -> int:
         print(f"错误: 字体目录 {args.fonts_dir} 中未找到可用字体。")
         return 2
 
-    # Build coverage set for quick pre-check
-    covered: Set[int] = set()
-    for face in renderer.faces:
-        if face.codepoints:
-            covered.update(face.codepoints)
+    # Union of all faces for a vectorized pre-check
+    covered = CodepointSet.union_all(face.codepoints for face in renderer.faces)
 
     # Determine target codepoints
     if args.codes:
         targets = parse_codes_arg(args.codes)
     else:
         targets = list(iter_default_codes())
+        print_range_coverage(covered)
 
     # Pre-check coverage
-    missing = [cp for cp in targets if cp not in covered]
+    present = covered.contains(targets)
+    missing = [cp for cp, ok in zip(targets, present.tolist()) if not ok]
     if missing:
         preview = ', '.join([f"U+{cp:04X}" for cp in missing[:20]])
         if not args.allow_missing:
@@ -184,26 +293,25 @@ def main() -> int:
         except Exception:
             pass
         # filter out missing
-        targets = [cp for cp in targets if cp not in set(missing)]
+        targets = [cp for cp, ok in zip(targets, present.tolist()) if ok]
 
     total = len(targets)
-    print(f"准备生成 {total} 个SVG 到 {out_dir}，使用 {args.workers} 个{'进程' if args.mode=='process' else '线程'}，字体目录: {args.fonts_dir}")
+    print(f"准备生成 {total} 个SVG 到 {bundle_path or out_dir}，使用 {args.workers} 个{'进程' if args.mode=='process' else '线程'}，字体目录: {args.fonts_dir}")
 
     # Worker function
-    def render_one(cp: int) -> tuple[int, str | None]:
-        fn = os.path.join(out_dir, f"{cp:04X}.svg")
+    def render_one(cp: int, bundle: SvgBundleWriter | None = None) -> tuple[int, str | None, int, int]:
         try:
-            svg = renderer.render_svg(cp, size=args.size, padding=args.padding, fill=args.fill)
-            # atomic-ish write
-            tmp = fn + '.tmp'
-            with open(tmp, 'w', encoding='utf-8') as f:
-                f.write(svg)
-            os.replace(tmp, fn)
-            return (cp, None)
+            data, std_len = render_payload(renderer, cp, params)
+            if bundle is not None:
+                bundle.add(cp, data)
+            else:
+                write_svg_file(out_dir, cp, data, args.precompress)
+            return (cp, None, len(data), std_len)
         except Exception as e:
-            return (cp, str(e))
+            return (cp, str(e), 0, 0)
 
     errors = 0
+    bytes_out = bytes_std = 0
     # Per-thread progress bars: split targets into shards and assign to workers
     num_workers = min(args.workers, max(1, len(targets)))
     shards = shard_list(targets, num_workers)
@@ -212,31 +320,46 @@ def main() -> int:
 
     if args.mode == 'thread':
         # Per-thread bars (existing behavior)
-        def worker(shard_index: int, shard: List[int]) -> tuple[int, List[str]]:
+        def worker(shard_index: int, shard: List[int]) -> tuple[int, List[str], int, int]:
             bar = None
             if _HAVE_TQDM:
                 bar = tqdm(total=len(shard), desc=f"线程#{shard_index+1}", unit="svg", position=shard_index, leave=True)
             local_errors = 0
             first_errs: List[str] = []
+            local_out = local_std = 0
+            bundle = None
+            if bundle_path:
+                bundle = SvgBundleWriter(shard_bundle_path(bundle_path, shard_index), codec=args.compress,
+                                         meta=bundle_meta(params))
             try:
                 for cp in shard:
-                    cp_, err = render_one(cp)
+                    cp_, err, n_out, n_std = render_one(cp, bundle)
+                    local_out += n_out
+                    local_std += n_std
                     if err is not None:
                         local_errors += 1
                         if len(first_errs) < 5:
                             first_errs.append(f"U+{cp_:04X}: {err}")
                     if bar is not None:
                         bar.update(1)
+            except BaseException:
+                if bundle is not None:
+                    bundle.abort()
+                raise
             finally:
                 if bar is not None:
                     bar.close()
-            return local_errors, first_errs
+            if bundle is not None:
+                bundle.close()
+            return local_errors, first_errs, local_out, local_std
 
         with ThreadPoolExecutor(max_workers=num_workers) as ex:
             futs = [ex.submit(worker, i, shard) for i, shard in enumerate(shards) if shard]
             for fut in as_completed(futs):
-                ecount, ferrs = fut.result()
+                ecount, ferrs, n_out, n_std = fut.result()
                 errors += ecount
+                bytes_out += n_out
+                bytes_std += n_std
                 all_first_errs.extend(ferrs)
 
     else:
@@ -244,11 +367,13 @@ def main() -> int:
         pbar = tqdm(total=total, desc="渲染SVG(多进程)", unit="svg") if _HAVE_TQDM else None
         try:
             with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
-                                     initargs=(args.fonts_dir, args.size, args.padding, args.fill, out_dir)) as ex:
+                                     initargs=(args.fonts_dir, params, coverage_cache)) as ex:
                 futs = [ex.submit(_proc_worker, (i, shard)) for i, shard in enumerate(shards) if shard]
                 for fut in as_completed(futs):
-                    done_count, ecount, ferrs = fut.result()
+                    done_count, ecount, ferrs, n_out, n_std = fut.result()
                     errors += ecount
+                    bytes_out += n_out
+                    bytes_std += n_std
                     all_first_errs.extend(ferrs)
                     if pbar is not None:
                         pbar.update(done_count)
@@ -262,6 +387,24 @@ def main() -> int:
         for line in all_first_errs[:10]:
             print("  ", line)
 
+    if args.compact and bytes_std > 0:
+        saved = bytes_std - bytes_out
+        print(f"压缩输出: {bytes_out / 1024:.1f} KB (标准SVG {bytes_std / 1024:.1f} KB)，"
+              f"节省 {saved / 1024:.1f} KB ({saved / bytes_std * 100:.1f}%)，"
+              f"平均每字 {bytes_out / max(1, total - errors):.0f} B")
+
+    if bundle_path:
+        # Merge per-shard bundles into the final indexed file
+        parts = [shard_bundle_path(bundle_path, i) for i, shard in enumerate(shards) if shard]
+        parts = [p for p in parts if os.path.exists(p)]
+        if parts:
+            count = merge_bundles(parts, bundle_path)
+            print(f"完成: 打包 {count} 个字形，失败 {errors} 个。输出文件: {bundle_path} "
+                  f"({os.path.getsize(bundle_path) / 1024 / 1024:.1f} MB, 压缩: {args.compress})")
+        else:
+            print(f"完成: 没有可打包的字形，失败 {errors} 个。")
+        return 0 if errors == 0 else 4
+
     print(f"完成: 生成 {total - errors} 个文件，失败 {errors} 个。输出目录: {out_dir}")
     return 0 if errors == 0 else 4
 
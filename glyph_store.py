@@ -0,0 +1,227 @@
+"""
+Pre-rendered glyph store consulted by `/glyph/svg` before live font rendering.
+
+Sources, in lookup order:
+  1. in-memory LRU of recently served SVGs (including live renders)
+  2. a packed bundle (`generate_hanzi_svgs.py --format bundle`), mmap'd
+  3. an SVG output directory (`generate_hanzi_svgs.py --out svg`)
+
+Bundles written with `--payload path` store size-independent outlines (font-unit
+path data + bounds) and can serve any size/fill; `svg` payloads and directories
+only serve requests matching the parameters they were rendered with (size,
+padding, fill, compact and, for compact output, coordinate precision).
+
+Cached entries also hold gzip/brotli variants. They are taken from precompressed
+sources when present (`XXXX.svg.gz`/`.svg.br` next to directory output, gzip-codec
+bundle payloads) or compressed once on first request at the dynamic levels, so hot
+glyphs are never compressed twice. With the cache off, compression is left to
+CompressionMiddleware.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from compression import compress
+from metrics import cache_lookup
+from svg_bundle import SvgBundleReader
+from svg_renderer import compose_svg
+
+# Written next to `--format files` output so the store knows the render parameters
+DIR_META_FILE = "svg_meta.json"
+DEFAULT_RENDER_PARAMS = {"size": 128, "padding": 8, "fill": "#000", "compact": False, "precision": 1}
+
+GlyphKey = Tuple[int, int, int, str, bool]  # (cp, size, padding, fill, compact)
+
+
+def encode_outline(d: str, bounds) -> bytes:
+    """Serialize a size-independent outline: JSON bounds line + path data."""
+    head = json.dumps(list(bounds) if bounds else None)
+    return f"{head}\n{d}".encode("utf-8")
+
+
+def decode_outline(data: bytes):
+    head, _, d = data.decode("utf-8").partition("\n")
+    bounds = json.loads(head)
+    return d, (tuple(bounds) if bounds else None)
+
+
+def _params_match(meta: Dict, size: int, padding: int, fill: str, compact: bool, precision: int = 1) -> bool:
+    # precision only shapes compact path data; stores written before it was recorded used 1
+    return (meta.get("size") == size and meta.get("padding") == padding and meta.get("fill") == fill
+            and bool(meta.get("compact", False)) == compact
+            and (not compact or meta.get("precision", 1) == precision))
+
+
+class GlyphStore:
+    def __init__(self, svg_dir: Optional[str] = None, bundle_path: Optional[str] = None, cache_size: int = 4096):
+        self.svg_dir = svg_dir if svg_dir and os.path.isdir(svg_dir) else None
+        self.dir_meta: Dict = dict(DEFAULT_RENDER_PARAMS)
+        if self.svg_dir:
+            try:
+                with open(os.path.join(self.svg_dir, DIR_META_FILE), "r", encoding="utf-8") as f:
+                    self.dir_meta.update(json.load(f))
+            except FileNotFoundError:
+                pass
+        self.bundle: Optional[SvgBundleReader] = None
+        if bundle_path and os.path.isfile(bundle_path):
+            self.bundle = SvgBundleReader(bundle_path)
+        self.cache_size = max(0, cache_size)
+        # key -> {"identity": svg bytes, "gzip": ..., "br": ...}
+        self._cache: "OrderedDict[GlyphKey, Dict[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {"cache": 0, "bundle": 0, "dir": 0}
+        self.misses = 0
+        self.encoded: Dict[str, int] = {"cached": 0, "precompressed": 0, "compressed": 0}
+        # bounded record of codepoints that had to be rendered live
+        self.missed: "OrderedDict[int, int]" = OrderedDict()
+        self.max_missed = 1024
+
+    @property
+    def bundle_kind(self) -> Optional[str]:
+        if self.bundle is None:
+            return None
+        return self.bundle.meta.get("kind", "svg")
+
+    def _cache_get(self, key: GlyphKey) -> Optional[Dict[str, bytes]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def put(self, cp: int, size: int, padding: int, fill: str, svg: str | bytes, compact: bool = False):
+        if self.cache_size == 0:
+            return
+        data = svg.encode("utf-8") if isinstance(svg, str) else svg
+        key = (cp, size, padding, fill, compact)
+        with self._lock:
+            self._cache[key] = {"identity": data}
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _from_bundle(self, cp: int, size: int, padding: int, fill: str, compact: bool) -> Optional[bytes]:
+        bundle = self.bundle
+        if bundle is None:
+            return None
+        if self.bundle_kind == "path":
+            payload = bundle.get(cp)
+            if payload is None:
+                return None
+            d, bounds = decode_outline(payload)
+            return compose_svg(d, bounds, size=size, padding=padding, fill=fill, compact=compact).encode("utf-8")
+        if _params_match(bundle.meta, size, padding, fill, compact):
+            return bundle.get(cp)
+        return None
+
+    def _from_dir(self, cp: int, size: int, padding: int, fill: str, compact: bool) -> Optional[bytes]:
+        if not self.svg_dir or not _params_match(self.dir_meta, size, padding, fill, compact):
+            return None
+        try:
+            with open(os.path.join(self.svg_dir, f"{cp:04X}.svg"), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, cp: int, size: int = 128, padding: int = 8, fill: str = "#000",
+            compact: bool = False) -> Optional[bytes]:
+        """Return pre-rendered SVG bytes, or None when the caller must render live."""
+        key = (cp, size, padding, fill, compact)
+        entry = self._cache_get(key)
+        if entry is not None:
+            self.hits["cache"] += 1
+            cache_lookup("glyph", "cache")
+            return entry["identity"]
+        for source, fetch in (("bundle", self._from_bundle), ("dir", self._from_dir)):
+            data = fetch(cp, size, padding, fill, compact)
+            if data is not None:
+                self.hits[source] += 1
+                cache_lookup("glyph", source)
+                self.put(cp, size, padding, fill, data, compact)
+                return data
+        cache_lookup("glyph", "miss")
+        return None
+
+    def _precompressed(self, cp: int, size: int, padding: int, fill: str, compact: bool,
+                       encoding: str) -> Optional[bytes]:
+        bundle = self.bundle
+        if (bundle is not None and bundle.codec == encoding and self.bundle_kind != "path"
+                and _params_match(bundle.meta, size, padding, fill, compact)):
+            # gzip-codec payloads are complete gzip members: serve them as-is
+            return bundle.get_raw(cp)
+        if self.svg_dir and _params_match(self.dir_meta, size, padding, fill, compact):
+            ext = {"gzip": ".gz", "br": ".br"}.get(encoding)
+            try:
+                with open(os.path.join(self.svg_dir, f"{cp:04X}.svg{ext}"), "rb") as f:
+                    return f.read()
+            except (OSError, TypeError):
+                return None
+        return None
+
+    def get_encoded(self, cp: int, size: int = 128, padding: int = 8, fill: str = "#000",
+                    compact: bool = False, encoding: str = "gzip") -> Optional[bytes]:
+        """Return the SVG in the given content coding, compressing at most once per cached glyph.
+
+        Returns None when the glyph is not in the store (callers render live, put(), then retry) and
+        when caching is off (cache_size == 0): nothing could keep the encoded variant, so the
+        response goes out as identity and CompressionMiddleware compresses it.
+        """
+        if self.cache_size == 0:
+            return None
+        key = (cp, size, padding, fill, compact)
+        entry = self._cache_get(key)
+        if entry is None:
+            if self.get(cp, size, padding, fill, compact) is None:
+                return None
+            entry = self._cache_get(key)
+            if entry is None:
+                return None
+        data = entry.get(encoding)
+        if data is not None:
+            self.encoded["cached"] += 1
+            return data
+        data = self._precompressed(cp, size, padding, fill, compact, encoding)
+        if data is not None:
+            self.encoded["precompressed"] += 1
+        else:
+            # request path: dynamic levels (static ones, e.g. brotli 11, are several times slower
+            # for a few % fewer bytes; generate_hanzi_svgs --precompress uses those offline)
+            data = compress(entry["identity"], encoding)
+            self.encoded["compressed"] += 1
+        with self._lock:
+            entry[encoding] = data
+        return data
+
+    def record_miss(self, cp: int):
+        with self._lock:
+            self.misses += 1
+            self.missed[cp] = self.missed.get(cp, 0) + 1
+            self.missed.move_to_end(cp)
+            while len(self.missed) > self.max_missed:
+                self.missed.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            top = sorted(self.missed.items(), key=lambda kv: kv[1], reverse=True)[:20]
+            cached = len(self._cache)
+        return {
+            "bundle": self.bundle.path if self.bundle else None,
+            "bundle_kind": self.bundle_kind,
+            "bundle_glyphs": len(self.bundle) if self.bundle else 0,
+            "svg_dir": self.svg_dir,
+            "cached": cached,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "encoded": dict(self.encoded),
+            "top_missed": [{"unicode": f"U+{cp:04X}", "count": n} for cp, n in top],
+        }
+
+    def close(self):
+        if self.bundle is not None:
+            self.bundle.close()
+            self.bundle = None
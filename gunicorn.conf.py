@@ -0,0 +1,23 @@
+"""
+Gunicorn settings, loaded from the working directory (command-line flags still win).
+
+Prometheus multiprocess mode (see metrics.py): when PROMETHEUS_MULTIPROC_DIR is
+set, the directory is emptied before the workers start so samples of a previous
+run are not aggregated, and the live gauges of exited workers are dropped.
+"""
+
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -0,0 +1,310 @@
+"""
+Named index sets served side by side (e.g. vit-serif and clip-sans).
+
+Each INDEXES entry names a Chroma directory and optionally a collection:
+
+    INDEXES="vit-serif=./indexes/vit-serif,clip-sans=./indexes/clip-sans#hanzi_clip"
+
+`IndexRegistry` opens an index on first use (the API opens the default one at
+startup). With a memory budget, the least recently used indexes are evicted
+whenever the estimated footprint of the loaded ones exceeds it. Requests hold
+an index through `use()` / `acquire()`. An evicted index stays usable until
+its last holder releases it; only then is its Chroma client closed.
+
+`LoadedIndex` bundles one opened collection (a ChromaVectorDB, or a SnapshotDB
+in warm-start mode, see snapshot.py) with everything the API derives from it:
+the in-memory embedding matrix, the server-side confusability reference set
+and the skeleton table shipped in the index directory. All of these, including
+cached filter masks, belong to one index version and are dropped with it.
+
+An index path may be a versioned root: builds go to `<root>/<version>/`, and
+the `CURRENT` file names the published one (replaced atomically by
+`publish_version()`). `reload()` opens and warms the new version next to the
+old one, then swaps it in. Requests already holding the old version finish on
+it, and it is closed after the last one releases it.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from confusability import ReferenceSet, load_references
+from embedding_index import EmbeddingIndex
+from skeleton import SKELETON_FILE, SkeletonTable
+from snapshot import SnapshotDB
+
+DEFAULT_COLLECTION = "hanzi_images"
+CURRENT_FILE = "CURRENT"
+# estimated bytes per vector held by Chroma beyond the raw floats: 2*M level-0 links of 4 bytes, plus id maps
+_HNSW_LINK_BYTES = 8
+_HNSW_FIXED_BYTES = 32
+_HNSW_DEFAULT_M = 16
+
+
+class IndexSpec(NamedTuple):
+    name: str
+    db_path: str
+    collection: str = DEFAULT_COLLECTION
+    skeleton_path: Optional[str] = None  # default: skeleton.npz in the (version) directory
+
+
+def parse_index_specs(value: str) -> List[IndexSpec]:
+    """Comma-separated "name=path[#collection]" entries."""
+    specs: List[IndexSpec] = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, target = (p.strip() for p in part.partition("="))
+        if not sep or not name or not target:
+            raise ValueError(f"invalid index spec: '{part}' (expected name=path[#collection])")
+        path, _, collection = (p.strip() for p in target.partition("#"))
+        specs.append(IndexSpec(name, path, collection or DEFAULT_COLLECTION))
+    names = [s.name for s in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate index names in INDEXES")
+    return specs
+
+
+def resolve_index_dir(root: str) -> Tuple[str, Optional[str]]:
+    """(directory to open, version) for an index path; version is None for unversioned directories."""
+    pointer = os.path.join(root, CURRENT_FILE)
+    try:
+        with open(pointer, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return root, None
+    if not version or version.startswith(".") or os.path.basename(version) != version:
+        raise ValueError(f"invalid version in {pointer}: '{version}'")
+    return os.path.join(root, version), version
+
+
+def new_version_name() -> str:
+    return time.strftime("v%Y%m%d-%H%M%S")
+
+
+def publish_version(root: str, version: str):
+    """Point <root>/CURRENT at an existing version directory (atomic rename)."""
+    if not os.path.isdir(os.path.join(root, version)):
+        raise FileNotFoundError(f"version directory not found: {os.path.join(root, version)}")
+    tmp = os.path.join(root, f".tmp-{CURRENT_FILE}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+class LoadedIndex:
+    """One opened collection plus the in-memory structures derived from it (built lazily)."""
+
+    def __init__(self, spec: IndexSpec, db, version: Optional[str] = None):
+        self.spec = spec
+        self.name = spec.name
+        self.db = db
+        self.version = version
+        self.lock = threading.Lock()
+        self.embedding_index: Optional[EmbeddingIndex] = None
+        self.reference_set: Optional[ReferenceSet] = None
+        self.skeleton_table: Optional[SkeletonTable] = None
+        self.vectors = int(db.get_stats().get("total_images", 0))
+        self.dim = db.dimension() if self.vectors else 0
+        # the collection's HNSW parameters (None when served from a snapshot)
+        self.hnsw: Optional[Dict] = None if self.snapshot else db.hnsw_config()
+        self.last_used = time.monotonic()
+        self._holders = 0
+        self._retired = False
+        path = spec.skeleton_path or os.path.join(db.db_path, SKELETON_FILE)
+        if os.path.isfile(path):
+            try:
+                self.skeleton_table = SkeletonTable.load(path)
+            except Exception as e:
+                print(f"警告: 无法加载混淆骨架表 {path}: {e}")
+
+    @property
+    def snapshot(self) -> bool:
+        return isinstance(self.db, SnapshotDB)
+
+    def warm(self):
+        """Run one query so Chroma loads the HNSW segment before real traffic arrives."""
+        if not self.vectors or self.snapshot:
+            return
+        page = self.db.collection.get(limit=1, include=["embeddings"])
+        self.db.collection.query(query_embeddings=[list(page["embeddings"][0])], n_results=min(10, self.vectors),
+                                 include=["distances"])
+
+    def matrix(self) -> EmbeddingIndex:
+        """All embeddings in memory; shared with search once db.load_exact_index() has run (EXACT_SEARCH=1)."""
+        if self.db.exact_index is not None:
+            return self.db.exact_index
+        with self.lock:
+            if self.embedding_index is None:
+                self.embedding_index = EmbeddingIndex.from_vector_db(self.db)
+            return self.embedding_index
+
+    def references(self, path: str) -> ReferenceSet:
+        """Reference strings from `path`, encoded against this index once."""
+        index = self.matrix()
+        with self.lock:
+            if self.reference_set is None:
+                self.reference_set = ReferenceSet(load_references(path), index)
+            return self.reference_set
+
+    def nbytes(self) -> int:
+        """Estimated resident size: Chroma's copy of the vectors and graph plus our in-memory arrays."""
+        total = 0
+        if self.hnsw is not None:
+            m = self.hnsw.get("max_neighbors") or _HNSW_DEFAULT_M
+            total = self.vectors * (self.dim * 4 + m * _HNSW_LINK_BYTES + _HNSW_FIXED_BYTES)
+        table = self.db.neighbor_table if self.snapshot else None
+        if table is not None:
+            total += table.rows.nbytes + table.distances.nbytes
+        for ix in {id(x): x for x in (self.db.exact_index, self.embedding_index) if x is not None}.values():
+            total += ix.matrix.nbytes
+        refs = self.reference_set
+        if refs is not None:
+            total += refs.codes.nbytes + refs.cols.nbytes + refs.vectors.nbytes
+        return total
+
+    def close(self):
+        self.embedding_index = None
+        self.reference_set = None
+        self.db.close()
+
+
+class IndexRegistry:
+    def __init__(self, specs: List[IndexSpec], opener: Callable[[IndexSpec], LoadedIndex],
+                 default: Optional[str] = None, memory_budget_mb: int = 0):
+        if not specs:
+            raise ValueError("no indexes configured")
+        self.specs: Dict[str, IndexSpec] = {s.name: s for s in specs}
+        self.default = default or specs[0].name
+        if self.default not in self.specs:
+            raise ValueError(f"unknown default index: {self.default}")
+        self.budget = memory_budget_mb * 1024 * 1024
+        self._opener = opener
+        self._loaded: Dict[str, LoadedIndex] = {}
+        self._lock = threading.Lock()
+        # one opener per name at a time; other indexes keep serving meanwhile
+        self._opening: Dict[str, threading.Lock] = {name: threading.Lock() for name in self.specs}
+
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    def resolve(self, name: Optional[str]) -> str:
+        """Index name for a request (None = default); KeyError when unknown."""
+        name = name or self.default
+        if name not in self.specs:
+            raise KeyError(name)
+        return name
+
+    def acquire(self, name: Optional[str] = None) -> LoadedIndex:
+        """Open if needed and hold the index; pair every call with release()."""
+        name = self.resolve(name)
+        while True:
+            with self._lock:
+                ix = self._loaded.get(name)
+                if ix is not None:
+                    ix._holders += 1
+                    ix.last_used = time.monotonic()
+                    # lazily built matrices grow an index after it was opened, so check on every use
+                    retired = self._evict(keep=name)
+                    break
+            with self._opening[name]:
+                if name not in self._loaded:
+                    opened = self._opener(self.specs[name])
+                    with self._lock:
+                        self._loaded[name] = opened
+        for old in retired:
+            old.close()
+        return ix
+
+    def reload(self, name: Optional[str] = None, force: bool = False) -> Dict:
+        """Open the published version of an index next to the running one and swap it in.
+
+        Unloaded indexes are left alone (their next use opens the latest version); a loaded index is
+        only reopened when its version changed, unless force is set (e.g. an unversioned directory).
+        """
+        name = self.resolve(name)
+        with self._opening[name]:
+            with self._lock:
+                current = self._loaded.get(name)
+            if current is None:
+                return {"name": name, "reloaded": False, "version": None}
+            version = resolve_index_dir(self.specs[name].db_path)[1]
+            if not force and version == current.version:
+                return {"name": name, "reloaded": False, "version": current.version}
+            fresh = self._opener(self.specs[name])
+            with self._lock:
+                old = self._loaded.get(name)
+                self._loaded[name] = fresh
+                closable = []
+                if old is not None:
+                    old._retired = True
+                    if old._holders == 0:
+                        closable.append(old)
+                closable += self._evict(keep=name)
+        for ix in closable:
+            ix.close()
+        return {"name": name, "reloaded": True, "previous": current.version, "version": fresh.version}
+
+    def reload_changed(self) -> List[Dict]:
+        """Reload every loaded index whose published version changed."""
+        with self._lock:
+            names = list(self._loaded)
+        return [r for r in (self.reload(name) for name in names) if r["reloaded"]]
+
+    def release(self, ix: LoadedIndex):
+        with self._lock:
+            ix._holders -= 1
+            close = ix._retired and ix._holders == 0
+        if close:
+            ix.close()
+
+    @contextmanager
+    def use(self, name: Optional[str] = None) -> Iterator[LoadedIndex]:
+        ix = self.acquire(name)
+        try:
+            yield ix
+        finally:
+            self.release(ix)
+
+    def _evict(self, keep: str) -> List[LoadedIndex]:
+        """Drop least recently used indexes over budget (caller holds the lock); returns those to close now."""
+        if not self.budget:
+            return []
+        total = sum(ix.nbytes() for ix in self._loaded.values())
+        closable = []
+        for ix in sorted(self._loaded.values(), key=lambda x: x.last_used):
+            if total <= self.budget:
+                break
+            if ix.name == keep:
+                continue
+            total -= ix.nbytes()
+            del self._loaded[ix.name]
+            ix._retired = True
+            if ix._holders == 0:
+                closable.append(ix)
+        return closable
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            loaded = dict(self._loaded)
+        out = []
+        for name, spec in self.specs.items():
+            ix = loaded.get(name)
+            out.append({
+                "name": name,
+                "default": name == self.default,
+                "db_path": spec.db_path,
+                "collection": spec.collection,
+                "loaded": ix is not None,
+                "version": ix.version if ix else None,
+                "vectors": ix.vectors if ix else None,
+                "dim": ix.dim if ix else None,
+                "hnsw": ix.hnsw if ix else None,
+                "memory_mb": round(ix.nbytes() / 1024 / 1024, 1) if ix else None,
+            })
+        return out
@@ -0,0 +1,172 @@
+"""
+Prometheus metrics for the API (optional 'prometheus_client').
+
+- `MetricsMiddleware`: ASGI middleware counting requests and observing latency
+  per route template (`/glyph/svg/{uhex}`, not the raw path, so label
+  cardinality stays bounded), plus requests in progress and the depth of the
+  thread pool that runs sync endpoints and streamed queries.
+- `stage(operation, name)`: times one stage of an operation, e.g. the
+  embedding fetch / ANN query / result shaping of a search or the face select
+  / font open / draw / serialize steps of a glyph render.
+- `cache_lookup(cache, result)`: counts cache outcomes (glyph store, filter
+  masks, neighbor table) so hit ratios can be derived in PromQL.
+- `render()`: the exposition for GET /metrics.
+
+Multi-worker (Gunicorn): set PROMETHEUS_MULTIPROC_DIR to an empty directory
+before the workers start. Every worker then writes its samples to mmapped files
+there, /metrics aggregates all of them whichever worker serves the scrape, and
+gunicorn.conf.py cleans up after exited workers. Without the variable, metrics
+are per process (fine for a single uvicorn).
+
+Without prometheus_client every helper is a no-op and /metrics answers 503.
+
+    sum(rate(hanzi_stage_duration_seconds_sum{operation="search"}[5m])) by (stage)
+    sum(rate(hanzi_cache_lookups_total{cache="glyph",result!="miss"}[5m]))
+      / sum(rate(hanzi_cache_lookups_total{cache="glyph"}[5m]))
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+if MULTIPROC_DIR:
+    # single uvicorn with the variable set: nobody else creates it
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+try:
+    import prometheus_client as prom  # type: ignore
+    from prometheus_client import multiprocess  # type: ignore
+except Exception:  # pragma: no cover
+    prom = None  # type: ignore
+    multiprocess = None  # type: ignore
+
+ENABLED = prom is not None and os.environ.get("METRICS", "1").lower() not in ("0", "false", "no")
+CONTENT_TYPE = prom.CONTENT_TYPE_LATEST if prom is not None else "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP latency spans cached glyphs (sub-ms) to large batches; stages are mostly sub-millisecond
+REQUEST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1.0)
+
+if ENABLED:
+    REQUESTS = prom.Counter("hanzi_http_requests_total", "HTTP requests by route and status",
+                            ["method", "route", "status"])
+    LATENCY = prom.Histogram("hanzi_http_request_duration_seconds", "HTTP request latency by route",
+                             ["method", "route"], buckets=REQUEST_BUCKETS)
+    IN_PROGRESS = prom.Gauge("hanzi_http_requests_in_progress", "Requests being handled",
+                             multiprocess_mode="livesum")
+    STAGES = prom.Histogram("hanzi_stage_duration_seconds", "Time spent per stage of an operation",
+                            ["operation", "stage"], buckets=STAGE_BUCKETS)
+    CACHE = prom.Counter("hanzi_cache_lookups_total", "Cache lookups by outcome (miss or the source that hit)",
+                         ["cache", "result"])
+    POOL_BUSY = prom.Gauge("hanzi_threadpool_busy", "Worker threads running sync endpoints / streamed queries",
+                           multiprocess_mode="livesum")
+    POOL_WAITING = prom.Gauge("hanzi_threadpool_waiting", "Tasks queued for a worker thread",
+                              multiprocess_mode="livesum")
+
+# labelled children, bound once per label set
+_stages: Dict[Tuple[str, str], object] = {}
+_caches: Dict[Tuple[str, str], object] = {}
+
+
+@contextmanager
+def stage(operation: str, name: str) -> Iterator[None]:
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        child = _stages.get((operation, name))
+        if child is None:
+            child = _stages.setdefault((operation, name), STAGES.labels(operation, name))
+        child.observe(time.perf_counter() - t0)
+
+
+def cache_lookup(cache: str, result: str):
+    """result: "miss", or where the hit came from ("hit", "cache", "bundle", ...)."""
+    if not ENABLED:
+        return
+    child = _caches.get((cache, result))
+    if child is None:
+        child = _caches.setdefault((cache, result), CACHE.labels(cache, result))
+    child.inc()
+
+
+def _threadpool_depth() -> Optional[Tuple[int, int]]:
+    """(busy, waiting) of anyio's default thread limiter; None outside an event loop."""
+    try:
+        from anyio import to_thread
+
+        limiter = to_thread.current_default_thread_limiter()
+        return int(limiter.borrowed_tokens), int(limiter.statistics().tasks_waiting)
+    except Exception:
+        return None
+
+
+def _sample_threadpool():
+    depth = _threadpool_depth()
+    if depth is not None:
+        POOL_BUSY.set(depth[0])
+        POOL_WAITING.set(depth[1])
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path is not None else "<unmatched>"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http" or scope.get("path") in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_PROGRESS.inc()
+        _sample_threadpool()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_PROGRESS.dec()
+            _sample_threadpool()
+            route = _route_label(scope)
+            method = scope.get("method", "GET")
+            REQUESTS.labels(method, route, str(status)).inc()
+            LATENCY.labels(method, route).observe(time.perf_counter() - t0)
+
+
+def render() -> bytes:
+    """Exposition text: aggregated over all workers in multiprocess mode."""
+    if prom is None:
+        raise RuntimeError("prometheus_client is not installed. Please install 'prometheus_client'.")
+    if not ENABLED:
+        raise RuntimeError("metrics are disabled (METRICS=0)")
+    if MULTIPROC_DIR:
+        registry = prom.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prom.generate_latest(registry)
+    _sample_threadpool()
+    return prom.generate_latest()
+
+
+def mark_process_dead(pid: int):
+    """Gunicorn child_exit hook: drop the live gauges of an exited worker."""
+    if prom is not None and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Aggregate the request profiles written by the API (PROFILE_DIR, see profiling.py).
+
+Prints the profiled requests per route (count, p50 / max duration) and then the
+hottest functions over all selected profiles:
+
+- `.folded` (pyinstrument): stacks are summed; self and inclusive time per
+  frame. --folded-out writes the merged stacks for flamegraph.pl / speedscope.
+- `.prof` (cProfile): merged with pstats, sorted by --sort.
+
+Examples:
+  uv run python profile_report.py --dir ./profiles
+  uv run python profile_report.py --route search.char --min-ms 50 --folded-out slow.folded
+  flamegraph.pl slow.folded > slow.svg
+"""
+
+import argparse
+import io
+import os
+import pstats
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from profiling import list_profiles
+
+
+def read_folded(paths: List[str]) -> Dict[str, int]:
+    merged: Dict[str, int] = defaultdict(int)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, weight = line.rstrip("\n").rpartition(" ")
+                if stack and weight.isdigit():
+                    merged[stack] += int(weight)
+    return merged
+
+
+def frame_times(stacks: Dict[str, int]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """(self µs, inclusive µs) per frame label; recursion counts once per stack."""
+    own: Dict[str, int] = defaultdict(int)
+    inclusive: Dict[str, int] = defaultdict(int)
+    for stack, us in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += us
+        for frame in set(frames):
+            inclusive[frame] += us
+    return own, inclusive
+
+
+def route_summary(selected: List[Tuple[str, Dict]]) -> List[Tuple[str, int, float, int]]:
+    per_route: Dict[str, List[int]] = defaultdict(list)
+    for _, info in selected:
+        per_route[f"{info['method']} {info['route']}"].append(info["ms"])
+    rows = [(route, len(ms), float(np.percentile(ms, 50)), max(ms)) for route, ms in per_route.items()]
+    return sorted(rows, key=lambda r: -r[1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Aggregate API request profiles (PROFILE_DIR).")
+    parser.add_argument('--dir', default=os.environ.get('PROFILE_DIR', './profiles'),
+                        help='Profile directory (default: $PROFILE_DIR or ./profiles)')
+    parser.add_argument('--route', default=None, help='Only routes containing this text, e.g. search.char')
+    parser.add_argument('--min-ms', type=int, default=0, help='Only requests that took at least this long')
+    parser.add_argument('--top', type=int, default=25, help='Functions shown (default: 25)')
+    parser.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'ncalls'],
+                        help='Order of the cProfile table (default: cumulative)')
+    parser.add_argument('--folded-out', default=None, help='Write the merged .folded stacks to this file')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        print(f"错误: 目录不存在: {args.dir}")
+        return 1
+    selected = [(p, info) for p, info in list_profiles(args.dir)
+                if (args.route is None or args.route in info["route"]) and info["ms"] >= args.min_ms]
+    if not selected:
+        print("没有符合条件的剖析文件。")
+        return 1
+
+    print(f"{len(selected)} 个请求剖析 ({args.dir})")
+    print(f"  {'route':<40} {'count':>6} {'p50_ms':>8} {'max_ms':>8}")
+    for route, count, p50, worst in route_summary(selected):
+        print(f"  {route:<40} {count:>6} {p50:>8.0f} {worst:>8}")
+
+    folded = [p for p, info in selected if info["ext"] == ".folded"]
+    if folded:
+        stacks = read_folded(folded)
+        total = sum(stacks.values()) or 1
+        own, inclusive = frame_times(stacks)
+        print(f"\n.folded ({len(folded)} 个，共 {total / 1000:.1f}ms 采样)")
+        print(f"  {'self%':>6} {'incl%':>6}  function")
+        for frame, us in sorted(own.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {us / total * 100:>6.1f} {inclusive[frame] / total * 100:>6.1f}  {frame}")
+        if args.folded_out:
+            with open(args.folded_out, "w", encoding="utf-8") as f:
+                for stack, us in sorted(stacks.items()):
+                    f.write(f"{stack} {us}\n")
+            print(f"合并后的调用栈已写入 {args.folded_out}")
+
+    profs = [p for p, info in selected if info["ext"] == ".prof"]
+    if profs:
+        out = io.StringIO()
+        stats = pstats.Stats(*profs, stream=out)
+        stats.files = []  # print_stats would list every input file first
+        stats.strip_dirs().sort_stats(args.sort).print_stats(args.top)
+        print(f"\n.prof ({len(profs)} 个)")
+        print(out.getvalue().strip())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
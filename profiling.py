@@ -0,0 +1,231 @@
+"""
+Opt-in request profiling for the API (see profile_report.py for aggregation).
+
+`ProfilingMiddleware` profiles a request when
+
+- it is one in every `sample_every` requests (PROFILE_SAMPLE_RATE=N), or
+- it carries `X-Profile: 1` together with a valid `X-Admin-Token` (ADMIN_TOKEN).
+
+Each profile is written to the profile directory as one file named
+`<UTC timestamp>-<duration>ms-<method>-<route>-<pid>-<n>.<ext>`:
+
+- `.folded` with pyinstrument installed: collapsed stacks ("a;b;c <µs>"), the
+  input format of flamegraph.pl, inferno and speedscope. pyinstrument's async
+  mode follows the request's task across awaits, so time waiting on the
+  thread pool shows up as `[await]` and other requests are not mixed in.
+- `.prof` otherwise: cProfile / pstats (snakeviz, flameprof, gprof2dot).
+  cProfile sees everything that runs on the event-loop thread while the
+  request is in flight, including other requests interleaved with it.
+
+Only one request is profiled at a time per process (Python allows a single
+active profiler); a sampled request arriving meanwhile runs unprofiled.
+Retention is bounded: after each write the oldest files beyond `keep` are
+deleted. The response carries `X-Profile-Id: <pid>-<n>`, the end of the file name.
+
+The middleware is only installed when PROFILE_DIR is set, so a disabled
+deployment pays nothing; when installed, unprofiled requests cost a counter
+increment and a header scan.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import hmac
+import itertools
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from anyio import to_thread
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument  # type: ignore
+except Exception:  # pragma: no cover
+    _Pyinstrument = None  # type: ignore
+
+ENGINES = ("pyinstrument", "cprofile")
+DEFAULT_ENGINE = "pyinstrument" if _Pyinstrument is not None else "cprofile"
+EXTENSIONS = {"pyinstrument": ".folded", "cprofile": ".prof"}
+# <timestamp>-<ms>ms-<method>-<route>-<pid>-<n>.<ext>
+FILE_RE = re.compile(r"^(?P<ts>\d{8}T\d{6})-(?P<ms>\d+)ms-(?P<method>[A-Z]+)-(?P<route>.+)-(?P<pid>\d+)-(?P<n>\d+)"
+                     r"(?P<ext>\.folded|\.prof)$")
+
+_SAMPLE_INTERVAL = 0.0005
+
+
+def route_slug(path: str) -> str:
+    """"/glyph/svg/{uhex}" -> "glyph.svg.uhex" (file-name safe, reversible enough to group by)."""
+    slug = re.sub(r"[^A-Za-z0-9_]+", ".", path).strip(".")
+    return slug or "root"
+
+
+def folded_stacks(root) -> Dict[str, int]:
+    """Collapsed stacks (µs of self time per stack) from a pyinstrument frame tree."""
+    out: Dict[str, int] = {}
+
+    def label(frame) -> str:
+        if frame.is_synthetic:
+            return frame.function
+        where = f"{frame.file_path_short}:{frame.line_no}" if frame.file_path_short else ""
+        return f"{frame.function} ({where})".replace(";", ":") if where else frame.function
+
+    def walk(frame, stack: Tuple[str, ...]):
+        if frame.is_synthetic and frame.function == "[self]":
+            key = ";".join(stack)
+        else:
+            stack = stack + (label(frame),)
+            key = ";".join(stack)
+            if frame.children:
+                for child in frame.children:
+                    walk(child, stack)
+                return
+        us = int(round(frame.time * 1e6))
+        if us:
+            out[key] = out.get(key, 0) + us
+
+    if root is not None:
+        walk(root, ())
+    return out
+
+
+def prune(directory: str, keep: int) -> int:
+    """Delete the oldest profiles beyond `keep`; returns how many were removed."""
+    try:
+        names = [n for n in os.listdir(directory) if FILE_RE.match(n)]
+    except OSError:
+        return 0
+    if len(names) <= keep:
+        return 0
+    # oldest first; the name (UTC timestamp first) breaks mtime ties
+    paths = sorted((os.path.join(directory, n) for n in names), key=lambda p: (os.path.getmtime(p), p))
+    removed = 0
+    for path in paths[:len(paths) - keep]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, directory: str, sample_every: int = 0, keep: int = 500,
+                 token: Optional[str] = None, engine: Optional[str] = None):
+        engine = engine or DEFAULT_ENGINE
+        if engine not in ENGINES:
+            raise ValueError(f"unknown profiling engine: {engine} (expected {', '.join(ENGINES)})")
+        if engine == "pyinstrument" and _Pyinstrument is None:
+            raise RuntimeError("pyinstrument is not installed. Please install 'pyinstrument'.")
+        self.app = app
+        self.directory = os.path.abspath(directory)
+        self.sample_every = max(0, sample_every)
+        self.keep = max(1, keep)
+        self.token = token.encode() if token else None
+        self.engine = engine
+        self._counter = itertools.count(1)
+        self._seq = itertools.count(1)
+        self._busy = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _wanted(self, scope) -> bool:
+        if self.sample_every and next(self._counter) % self.sample_every == 0:
+            return True
+        if self.token is None:
+            return False
+        flag = token = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                flag = value
+            elif name == b"x-admin-token":
+                token = value
+        return flag in (b"1", b"true") and token is not None and hmac.compare_digest(token, self.token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._busy.release()
+
+    async def _profile(self, scope, receive, send):
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        # the id goes out with the response headers, before the duration in the file name is known
+        profile_id = f"{os.getpid()}-{next(self._seq)}"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            if self.engine == "pyinstrument":
+                profiler = _Pyinstrument(interval=_SAMPLE_INTERVAL, async_mode="enabled")
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except Exception as e:  # another profiler (debugger, coverage) is active
+            print(f"警告: 无法启动性能剖析: {e}")
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if self.engine == "pyinstrument":
+                profiler.stop()
+            else:
+                profiler.disable()
+        # a request that raised out of the app leaves no profile (the error is logged by the server)
+        ms = int((time.perf_counter() - t0) * 1000)
+        name = (f"{stamp}-{ms}ms-{scope.get('method', 'GET')}-{route_slug(_route(scope))}-{profile_id}"
+                f"{EXTENSIONS[self.engine]}")
+        # serializing a profile takes milliseconds: keep it off the event loop
+        await to_thread.run_sync(self._save, os.path.join(self.directory, name), profiler)
+
+    def _save(self, path: str, profiler):
+        try:
+            self._write(path, profiler)
+            prune(self.directory, self.keep)
+        except Exception as e:
+            print(f"警告: 写入性能剖析文件失败: {e}")
+
+    def _write(self, path: str, profiler):
+        tmp = os.path.join(os.path.dirname(path), f".tmp-{os.path.basename(path)}")
+        if self.engine == "pyinstrument":
+            stacks = folded_stacks(profiler.last_session.root_frame() if profiler.last_session else None)
+            with open(tmp, "w", encoding="utf-8") as f:
+                for stack, us in stacks.items():
+                    f.write(f"{stack} {us}\n")
+        else:
+            profiler.dump_stats(tmp)
+        os.replace(tmp, path)
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path is not None else scope.get("path", "<unmatched>")
+
+
+def parse_name(name: str) -> Optional[Dict]:
+    """Fields of a profile file name, or None for other files."""
+    m = FILE_RE.match(name)
+    if m is None:
+        return None
+    return {"timestamp": m["ts"], "ms": int(m["ms"]), "method": m["method"], "route": m["route"],
+            "pid": int(m["pid"]), "ext": m["ext"]}
+
+
+def list_profiles(directory: str) -> List[Tuple[str, Dict]]:
+    out = []
+    for name in sorted(os.listdir(directory)):
+        info = parse_name(name)
+        if info is not None:
+            out.append((os.path.join(directory, name), info))
+    return out
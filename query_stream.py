@@ -0,0 +1,102 @@
+"""
+Streaming query endpoint support: NDJSON out, streamed request body in.
+
+`QueryStreamResponse` reads the request body incrementally and emits one NDJSON
+line per query token as soon as its result is ready. The body is consumed at the
+pace results are produced, so server memory is bounded by one body chunk plus one
+result regardless of how many queries the client sends.
+
+Tokens are separated by newlines, commas or whitespace; surrounding `"`, `[` and
+`]` are stripped so a JSON array of strings streams as-is.
+
+Starlette's StreamingResponse cannot be used: it listens for disconnects by
+calling receive() concurrently, which would swallow body chunks. Here disconnects
+are seen while reading the body, a watcher takes over once the body is done, and
+a failing send() also ends the stream; either way no further queries are run.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from typing import AsyncIterator, Callable, Dict
+
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from result_codec import dumps
+
+_SEPARATORS = re.compile(rb"[\s,]+")
+_STRIP = "\"'[]"
+# longest accepted token ("U+10FFFF" plus slack); longer runs are rejected
+MAX_TOKEN_BYTES = 64
+
+
+class _Disconnected(Exception):
+    pass
+
+
+class QueryStreamResponse(Response):
+    media_type = "application/x-ndjson"
+
+    def __init__(self, handle: Callable[[str], Dict], max_token: int = MAX_TOKEN_BYTES):
+        """`handle(token)` runs in the threadpool and returns the JSON object for one line."""
+        # like StreamingResponse: no body attribute, so no Content-Length header
+        self.status_code = 200
+        self.background = None
+        self.init_headers()
+        self.handle = handle
+        self.max_token = max_token
+
+    async def _tokens(self, receive, on_body_end: Callable[[], None]) -> AsyncIterator[str]:
+        buf = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise _Disconnected()
+            buf += message.get("body", b"")
+            *parts, buf = _SEPARATORS.split(buf)
+            if len(buf) > self.max_token:
+                raise ValueError(f"query token longer than {self.max_token} bytes")
+            more = message.get("more_body", False)
+            if not more:
+                if buf:
+                    parts.append(buf)
+                on_body_end()
+            for part in parts:
+                token = part.decode("utf-8", errors="replace").strip(_STRIP)
+                if token:
+                    yield token
+            if not more:
+                return
+
+    async def __call__(self, scope, receive, send):
+        disconnected = asyncio.Event()
+        watcher = None
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        def on_body_end():
+            # receive() is ours alone from here on: its next message is the disconnect
+            nonlocal watcher
+            watcher = asyncio.ensure_future(watch())
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        try:
+            async for token in self._tokens(receive, on_body_end):
+                if disconnected.is_set():
+                    return
+                line = await run_in_threadpool(self.handle, token)
+                await send({"type": "http.response.body", "body": dumps(line) + b"\n", "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except (_Disconnected, OSError):
+            # OSError: servers implementing ASGI spec 2.4 raise from send() once the client is gone
+            return
+        except ValueError as e:
+            await send({"type": "http.response.body", "body": dumps({"error": str(e)}) + b"\n", "more_body": False})
+        finally:
+            if watcher is not None:
+                watcher.cancel()
@@ -0,0 +1,182 @@
+"""
+Lean serialization for search responses.
+
+Neighbor searches produce columnar results (`Neighbors`: parallel char / unicode /
+distance arrays) instead of one Pydantic model per neighbor. Responses are shaped
+into plain dicts in the documented key order (see `openapi.yaml`) and encoded with
+orjson when available, falling back to the stdlib encoder with the same compact
+output FastAPI's JSONResponse produces.
+
+Batch endpoints also negotiate compact binary bodies via the Accept header. Both
+carry the same CSR-style columns, decodable straight into NumPy:
+
+    offsets     <u4[len(queries) + 1]   neighbors of query i: [offsets[i], offsets[i+1])
+    codepoints  <u4[total]
+    distances   <f4[total]              similarity = clamp(1 - distance) * 100
+
+- `application/x-msgpack` (optional 'msgpack' package): a map with `queries`,
+  `dtypes` and the columns as raw little-endian byte strings
+  (`np.frombuffer(m["codepoints"], m["dtypes"]["codepoints"])`).
+- `application/x-npz`: a NumPy `.npz` archive (`np.load(io.BytesIO(body))`).
+"""
+
+from __future__ import annotations
+
+import io
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgpack  # type: ignore
+except Exception:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/x-msgpack"
+NPZ_TYPE = "application/x-npz"
+COLUMN_DTYPES = {"offsets": "<u4", "codepoints": "<u4", "distances": "<f4"}
+
+
+class Neighbors(NamedTuple):
+    """Neighbors of one query, nearest first. `unicodes` are bare hex ids ("4E00")."""
+
+    chars: List[str]
+    unicodes: List[str]
+    distances: List[float]
+
+    @property
+    def count(self) -> int:
+        """Number of neighbors (len() stays the tuple length, 3, as for any NamedTuple)."""
+        return len(self.distances)
+
+    def codepoints(self) -> List[int]:
+        out = []
+        for c, u in zip(self.chars, self.unicodes):
+            try:
+                out.append(int(u, 16))
+            except ValueError:
+                out.append(ord(c) if len(c) == 1 else 0xFFFD)
+        return out
+
+
+EMPTY_NEIGHBORS = Neighbors([], [], [])
+
+
+def similarity(distance: float) -> float:
+    """Similarity percentage shown by the UI: clamp(1 - distance) * 100, one decimal."""
+    return round(max(0.0, min(1.0, 1.0 - distance)) * 100, 1)
+
+
+def similarities(distances: np.ndarray) -> np.ndarray:
+    """Vectorized `similarity()` for distance arrays."""
+    return np.round(np.clip(1.0 - np.asarray(distances, dtype=np.float64), 0.0, 1.0) * 100, 1)
+
+
+def result_rows(n: Neighbors) -> List[dict]:
+    # key order matches ResultItem: char, unicode, distance, similarity
+    return [{"char": c, "unicode": "U+" + u, "distance": d, "similarity": similarity(d)}
+            for c, u, d in zip(n.chars, n.unicodes, n.distances)]
+
+
+def search_payload(query: str, n: Neighbors) -> dict:
+    return {"query": query, "results": result_rows(n)}
+
+
+def batch_payload(queries: Sequence[str], results: Sequence[Neighbors]) -> dict:
+    return {"queries": list(queries), "results": [result_rows(n) for n in results]}
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(obj: Any, status_code: int = 200) -> Response:
+    """Serialize without response-model validation; routes keep `response_model` for the schema."""
+    return Response(content=dumps(obj), status_code=status_code, media_type="application/json")
+
+
+def batch_columns(results: Sequence[Neighbors]) -> Dict[str, np.ndarray]:
+    counts = np.fromiter((n.count for n in results), dtype=np.int64, count=len(results))
+    offsets = np.zeros(len(results) + 1, dtype=COLUMN_DTYPES["offsets"])
+    np.cumsum(counts, out=offsets[1:])
+    cps: List[int] = []
+    dists: List[float] = []
+    for n in results:
+        cps.extend(n.codepoints())
+        dists.extend(n.distances)
+    return {
+        "offsets": offsets,
+        "codepoints": np.asarray(cps, dtype=COLUMN_DTYPES["codepoints"]),
+        "distances": np.asarray(dists, dtype=COLUMN_DTYPES["distances"]),
+    }
+
+
+def available_formats() -> List[str]:
+    """Batch response media types in server preference order."""
+    return [JSON_TYPE] + ([MSGPACK_TYPE] if msgpack is not None else []) + [NPZ_TYPE]
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """Pick a batch response media type from an Accept header; None if nothing acceptable."""
+    if not accept:
+        return JSON_TYPE
+    ranges = []
+    for part in accept.split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if media:
+            ranges.append((media.lower(), q))
+    best, best_q = None, 0.0
+    for fmt in available_formats():
+        major = fmt.split("/", 1)[0]
+        # the most specific matching range decides q for this type
+        q = next((q for m, q in ranges if m == fmt), None)
+        if q is None:
+            q = next((q for m, q in ranges if m == major + "/*"), None)
+        if q is None:
+            q = next((q for m, q in ranges if m == "*/*"), 0.0)
+        if q > best_q:
+            best, best_q = fmt, q
+    return best
+
+
+def encode_batch(media_type: str, queries: Sequence[str], results: Sequence[Neighbors]) -> bytes:
+    if media_type == JSON_TYPE:
+        return dumps(batch_payload(queries, results))
+    cols = batch_columns(results)
+    if media_type == MSGPACK_TYPE:
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed. Please install 'msgpack'.")
+        body = {"queries": list(queries), "dtypes": COLUMN_DTYPES}
+        body.update((k, v.tobytes()) for k, v in cols.items())
+        return msgpack.packb(body, use_bin_type=True)
+    if media_type == NPZ_TYPE:
+        buf = io.BytesIO()
+        np.savez(buf, queries=np.asarray(list(queries), dtype=str), **cols)
+        return buf.getvalue()
+    raise ValueError(f"unsupported media type: {media_type}")
+
+
+def batch_response(accept: Optional[str], queries: Sequence[str], results: Sequence[Neighbors]) -> Response:
+    media_type = negotiate_format(accept)
+    if media_type is None:
+        raise HTTPException(406, detail=f"supported response types: {', '.join(available_formats())}")
+    return Response(content=encode_batch(media_type, queries, results), media_type=media_type,
+                    headers={"Vary": "Accept"})
@@ -0,0 +1,112 @@
+"""
+Confusable skeletons learned from glyph embeddings.
+
+Glyphs that render nearly identically are grouped into clusters, and each member
+is mapped to one representative codepoint. This is in the spirit of the Unicode
+confusables skeleton (UTS #39), but learned from the stored glyph embeddings.
+Two strings look alike position by position when their skeletons are equal, so
+a signup-time collision check against millions of existing names is a set
+lookup: store skeleton(name) for every name and test membership.
+
+Clusters are built greedily. Codepoints are visited in ascending order; an
+unassigned codepoint becomes a representative and claims every unassigned
+neighbor within the similarity threshold. Every member is therefore within the
+threshold of its representative (no single-linkage chains across a whole radical
+family), and the table is deterministic for a given index.
+
+The table (`skeleton.npz`, written next to the Chroma DB by build_skeleton.py)
+stores only codepoints that map elsewhere:
+
+    codepoints      <u4[M]   cluster members
+    skeletons       <u4[M]   their representatives
+    min_similarity  f8       threshold used for the build (0-100)
+    space           str      distance space of the index
+    size            i8       glyphs considered
+
+Usage:
+    table = SkeletonTable.load("chroma_db/skeleton.npz")
+    table.skeleton("巳经") == table.skeleton("已经")
+"""
+
+from __future__ import annotations
+
+import os
+import unicodedata
+from typing import Dict, List
+
+import numpy as np
+
+SKELETON_FILE = "skeleton.npz"
+
+
+def cluster_representatives(codepoints: np.ndarray, neighbor_rows: np.ndarray,
+                            neighbor_dists: np.ndarray, max_distance: float) -> np.ndarray:
+    """Representative row for every row, given each row's nearest neighbors (rows x k)."""
+    n = len(codepoints)
+    leader = np.full(n, -1, dtype=np.int64)
+    close = neighbor_dists <= max_distance
+    for r in np.argsort(codepoints, kind="stable").tolist():
+        if leader[r] >= 0:
+            continue
+        leader[r] = r
+        members = neighbor_rows[r][close[r]]
+        members = members[leader[members] < 0]
+        leader[members] = r
+    return leader
+
+
+class SkeletonTable:
+    """Codepoint -> representative mapping; codepoints not in the table are their own skeleton."""
+
+    def __init__(self, codepoints: np.ndarray, skeletons: np.ndarray, min_similarity: float,
+                 space: str = "cosine", size: int = 0):
+        self.codepoints = np.asarray(codepoints, dtype="<u4")
+        self.skeletons = np.asarray(skeletons, dtype="<u4")
+        if self.codepoints.shape != self.skeletons.shape:
+            raise ValueError("codepoints and skeletons must have the same length")
+        self.min_similarity = float(min_similarity)
+        self.space = space
+        self.size = int(size)
+        # str.translate table: one C-level pass per string
+        self._map: Dict[int, int] = dict(zip(self.codepoints.tolist(), self.skeletons.tolist()))
+
+    @classmethod
+    def from_clusters(cls, codepoints: np.ndarray, leader: np.ndarray, min_similarity: float,
+                      space: str = "cosine") -> "SkeletonTable":
+        codepoints = np.asarray(codepoints, dtype=np.uint32)
+        moved = np.flatnonzero(leader != np.arange(len(leader)))
+        moved = moved[np.argsort(codepoints[moved], kind="stable")]
+        return cls(codepoints[moved], codepoints[leader[moved]], min_similarity, space, len(codepoints))
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    @property
+    def clusters(self) -> int:
+        """Clusters with more than one member."""
+        return len(np.unique(self.skeletons))
+
+    def skeleton(self, text: str) -> str:
+        """Canonical form of text: NFD, then every glyph replaced by its cluster representative."""
+        return unicodedata.normalize("NFD", text).translate(self._map)
+
+    def members(self, ch: str) -> List[str]:
+        """All characters sharing ch's skeleton (ch alone when it is in no cluster)."""
+        rep = self._map.get(ord(ch), ord(ch))
+        out = [rep] + self.codepoints[self.skeletons == rep].tolist()
+        return [chr(cp) for cp in sorted(set(out))]
+
+    def save(self, path: str):
+        """Write atomically (temp sibling, then rename) so a running server never sees a partial file."""
+        head, tail = os.path.split(path)
+        tmp = os.path.join(head, f".tmp-{tail}")
+        with open(tmp, "wb") as f:
+            np.savez(f, codepoints=self.codepoints, skeletons=self.skeletons,
+                     min_similarity=np.float64(self.min_similarity), space=np.str_(self.space),
+                     size=np.int64(self.size))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SkeletonTable":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["codepoints"], z["skeletons"], float(z["min_similarity"]), str(z["space"]), int(z["size"]))
@@ -0,0 +1,160 @@
+"""
+Warm-start snapshot of an index: ids, vectors and a precomputed neighbor table.
+
+Opening a Chroma collection costs an import of chromadb (about a second) plus
+client and HNSW segment loading, paid again by every worker and container.
+A snapshot (`snapshot.npz`, written next to the Chroma DB by build_snapshot.py)
+holds everything the API needs to serve from memory:
+
+    codepoints          <u4[N]     vector ids as codepoints
+    vectors             <f4[N, D]  embeddings in the index representation
+    space               str        distance space of the collection
+    collection          str        source collection name
+    neighbors           <i4[N, k]  rows of each vector's k nearest neighbors (k may be 0)
+    neighbor_distances  <f4[N, k]
+    source              str        identity of the collection it was built from ("" if unknown)
+
+`SnapshotDB` stands in for ChromaVectorDB: its exact index is always loaded,
+so every search takes the in-memory path, and plain top-k lookups up to k are
+answered from the neighbor table without scoring the matrix. The module only
+needs numpy, so WARM_START=1 serves without importing chromadb or torch.
+
+`source_identity()` reads the collection's row count and highest write sequence
+number straight from chroma.sqlite3 (stdlib sqlite3, read-only). The file's
+mtime cannot serve: Chroma rewrites it whenever a client opens the DB. A
+snapshot whose recorded source differs from the DB next to it is stale.
+
+Usage:
+    db = SnapshotDB.load("chroma_db/snapshot.npz")
+    rows, dists = db.neighbor_table.lookup(db.exact_index.row_of["4E00"], 10)
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+
+SNAPSHOT_FILE = "snapshot.npz"
+CHROMA_SQLITE_FILE = "chroma.sqlite3"
+
+
+class NeighborTable:
+    """Precomputed nearest neighbors per row (self excluded), nearest first."""
+
+    def __init__(self, rows: np.ndarray, distances: np.ndarray):
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.distances = np.asarray(distances, dtype=np.float32)
+        if self.rows.shape != self.distances.shape:
+            raise ValueError("neighbor rows and distances must have the same shape")
+
+    @property
+    def k(self) -> int:
+        return self.rows.shape[1] if self.rows.ndim == 2 else 0
+
+    def lookup(self, row: int, k: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(rows, distances) of the k nearest neighbors of a row; None when the table holds fewer (or k < 1)."""
+        if k < 1 or k > self.k:
+            return None
+        return self.rows[row, :k].astype(np.int64), self.distances[row, :k]
+
+
+def source_identity(db_path: str, collection: str) -> Optional[str]:
+    """"count=N seq=S" of a collection in a Chroma DB directory; None when there is no chroma.sqlite3."""
+    path = os.path.join(db_path, CHROMA_SQLITE_FILE)
+    if not os.path.isfile(path):
+        return None
+    conn = sqlite3.connect(Path(os.path.abspath(path)).as_uri() + "?mode=ro", uri=True)
+    try:
+        count, seq = conn.execute(
+            "SELECT COUNT(*), MAX(e.seq_id) FROM embeddings e JOIN segments s ON e.segment_id = s.id "
+            "JOIN collections c ON s.collection = c.id WHERE c.name = ?", (collection,)).fetchone()
+    finally:
+        conn.close()
+    return f"count={count} seq={seq or 0}"
+
+
+def save_snapshot(path: str, index: EmbeddingIndex, collection: str,
+                  neighbor_rows: Optional[np.ndarray] = None, neighbor_distances: Optional[np.ndarray] = None,
+                  source: Optional[str] = None):
+    """Write atomically (temp sibling, then rename); uncompressed so loading is a plain read.
+
+    `source` is the collection's source_identity(), taken before its embeddings were read.
+    """
+    n = len(index)
+    if neighbor_rows is None:
+        neighbor_rows = np.zeros((n, 0), dtype=np.int32)
+        neighbor_distances = np.zeros((n, 0), dtype=np.float32)
+    head, tail = os.path.split(path)
+    tmp = os.path.join(head, f".tmp-{tail}")
+    with open(tmp, "wb") as f:
+        np.savez(f, codepoints=index.codepoints.astype("<u4"), vectors=index.matrix.astype("<f4"),
+                 space=np.str_(index.space), collection=np.str_(collection),
+                 neighbors=np.asarray(neighbor_rows, dtype="<i4"),
+                 neighbor_distances=np.asarray(neighbor_distances, dtype="<f4"), source=np.str_(source or ""))
+    os.replace(tmp, path)
+
+
+class SnapshotDB:
+    """Read-only, in-memory stand-in for ChromaVectorDB backed by a snapshot file."""
+
+    def __init__(self, path: str, index: EmbeddingIndex, collection_name: str,
+                 neighbor_table: Optional[NeighborTable] = None, source: Optional[str] = None):
+        self.path = os.path.abspath(path)
+        self.db_path = os.path.dirname(self.path)
+        self.collection_name = collection_name
+        self.exact_index: Optional[EmbeddingIndex] = index
+        self.neighbor_table = neighbor_table
+        self.source = source
+
+    @classmethod
+    def load(cls, path: str) -> "SnapshotDB":
+        with np.load(path, allow_pickle=False) as z:
+            codepoints = z["codepoints"]
+            ids = [f"{cp:04X}" for cp in codepoints.tolist()]
+            index = EmbeddingIndex(ids, z["vectors"], space=str(z["space"]), prepared=True)
+            table = NeighborTable(z["neighbors"], z["neighbor_distances"])
+            collection = str(z["collection"])
+            source = str(z["source"]) if "source" in z.files else ""
+        return cls(path, index, collection, table if table.k else None, source or None)
+
+    def load_exact_index(self, batch_size: int = 5000) -> EmbeddingIndex:
+        return self.exact_index
+
+    def search_range(self, query_vector: np.ndarray, max_distance: float, max_results: int = 1000,
+                     exclude_id: str | None = None) -> Tuple[List[str], List[float]]:
+        index = self.exact_index
+        exclude = index.row_of.get(str(exclude_id).upper()) if exclude_id is not None else None
+        rows, dists = index.range_search(index.prepare(query_vector)[0], max_distance, max_results, exclude)
+        return [index.ids[r] for r in rows], dists.tolist()
+
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        index = self.exact_index
+        found = [i for i in ids if i in index.row_of]
+        return found, index.matrix[[index.row_of[i] for i in found]]
+
+    def distance_space(self) -> str:
+        return self.exact_index.space
+
+    def iter_embeddings(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray]]:
+        index = self.exact_index
+        for start in range(0, len(index), batch_size):
+            yield index.ids[start:start + batch_size], index.matrix[start:start + batch_size]
+
+    def load_embedding_matrix(self, batch_size: int = 5000) -> Tuple[List[str], np.ndarray]:
+        return list(self.exact_index.ids), self.exact_index.matrix
+
+    def dimension(self) -> int:
+        return self.exact_index.dim
+
+    def get_stats(self):
+        return {"total_images": len(self.exact_index) if self.exact_index is not None else 0}
+
+    def close(self):
+        self.exact_index = None
+        self.neighbor_table = None
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Profile API cold start: import-time breakdown and time to the first successful request.
+
+1. `python -X importtime -c "import api_main"` runs in a child process, and
+   its self times are summed per top-level package (what a worker pays before
+   serving anything).
+2. A uvicorn server is started with the current environment (set WARM_START=1,
+   CHROMA_DB_PATH, ... as for production), /readyz is polled until it answers
+   200, and then one search is sent. The wall time from spawning the process to
+   the first successful search is reported together with the server's own
+   stage timings (imports, index open, warm-up query).
+
+Examples:
+  uv run python startup_profile.py
+  WARM_START=1 uv run python startup_profile.py --unicode 4E00 --json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_breakdown(module: str = "api_main") -> Tuple[float, List[Tuple[str, float]]]:
+    """(total ms, [(top-level package, self ms)] sorted by cost) for importing module in a fresh interpreter."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=HERE, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    per_package: Dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (p.strip() for p in line[len("import time:"):].split("|"))
+        per_package[name.split(".")[0]] += int(self_us) / 1000
+        if name == module:
+            total = int(cumulative_us) / 1000
+    return total, sorted(per_package.items(), key=lambda kv: -kv[1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(url: str, body: bytes | None = None, timeout: float = 5.0) -> Tuple[int, bytes]:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"} if body else {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def first_request(unicode_hex: str, timeout: float) -> Dict:
+    """Spawn uvicorn, wait for /readyz, send one search; timings in ms from the spawn."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "api_main:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--log-level", "warning"],
+                            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready_ms = None
+        readyz: Dict = {}
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                status, body = _request(f"{base}/readyz", timeout=1.0)
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.01)
+                continue
+            if status == 200:
+                ready_ms = (time.perf_counter() - t0) * 1000
+                readyz = json.loads(body)
+                break
+            readyz = json.loads(body)
+            time.sleep(0.01)
+        if ready_ms is None:
+            raise RuntimeError(f"not ready after {timeout:.0f}s: {readyz}")
+        status, body = _request(f"{base}/search/unicode", json.dumps({"unicode": unicode_hex}).encode())
+        if status != 200:
+            raise RuntimeError(f"search failed ({status}): {body[:200]!r}")
+        first_ms = (time.perf_counter() - t0) * 1000
+        return {"ready_ms": round(ready_ms, 1), "first_request_ms": round(first_ms, 1),
+                "warm_start": readyz.get("warm_start"), "modules": readyz.get("modules", {}),
+                "server": readyz.get("startup", {})}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Profile API cold start (imports, readiness, first request).")
+    parser.add_argument('--unicode', default='4E00', help='Codepoint searched as the first request (default: 4E00)')
+    parser.add_argument('--top', type=int, default=15, help='Packages shown in the import breakdown (default: 15)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Seconds to wait for readiness (default: 120)')
+    parser.add_argument('--imports-only', action='store_true', help='Only report the import-time breakdown')
+    parser.add_argument('--json', action='store_true', help='Print one JSON object instead of a table')
+    args = parser.parse_args()
+
+    total, packages = import_breakdown()
+    report: Dict = {"import_ms": round(total, 1),
+                    "imports": [{"package": p, "ms": round(ms, 1)} for p, ms in packages[:args.top]]}
+    if not args.imports_only:
+        try:
+            report.update(first_request(args.unicode.upper().replace("U+", ""), args.timeout))
+        except RuntimeError as e:
+            print(f"错误: {e}")
+            return 1
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return 0
+    print(f"import api_main: {report['import_ms']:.0f}ms")
+    for item in report["imports"]:
+        print(f"  {item['package']:<28} {item['ms']:8.1f}ms")
+    if "first_request_ms" in report:
+        print(f"就绪: {report['ready_ms']:.0f}ms，首个成功请求: {report['first_request_ms']:.0f}ms "
+              f"(WARM_START={'1' if report['warm_start'] else '0'}; 已载入模块: "
+              f"{', '.join(m for m, loaded in report['modules'].items() if loaded) or '无'})")
+        for k, v in report["server"].items():
+            print(f"  {k:<28} {v:8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
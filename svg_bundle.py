@@ -0,0 +1,228 @@
+"""
+Packed SVG bundle: one indexed file instead of one `.svg` per glyph.
+
+Layout (little-endian), append-friendly so workers can stream payloads:
+
+    MAGIC | payload ... payload | meta JSON | cps[u32 * n] | offsets[u64 * n] | lengths[u32 * n] | footer
+
+    footer = struct "<QII8s": (meta_offset, count, meta_len, MAGIC)
+
+Payload offsets are absolute file offsets. The index is sorted by codepoint so
+readers can bisect directly on the mmap'd arrays without building a dict.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard as _zstd  # type: ignore
+except Exception:  # pragma: no cover
+    _zstd = None  # type: ignore
+
+MAGIC = b"HZSVGB01"
+_FOOTER = struct.Struct("<QII8s")
+CODECS = ("none", "gzip", "zstd")
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "none":
+        return data
+    if codec == "gzip":
+        # mtime=0 keeps output deterministic across runs
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if codec == "zstd":
+        if _zstd is None:
+            raise RuntimeError("zstandard is not installed. Please install 'zstandard'.")
+        return _zstd.ZstdCompressor(level=19).compress(data)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "none":
+        return data
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if _zstd is None:
+            raise RuntimeError("zstandard is not installed. Please install 'zstandard'.")
+        return _zstd.ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+class SvgBundleWriter:
+    """Append SVG payloads to a bundle file; the index is written on close()."""
+
+    def __init__(self, path: str, codec: str = "none", meta: Optional[Dict] = None):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec: {codec}")
+        if codec == "zstd" and _zstd is None:
+            raise RuntimeError("zstandard is not installed. Please install 'zstandard'.")
+        self.path = path
+        self.codec = codec
+        self.meta = dict(meta or {})
+        self._tmp = path + ".tmp"
+        self._f = open(self._tmp, "wb")
+        self._f.write(MAGIC)
+        self._index: Dict[int, Tuple[int, int]] = {}
+
+    def add(self, cp: int, svg: str | bytes):
+        data = svg.encode("utf-8") if isinstance(svg, str) else svg
+        self.add_raw(cp, _compress(data, self.codec))
+
+    def add_raw(self, cp: int, payload: bytes):
+        """Append an already-encoded payload (must match this bundle's codec)."""
+        offset = self._f.tell()
+        self._f.write(payload)
+        # last write wins for duplicated codepoints
+        self._index[cp] = (offset, len(payload))
+
+    def close(self):
+        if self._f.closed:
+            return
+        meta = dict(self.meta, codec=self.codec, version=1)
+        meta_bytes = json.dumps(meta, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        cps = sorted(self._index)
+        meta_offset = self._f.tell()
+        self._f.write(meta_bytes)
+        self._f.write(struct.pack(f"<{len(cps)}I", *cps))
+        self._f.write(struct.pack(f"<{len(cps)}Q", *(self._index[cp][0] for cp in cps)))
+        self._f.write(struct.pack(f"<{len(cps)}I", *(self._index[cp][1] for cp in cps)))
+        self._f.write(_FOOTER.pack(meta_offset, len(cps), len(meta_bytes), MAGIC))
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        if not self._f.closed:
+            self._f.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __enter__(self) -> "SvgBundleWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SvgBundleReader:
+    """Read-only, mmap-backed access to a bundle. Lookups are a bisect + slice."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        mm = self._mm
+        if len(mm) < len(MAGIC) + _FOOTER.size or mm[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"not an SVG bundle: {path}")
+        meta_offset, count, meta_len, magic = _FOOTER.unpack_from(mm, len(mm) - _FOOTER.size)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"corrupt SVG bundle footer: {path}")
+        self.meta: Dict = json.loads(bytes(mm[meta_offset:meta_offset + meta_len]).decode("utf-8"))
+        self.codec: str = self.meta.get("codec", "none")
+        view = self._view = memoryview(mm)
+        pos = meta_offset + meta_len
+        self._cps = view[pos:pos + 4 * count].cast("I")
+        pos += 4 * count
+        self._offsets = view[pos:pos + 8 * count].cast("Q")
+        pos += 8 * count
+        self._lengths = view[pos:pos + 4 * count].cast("I")
+        self.count = count
+
+    def _find(self, cp: int) -> int:
+        i = bisect_left(self._cps, cp)
+        if i < self.count and self._cps[i] == cp:
+            return i
+        return -1
+
+    def __contains__(self, cp: int) -> bool:
+        return self._find(cp) >= 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def codepoints(self) -> List[int]:
+        return self._cps.tolist()
+
+    def get_raw(self, cp: int) -> Optional[bytes]:
+        """Return the stored (possibly compressed) payload bytes for cp."""
+        i = self._find(cp)
+        if i < 0:
+            return None
+        off = self._offsets[i]
+        return self._mm[off:off + self._lengths[i]]
+
+    def get(self, cp: int) -> Optional[bytes]:
+        """Return the decoded SVG bytes for cp, or None if absent."""
+        raw = self.get_raw(cp)
+        if raw is None:
+            return None
+        return _decompress(raw, self.codec)
+
+    def items_raw(self) -> Iterable[Tuple[int, bytes]]:
+        for i in range(self.count):
+            off = self._offsets[i]
+            yield self._cps[i], self._mm[off:off + self._lengths[i]]
+
+    def close(self):
+        for name in ("_cps", "_offsets", "_lengths", "_view"):
+            mv = getattr(self, name, None)
+            if mv is not None:
+                mv.release()
+        mm = getattr(self, "_mm", None)
+        if mm is not None:
+            mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "SvgBundleReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def merge_bundles(shard_paths: List[str], out_path: str, remove_shards: bool = True) -> int:
+    """Merge per-shard bundles (same codec) into one bundle; returns glyph count."""
+    if not shard_paths:
+        raise ValueError("no shard bundles to merge")
+    readers = [SvgBundleReader(p) for p in shard_paths]
+    try:
+        codecs = {r.codec for r in readers}
+        if len(codecs) != 1:
+            raise ValueError(f"cannot merge bundles with different codecs: {sorted(codecs)}")
+        meta = {k: v for k, v in readers[0].meta.items() if k not in ("codec", "version")}
+        with SvgBundleWriter(out_path, codec=readers[0].codec, meta=meta) as w:
+            for r in readers:
+                for cp, payload in r.items_raw():
+                    w.add_raw(cp, payload)
+            count = len(w)
+    finally:
+        for r in readers:
+            r.close()
+    if remove_shards:
+        for p in shard_paths:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+    return count
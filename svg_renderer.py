@@ -1,19 +1,124 @@
 from __future__ import annotations
 
 import os
+import re
 import glob
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 try:
     from fontTools.ttLib import TTFont, TTCollection
     from fontTools.pens.svgPathPen import SVGPathPen
     from fontTools.pens.boundsPen import BoundsPen
+    from fontTools.pens.basePen import BasePen
+    from fontTools.pens.transformPen import TransformPen
+    from fontTools.svgLib.path import parse_path
 except Exception:  # pragma: no cover
     TTFont = None  # type: ignore
     TTCollection = None  # type: ignore
     SVGPathPen = None  # type: ignore
     BoundsPen = None  # type: ignore
+    BasePen = object  # type: ignore
+    TransformPen = None  # type: ignore
+    parse_path = None  # type: ignore
+
+from codepoint_set import CodepointSet
+from metrics import stage
+
+
+def _fmt_num(v: float, precision: int) -> str:
+    """Shortest decimal form: 12.0 -> '12', 0.5 -> '.5', -0.5 -> '-.5'."""
+    s = f"{v:.{precision}f}" if precision > 0 else str(int(round(v)))
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    if s in ("-0", ""):
+        return "0"
+    if s.startswith("0."):
+        return s[1:]
+    if s.startswith("-0."):
+        return "-" + s[2:]
+    return s
+
+
+class CompactPathPen(BasePen):
+    """Pen emitting minified SVG path data with relative commands.
+
+    Points are quantized to `precision` decimals in output (pixel) space; deltas
+    are taken between quantized absolute points so rounding never accumulates.
+    """
+
+    def __init__(self, glyphSet=None, precision: int = 1):
+        super().__init__(glyphSet)
+        self.precision = precision
+        self._scale = 10 ** precision
+        self._parts: List[str] = []
+        self._last_cmd = ""
+        self._last_num = "z"
+        self._cur = (0, 0)  # quantized current point (integer units of 10**-precision)
+        self._start = (0, 0)
+
+    def _q(self, pt) -> Tuple[int, int]:
+        return (int(round(pt[0] * self._scale)), int(round(pt[1] * self._scale)))
+
+    def _emit(self, cmd: str, *values: int):
+        # repeated commands are implicit in SVG path grammar (never for "m": that would become "l")
+        if cmd != self._last_cmd or cmd == "m":
+            out, prev = [cmd], cmd
+        else:
+            out, prev = [], self._last_num
+        for v in values:
+            n = _fmt_num(v / self._scale, self.precision)
+            # a separator is only needed when n could be read as a continuation of prev
+            if prev[-1] not in "mlhvcqz" and not n.startswith("-") and not (n.startswith(".") and "." in prev):
+                out.append(" ")
+            out.append(n)
+            prev = n
+        self._parts.append("".join(out))
+        self._last_cmd = cmd
+        self._last_num = prev
+
+    def _moveTo(self, pt):
+        p = self._q(pt)
+        self._emit("m", p[0] - self._cur[0], p[1] - self._cur[1])
+        self._cur = self._start = p
+
+    def _lineTo(self, pt):
+        p = self._q(pt)
+        dx, dy = p[0] - self._cur[0], p[1] - self._cur[1]
+        if dx == 0 and dy == 0:
+            return
+        if dy == 0:
+            self._emit("h", dx)
+        elif dx == 0:
+            self._emit("v", dy)
+        else:
+            self._emit("l", dx, dy)
+        self._cur = p
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        c = self._cur
+        p1, p2, p3 = self._q(pt1), self._q(pt2), self._q(pt3)
+        self._emit("c", p1[0] - c[0], p1[1] - c[1], p2[0] - c[0], p2[1] - c[1], p3[0] - c[0], p3[1] - c[1])
+        self._cur = p3
+
+    def _qCurveToOne(self, pt1, pt2):
+        c = self._cur
+        p1, p2 = self._q(pt1), self._q(pt2)
+        self._emit("q", p1[0] - c[0], p1[1] - c[1], p2[0] - c[0], p2[1] - c[1])
+        self._cur = p2
+
+    def _closePath(self):
+        self._parts.append("z")
+        self._last_cmd = "z"
+        self._cur = self._start
+
+    def _endPath(self):
+        pass
+
+    def getCommands(self) -> str:
+        return "".join(self._parts)
 
 
 @dataclass
@@ -21,12 +126,89 @@ class FontFace:
     path: str
     ttc_index: Optional[int] = None  # for collections
     units_per_em: int = 1000
-    codepoints: Optional[set[int]] = None
+    codepoints: Optional[CodepointSet] = None
+
+
+# Coverage cache: the parsed face list of a fonts directory, so processes skip the cmap parsing.
+# Entries are per font file and valid while its size and mtime are unchanged:
+#
+#     version        int
+#     files          str[F]      absolute font paths
+#     keys           <i8[F, 2]   (size, mtime_ns) of each file when it was parsed
+#     face_file      <i4[N]      file of each face (files without usable faces have none)
+#     face_ttc       <i4[N]      collection index, -1 for plain fonts
+#     face_upm       <i4[N]      units per em
+#     range_offsets  <i8[N + 1]  faces' slices of `ranges`
+#     ranges         <u4[R, 2]   covered codepoints as sorted [start, end) runs (CodepointSet.to_array)
+COVERAGE_CACHE_FILE = ".font_coverage.npz"
+_COVERAGE_CACHE_VERSION = 1
+
+# (size, mtime_ns) -> faces of one font file as (ttc_index, units_per_em, ranges)
+CachedFaces = Tuple[Tuple[int, int], List[Tuple[Optional[int], int, np.ndarray]]]
+
+
+def default_coverage_cache(fonts_dir: str) -> str:
+    return os.path.join(fonts_dir, COVERAGE_CACHE_FILE)
+
+
+def _file_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def load_coverage_cache(path: str) -> Dict[str, CachedFaces]:
+    """Entries by absolute font path; empty when the file is missing, unreadable or of another version."""
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            if int(z["version"]) != _COVERAGE_CACHE_VERSION:
+                return {}
+            files, keys = z["files"].tolist(), z["keys"].tolist()
+            face_file, face_ttc, face_upm = z["face_file"].tolist(), z["face_ttc"].tolist(), z["face_upm"].tolist()
+            offsets, ranges = z["range_offsets"], z["ranges"]
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"警告: 无法读取字体覆盖缓存 {path}，将重新解析字体: {e}")
+        return {}
+    out: Dict[str, CachedFaces] = {f: ((k[0], k[1]), []) for f, k in zip(files, keys)}
+    for i, (fi, ttc, upm) in enumerate(zip(face_file, face_ttc, face_upm)):
+        out[files[fi]][1].append((None if ttc < 0 else ttc, upm, ranges[offsets[i]:offsets[i + 1]]))
+    return out
+
+
+def save_coverage_cache(path: str, entries: Dict[str, CachedFaces]):
+    """Write atomically; the temp name carries the pid since several workers may save at once."""
+    files = list(entries)
+    faces = [(fi, ttc, upm, ranges) for fi, f in enumerate(files) for ttc, upm, ranges in entries[f][1]]
+    lengths = [len(r) for *_, r in faces]
+    head, tail = os.path.split(path)
+    tmp = os.path.join(head, f".tmp-{os.getpid()}-{tail}")
+    with open(tmp, "wb") as f:
+        np.savez(f, version=np.int64(_COVERAGE_CACHE_VERSION),
+                 files=np.array(files, dtype=str).reshape(len(files)),
+                 keys=np.array([entries[f][0] for f in files], dtype="<i8").reshape(len(files), 2),
+                 face_file=np.array([x[0] for x in faces], dtype="<i4"),
+                 face_ttc=np.array([-1 if x[1] is None else x[1] for x in faces], dtype="<i4"),
+                 face_upm=np.array([x[2] for x in faces], dtype="<i4"),
+                 range_offsets=np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype("<i8"),
+                 ranges=(np.concatenate([x[3] for x in faces]) if faces else np.zeros((0, 2))).astype("<u4"))
+    os.replace(tmp, path)
 
 
 class SvgGlyphRenderer:
-    def __init__(self, fonts_dir: str):
+    """Renders glyphs from the fonts in `fonts_dir`, the first face covering a codepoint wins.
+
+    With `coverage_cache` (a file path, see default_coverage_cache) the face list and
+    coverage are read from that file for fonts whose size and mtime are unchanged; only
+    new or modified fonts are parsed, after which the file is rewritten.
+    """
+
+    def __init__(self, fonts_dir: str, coverage_cache: Optional[str] = None):
         self.fonts_dir = fonts_dir
+        self.coverage_cache = coverage_cache
         self.faces: List[FontFace] = []
         self._initialized = False
 
@@ -37,31 +219,59 @@ class SvgGlyphRenderer:
             paths.extend(glob.glob(os.path.join(self.fonts_dir, pat)))
         return paths
 
+    def _parse_faces(self, p: str) -> List[FontFace]:
+        ext = os.path.splitext(p)[1].lower()
+        faces: List[FontFace] = []
+        try:
+            if ext in (".ttc", ".otc"):
+                coll = TTCollection(p, lazy=True)
+                for idx, f in enumerate(coll.fonts):
+                    try:
+                        cmap = f.getBestCmap() or {}
+                        upm = int(f["head"].unitsPerEm)
+                        faces.append(FontFace(path=p, ttc_index=idx, units_per_em=upm, codepoints=CodepointSet.from_codepoints(cmap)))
+                    except Exception:
+                        continue
+            else:
+                f = TTFont(p, lazy=True)
+                cmap = f.getBestCmap() or {}
+                upm = int(f["head"].unitsPerEm)
+                faces.append(FontFace(path=p, ttc_index=None, units_per_em=upm,
+                                      codepoints=CodepointSet.from_codepoints(cmap)))
+        except Exception:
+            # skip problematic fonts
+            pass
+        return faces
+
     def _load_faces(self):
         if TTFont is None:
             raise RuntimeError("fonttools is not installed. Please install 'fonttools'.")
         paths = self._list_font_paths()
+        cached = load_coverage_cache(self.coverage_cache) if self.coverage_cache else {}
+        entries: Dict[str, CachedFaces] = {}
         faces: List[FontFace] = []
+        parsed = False
         for p in paths:
-            ext = os.path.splitext(p)[1].lower()
+            key = _file_key(p)
+            hit = cached.get(os.path.abspath(p))
+            if key is not None and hit is not None and hit[0] == key:
+                file_faces = [FontFace(path=p, ttc_index=ttc, units_per_em=upm,
+                                       codepoints=CodepointSet.from_array(ranges))
+                              for ttc, upm, ranges in hit[1]]
+                entries[os.path.abspath(p)] = hit
+            else:
+                file_faces = self._parse_faces(p)
+                parsed = True
+                if key is not None:
+                    entries[os.path.abspath(p)] = (key, [(f.ttc_index, f.units_per_em, f.codepoints.to_array())
+                                                         for f in file_faces])
+            faces.extend(file_faces)
+        # rewrite after parsing anything, and to drop entries of removed fonts
+        if self.coverage_cache and (parsed or entries.keys() != cached.keys()):
             try:
-                if ext in (".ttc", ".otc"):
-                    coll = TTCollection(p, lazy=True)
-                    for idx, f in enumerate(coll.fonts):
-                        try:
-                            cmap = f.getBestCmap() or {}
-                            upm = int(f["head"].unitsPerEm)
-                            faces.append(FontFace(path=p, ttc_index=idx, units_per_em=upm, codepoints=set(cmap.keys())))
-                        except Exception:
-                            continue
-                else:
-                    f = TTFont(p, lazy=True)
-                    cmap = f.getBestCmap() or {}
-                    upm = int(f["head"].unitsPerEm)
-                    faces.append(FontFace(path=p, ttc_index=None, units_per_em=upm, codepoints=set(cmap.keys())))
-            except Exception:
-                # skip problematic fonts
-                continue
+                save_coverage_cache(self.coverage_cache, entries)
+            except Exception as e:
+                print(f"警告: 无法写入字体覆盖缓存 {self.coverage_cache}: {e}")
         # prioritize by filename order
         self.faces = faces
         self._initialized = True
@@ -80,56 +290,115 @@ class SvgGlyphRenderer:
                 return face
         return None
 
-    def render_svg(self, cp: int, size: int = 128, padding: int = 8, fill: str = "#000") -> str:
+    def glyph_outline(self, cp: int) -> Tuple[str, Optional[Tuple[float, float, float, float]]]:
+        """Return (path data in font units, bounds) for cp; bounds is None for empty glyphs."""
         if TTFont is None:
             raise RuntimeError("fonttools is not installed. Please install 'fonttools'.")
-        face = self._select_face(cp)
+        with stage("render", "face_select"):
+            face = self._select_face(cp)
         if not face:
             raise FileNotFoundError(f"No font in '{self.fonts_dir}' covers U+{cp:04X}")
 
-        font = self._open_font(face)
-        cmap = font.getBestCmap() or {}
+        with stage("render", "font_open"):
+            font = self._open_font(face)
+            cmap = font.getBestCmap() or {}
         glyph_name = cmap.get(cp)
         if not glyph_name:
             raise FileNotFoundError(f"Glyph not found for U+{cp:04X}")
 
-        glyph_set = font.getGlyphSet()
-        glyph = glyph_set[glyph_name]
+        with stage("render", "draw"):
+            glyph_set = font.getGlyphSet()
+            glyph = glyph_set[glyph_name]
+
+            # Compute bounds
+            bpen = BoundsPen(glyph_set)
+            glyph.draw(bpen)
+            bounds = bpen.bounds  # (xMin, yMin, xMax, yMax)
+            if not bounds:
+                return "", None
+
+            # Path data
+            spen = SVGPathPen(glyph_set)
+            glyph.draw(spen)
+            return spen.getCommands(), bounds
+
+    def render_svg(self, cp: int, size: int = 128, padding: int = 8, fill: str = "#000",
+                   compact: bool = False, precision: int = 1) -> str:
+        d, bounds = self.glyph_outline(cp)
+        with stage("render", "serialize"):
+            return compose_svg(d, bounds, size=size, padding=padding, fill=fill, compact=compact, precision=precision)
 
-        # Compute bounds
-        bpen = BoundsPen(glyph_set)
-        glyph.draw(bpen)
-        bounds = bpen.bounds  # (xMin, yMin, xMax, yMax)
+
+def _layout(bounds: Tuple[float, float, float, float], view: int, pad: int) -> Tuple[float, float, float]:
+    """Return (scale, dx, dy) fitting bounds into a view x view box with padding."""
+    xMin, yMin, xMax, yMax = bounds
+    w = max(1.0, xMax - xMin)
+    h = max(1.0, yMax - yMin)
+    scale = min((view - 2 * pad) / w, (view - 2 * pad) / h)
+    # Centering offsets (account for y-flip)
+    dx = (view - scale * w) / 2.0
+    dy = (view - scale * h) / 2.0
+    return scale, dx, dy
+
+
+def compact_path(d: str, bounds: Tuple[float, float, float, float], size: int = 128, padding: int = 8,
+                 precision: int = 1) -> str:
+    """Bake the glyph transform into font-unit path data: pixel-space, quantized, relative, minified."""
+    if parse_path is None:
+        raise RuntimeError("fonttools is not installed. Please install 'fonttools'.")
+    scale, dx, dy = _layout(bounds, size, padding)
+    xMin, yMin = bounds[0], bounds[1]
+    # Same affine as the standard output's transform attribute, applied to the points
+    pen = CompactPathPen(precision=precision)
+    tpen = TransformPen(pen, (scale, 0, 0, -scale, dx - scale * xMin, size - dy + scale * yMin))
+    parse_path(d, tpen)
+    return pen.getCommands()
+
+
+def compose_svg(d: str, bounds: Optional[Tuple[float, float, float, float]], size: int = 128,
+                padding: int = 8, fill: str = "#000", compact: bool = False, precision: int = 1) -> str:
+    """Wrap font-unit path data into a size x size SVG document (size-independent outline in, SVG out).
+
+    compact=True emits pre-transformed, quantized relative path data in minified markup; at the
+    requested size it draws the same shape (within 10**-precision px).
+    """
+    if compact:
+        head = f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">' \
+               f'<rect width="{size}" height="{size}" fill="#fff"/>'
         if not bounds:
-            # Empty glyph (e.g., space): draw a small placeholder box
-            return f"""
+            box = _fmt_num(size / 2 - 8, 3)
+            return f'{head}<rect x="{box}" y="{box}" width="16" height="16" fill="{fill}"/></svg>'
+        return f'{head}<path d="{compact_path(d, bounds, size, padding, precision)}" fill="{fill}"/></svg>'
+
+    if not bounds:
+        # Empty glyph (e.g., space): draw a small placeholder box
+        return f"""
 <svg xmlns='http://www.w3.org/2000/svg' width='{size}' height='{size}' viewBox='0 0 {size} {size}'>
   <rect x='0' y='0' width='{size}' height='{size}' fill='white'/>
   <rect x='{size/2-8}' y='{size/2-8}' width='16' height='16' fill='{fill}'/>
 </svg>"""
 
-        xMin, yMin, xMax, yMax = bounds
-        w = max(1.0, xMax - xMin)
-        h = max(1.0, yMax - yMin)
-        view = size
-        pad = padding
-        scale = min((view - 2 * pad) / w, (view - 2 * pad) / h)
-        # Centering offsets (account for y-flip)
-        dx = (view - scale * w) / 2.0
-        dy = (view - scale * h) / 2.0
-
-        # Path data
-        spen = SVGPathPen(glyph_set)
-        glyph.draw(spen)
-        d = spen.getCommands()
-
-        # Compose SVG: flip Y via scale(..., -...), translate to center
-        # Transform order: move glyph to origin -> scale/flip -> move into view
-        transform = f"translate({dx:.3f} {view - dy:.3f}) scale({scale:.6f} {-scale:.6f}) translate({-xMin:.3f} {-yMin:.3f})"
-
-        svg = f"""
+    xMin, yMin = bounds[0], bounds[1]
+    view = size
+    scale, dx, dy = _layout(bounds, view, padding)
+
+    # Compose SVG: flip Y via scale(..., -...), translate to center
+    # Transform order: move glyph to origin -> scale/flip -> move into view
+    transform = f"translate({dx:.3f} {view - dy:.3f}) scale({scale:.6f} {-scale:.6f}) translate({-xMin:.3f} {-yMin:.3f})"
+
+    svg = f"""
 <svg xmlns='http://www.w3.org/2000/svg' width='{size}' height='{size}' viewBox='0 0 {view} {view}'>
   <rect x='0' y='0' width='{view}' height='{view}' fill='white'/>
   <path d='{d}' transform='{transform}' fill='{fill}'/>
 </svg>"""
-        return svg.strip()
+    return svg.strip()
+
+
+def svg_to_symbol(svg: str, symbol_id: str) -> str:
+    """Turn a standalone glyph SVG into a <symbol> for an SVG sprite (keeps its viewBox)."""
+    svg = svg.strip()
+    open_end = svg.index(">", svg.index("<svg")) + 1
+    close_start = svg.rindex("</svg>")
+    m = re.search(r"""viewBox=['"]([^'"]*)['"]""", svg[:open_end])
+    view_box = f" viewBox='{m.group(1)}'" if m else ""
+    return f"<symbol id='{symbol_id}'{view_box}>{svg[open_end:close_start].strip()}</symbol>"
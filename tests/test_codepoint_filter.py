@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from codepoint_filter import (BLOCKS, CodepointFilter, block_ranges, in_ranges, merge_ranges, parse_codepoint_token,
+                              parse_range)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("4E00-9FFF", (0x4E00, 0x9FFF)),
+    ("U+4E00..U+9FFF", (0x4E00, 0x9FFF)),
+    ("u+4e00 - 4e0f", (0x4E00, 0x4E0F)),
+    ("4E00", (0x4E00, 0x4E00)),
+    (" 10FFFF ", (0x10FFFF, 0x10FFFF)),
+])
+def test_parse_range(text, expected):
+    assert parse_range(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "9FFF-4E00", "110000", "4E00-110000", "G000", "4E00-", "1234567", "U+"])
+def test_parse_range_rejects(text):
+    with pytest.raises(ValueError):
+        parse_range(text)
+
+
+def test_parse_codepoint_token():
+    assert parse_codepoint_token("一") == 0x4E00
+    assert parse_codepoint_token("A") == 0x41  # a single character, not hex A
+    assert parse_codepoint_token("U+4E00") == 0x4E00
+    with pytest.raises(ValueError):
+        parse_codepoint_token("4E00-4E01")
+
+
+def test_block_names_and_groups():
+    assert block_ranges(["cjk_unified-ideographs"]) == [BLOCKS["CJK Unified Ideographs"]]
+    assert block_ranges(["Radicals"]) == [BLOCKS["CJK Radicals Supplement"], BLOCKS["Kangxi Radicals"]]
+    with pytest.raises(ValueError):
+        block_ranges(["cjk"])
+
+
+def test_merge_ranges_joins_overlapping_and_adjacent():
+    assert merge_ranges([(10, 20), (0, 5), (6, 8), (15, 30), (40, 40)]) == ((0, 8), (10, 30), (40, 40))
+    assert merge_ranges([]) == ()
+
+
+def test_in_ranges_edges():
+    cps = np.array([0, 9, 10, 15, 20, 21, 0x10FFFF])
+    assert in_ranges(cps, [(10, 20)]).tolist() == [False, False, True, True, True, False, False]
+    assert in_ranges(cps, []).tolist() == [False] * len(cps)
+    assert in_ranges(np.array([], dtype=np.uint32), [(1, 2)]).tolist() == []
+
+
+def test_build_none_without_parameters():
+    assert CodepointFilter.build() is None
+    assert CodepointFilter.build(blocks=[], ranges=[], allow=[]) is None
+
+
+def test_equal_filters_compare_and_hash_equal():
+    a = CodepointFilter.build(ranges=["4E00-4E0F", "4E10-4E1F"], allow=["丁", "4E00"])
+    b = CodepointFilter.build(ranges=["U+4E00..U+4E1F"], allow=["4E00", "U+4E01"])
+    assert a == b
+    assert hash(a) == hash(b)
+    assert len({a, b}) == 1
+
+
+def test_mask_include_allow_exclude():
+    cps = np.array([0x41, 0x2F00, 0x4E00, 0x4E01, 0x9FFF, 0xA000], dtype=np.uint32)
+    flt = CodepointFilter.build(blocks=["CJK Unified Ideographs"], allow=["A"], exclude_ranges=["4E01"])
+    assert flt.mask(cps).tolist() == [True, False, True, False, True, False]
+
+
+def test_exclude_only_keeps_everything_else():
+    cps = np.array([0x2E80, 0x2F00, 0x4E00], dtype=np.uint32)
+    flt = CodepointFilter.build(exclude_blocks=["radicals"])
+    assert flt.mask(cps).tolist() == [False, False, True]
+
+
+def test_allow_only():
+    cps = np.array([0x4E00, 0x4E01, 0x4E02], dtype=np.uint32)
+    assert CodepointFilter.build(allow=["丁"]).mask(cps).tolist() == [False, True, False]
+
+
+def test_exclude_wins_over_allow():
+    cps = np.array([0x4E00, 0x4E01], dtype=np.uint32)
+    flt = CodepointFilter.build(allow=["一", "丁"], exclude_ranges=["4E00"])
+    assert flt.mask(cps).tolist() == [False, True]
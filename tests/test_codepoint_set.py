@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from codepoint_set import CodepointSet
+
+
+def _random_sets(seed, count=40):
+    """Clustered random members (runs with gaps of 0-3), the shape of a real cmap, plus their Python sets."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(count):
+        n = int(rng.integers(0, 60))
+        cps = set(np.cumsum(rng.integers(1, 4, size=n)).tolist()) if n else set()
+        out.append((CodepointSet.from_codepoints(cps), cps))
+    return out
+
+
+def _check(s, members):
+    assert s.to_numpy().tolist() == sorted(members)
+    assert list(s) == sorted(members)
+    assert len(s) == len(members)
+    assert bool(s) == bool(members)
+    # stored runs are disjoint and non-adjacent
+    assert np.all(s.ends > s.starts)
+    assert np.all(s.starts[1:] > s.ends[:-1])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_python_sets(seed):
+    cases = _random_sets(seed)
+    probe = np.arange(-2, 200)
+    for (a, sa), (b, sb) in zip(cases, cases[1:]):
+        _check(a, sa)
+        assert a.contains(probe).tolist() == [int(x) in sa for x in probe]
+        assert [int(x) in a for x in probe] == [int(x) in sa for x in probe]
+        _check(a | b, sa | sb)
+        _check(a & b, sa & sb)
+        _check(a - b, sa - sb)
+        assert CodepointSet.from_ranges(a.ranges()) == a
+        assert CodepointSet.from_array(a.to_array()) == a
+        ranges = [(0, 10), (5, 50), (51, 51), (100, 300), (20, 19)]
+        assert a.count_in(ranges).tolist() == [len([x for x in sa if lo <= x <= hi]) for lo, hi in ranges]
+
+
+def test_empty_set():
+    empty = CodepointSet.empty()
+    _check(empty, set())
+    assert CodepointSet.from_codepoints([]) == empty
+    assert CodepointSet.from_ranges([]) == empty
+    assert CodepointSet.union_all([]) == empty
+    assert 0 not in empty
+    assert empty.contains([0, 5]).tolist() == [False, False]
+    assert empty.count_in([(0, 100)]).tolist() == [0]
+    assert empty.to_array().shape == (0, 2)
+    s = CodepointSet.from_ranges([(1, 3)])
+    assert (s & empty) == empty and (s | empty) == s and (s - empty) == s and (empty - s) == empty
+
+
+def test_adjacent_and_overlapping_ranges_merge():
+    s = CodepointSet.from_ranges([(10, 19), (0, 4), (5, 5), (15, 30), (32, 32)])
+    assert list(s.ranges()) == [(0, 5), (10, 30), (32, 32)]
+    assert s.runs == 3
+    assert CodepointSet.from_codepoints(np.array([3, 1, 2, 2, 7], dtype=np.uint32)) == \
+        CodepointSet.from_ranges([(1, 3), (7, 7)])
+    assert CodepointSet.union_all([CodepointSet.from_ranges([(0, 4)]), None, CodepointSet.from_ranges([(5, 9)])]).runs == 1
+
+
+def test_to_array_layout():
+    s = CodepointSet.from_ranges([(0x4E00, 0x9FFF), (0x20000, 0x2A6DF)])
+    arr = s.to_array()
+    assert arr.dtype == np.dtype("<u4")
+    assert arr.tolist() == [[0x4E00, 0xA000], [0x20000, 0x2A6E0]]
+    assert len(s) == 0x5200 + 0xA6E0
+    assert 0x9FFF in s and 0xA000 not in s and 0x4DFF not in s
+
+
+def test_equality_and_unhashable():
+    assert CodepointSet.from_ranges([(1, 2)]) == CodepointSet.from_codepoints([1, 2])
+    assert CodepointSet.from_ranges([(1, 2)]) != CodepointSet.from_ranges([(1, 3)])
+    assert CodepointSet.empty() != set()
+    with pytest.raises(TypeError):
+        hash(CodepointSet.empty())
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+pytest.importorskip("fontTools")
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.svgLib.path import parse_path
+
+from svg_renderer import CompactPathPen, _fmt_num, compact_path, compose_svg
+
+
+@pytest.mark.parametrize("value, precision, expected", [
+    (12.0, 1, "12"),
+    (0.5, 1, ".5"),
+    (-0.5, 1, "-.5"),
+    (-0.04, 1, "0"),
+    (0.0, 2, "0"),
+    (1.25, 2, "1.25"),
+    (1.2, 2, "1.2"),
+    (2.6, 0, "3"),
+    (-2.6, 0, "-3"),
+])
+def test_fmt_num(value, precision, expected):
+    assert _fmt_num(value, precision) == expected
+
+
+def _draw(contours, precision=1):
+    """contours: list of point lists; each is drawn as moveTo + lineTo... + closePath."""
+    pen = CompactPathPen(precision=precision)
+    for pts in contours:
+        pen.moveTo(pts[0])
+        for pt in pts[1:]:
+            pen.lineTo(pt)
+        pen.closePath()
+    return pen.getCommands()
+
+
+def _absolute_points(d):
+    """Parse path data back (SVG grammar) and return the absolute on-curve points per command."""
+    rec = RecordingPen()
+    parse_path(d, rec)
+    return [(op, [tuple(round(c, 6) for c in pt) for pt in args]) for op, args in rec.value]
+
+
+def test_square_uses_h_v_and_implicit_repeats():
+    d = _draw([[(0, 0), (10, 0), (10, 10), (0, 10)]])
+    assert d == "m0 0h10v10h-10z"
+
+
+def test_repeated_lines_drop_the_command_letter():
+    d = _draw([[(0, 0), (1, 2), (3, 5), (6, 9)]])
+    assert d == "m0 0l1 2 2 3 3 4z"
+
+
+def test_move_is_never_implicit():
+    # a second "m" right after another must be kept, or it would be read as "l"
+    pen = CompactPathPen()
+    pen.moveTo((1, 1))
+    pen.endPath()
+    pen.moveTo((2, 2))
+    pen.lineTo((3, 3))
+    pen.closePath()
+    assert pen.getCommands().count("m") == 2
+
+
+def test_zero_length_line_is_dropped():
+    assert _draw([[(0, 0), (0, 0), (5, 0)]]) == "m0 0h5z"
+
+
+def test_separators_only_where_needed():
+    # ".5.5" parses as two numbers; "-" also separates
+    d = _draw([[(0, 0), (0.5, 0.5), (0, 1)]])
+    assert d == "m0 0l.5.5-.5.5z"
+    assert _absolute_points(d)[1] == ("lineTo", [(0.5, 0.5)])
+
+
+def test_relative_moves_after_close_start_from_contour_start():
+    d = _draw([[(10, 10), (20, 10), (20, 20)], [(30, 30), (40, 30), (40, 40)]])
+    starts = [pts[0] for op, pts in _absolute_points(d) if op == "moveTo"]
+    assert starts == [(10.0, 10.0), (30.0, 30.0)]
+
+
+@pytest.mark.parametrize("precision", [0, 1, 2])
+def test_rounding_does_not_accumulate(precision):
+    rnd = random.Random(precision)
+    pts = [(rnd.uniform(-100, 100), rnd.uniform(-100, 100)) for _ in range(200)]
+    pen = CompactPathPen(precision=precision)
+    pen.moveTo(pts[0])
+    for a, b, c in zip(pts[1::3], pts[2::3], pts[3::3]):
+        pen.curveTo(a, b, c)
+    pen.closePath()
+    got = [pt for op, args in _absolute_points(pen.getCommands()) if op in ("moveTo", "curveTo") for pt in args]
+    want = [tuple(round(v, precision) for v in pt) for pt in pts[:1 + 3 * ((len(pts) - 1) // 3)]]
+    assert len(got) == len(want)
+    for g, w in zip(got, want):
+        assert g == pytest.approx(w, abs=10 ** -precision / 2 + 1e-9)
+
+
+def test_quadratic_segments():
+    pen = CompactPathPen()
+    pen.moveTo((0, 0))
+    pen.qCurveTo((5, 10), (10, 0))
+    pen.closePath()
+    assert pen.getCommands() == "m0 0q5 10 10 0z"
+
+
+def test_compact_path_matches_the_standard_transform():
+    # a 100x100 font-unit square at origin fills the 128px box minus 8px padding, y flipped
+    d = compact_path("M0 0L100 0L100 100L0 100Z", (0, 0, 100, 100), size=128, padding=8)
+    moves = [pts for op, pts in _absolute_points(d) if op == "moveTo"]
+    assert moves == [[(8.0, 120.0)]]
+    lines = [pts[0] for op, pts in _absolute_points(d) if op == "lineTo"]
+    assert lines[:3] == [(120.0, 120.0), (120.0, 8.0), (8.0, 8.0)]
+    assert d.startswith("m8 120h112v-112h-112") and d.endswith("z")
+
+
+def test_compose_svg_compact_empty_glyph_placeholder():
+    svg = compose_svg("", None, size=64, compact=True)
+    assert '<rect x="24" y="24" width="16" height="16"' in svg
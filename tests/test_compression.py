@@ -0,0 +1,134 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+import compression
+from compression import CompressionMiddleware, compress, negotiate
+
+
+@pytest.mark.parametrize("header, available, expected", [
+    (None, ["br", "gzip"], None),
+    ("", ["br", "gzip"], None),
+    ("gzip", ["br", "gzip"], "gzip"),
+    ("gzip, br", ["br", "gzip"], "br"),  # server preference, not header order
+    ("br;q=0, gzip", ["br", "gzip"], "gzip"),
+    ("GZIP;q=0.5", ["br", "gzip"], "gzip"),
+    ("*", ["br", "gzip"], "br"),
+    ("*;q=0, gzip", ["br", "gzip"], "gzip"),
+    ("br;q=0, *", ["br", "gzip"], "gzip"),
+    ("gzip;q=bogus", ["br", "gzip"], None),
+    ("identity, deflate", ["br", "gzip"], None),
+    ("br", ["gzip"], None),  # brotli not installed
+])
+def test_negotiate(header, available, expected):
+    assert negotiate(header, available) == expected
+
+
+def test_compress_levels_and_errors():
+    data = b"<svg>" + b"M1 2L3 4" * 200 + b"</svg>"
+    assert gzip.decompress(compress(data, "gzip")) == data
+    assert len(compress(data, "gzip", static=True)) <= len(compress(data, "gzip"))
+    with pytest.raises(ValueError):
+        compress(data, "deflate")
+
+
+def _run(app, accept="gzip", minimum_size=16):
+    """Drive the middleware with one request; returns (start message, concatenated body, body messages)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [(b"accept-encoding", accept.encode())] if accept is not None else []
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": headers}
+    asyncio.run(CompressionMiddleware(app, minimum_size=minimum_size)(scope, receive, send))
+    start = sent[0]
+    bodies = [m for m in sent[1:] if m["type"] == "http.response.body"]
+    return start, b"".join(m.get("body", b"") for m in bodies), bodies
+
+
+def _app(chunks, content_type=b"application/json", status=200, extra_headers=()):
+    async def app(scope, receive, send):
+        headers = [(b"content-type", content_type), *extra_headers]
+        if len(chunks) == 1:
+            headers.append((b"content-length", str(len(chunks[0])).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def _headers(start):
+    return {k.lower(): v for k, v in start["headers"]}
+
+
+def test_compresses_large_json_with_length_and_vary():
+    body = b'{"results":[' + b'{"char":"x","similarity":99.9},' * 50 + b'{}]}'
+    start, data, _ = _run(_app([body]))
+    h = _headers(start)
+    assert h[b"content-encoding"] == b"gzip"
+    assert h[b"vary"] == b"Accept-Encoding"
+    assert int(h[b"content-length"]) == len(data)
+    assert gzip.decompress(data) == body
+
+
+def test_small_body_passes_through_but_varies():
+    start, data, _ = _run(_app([b"{}"]))
+    h = _headers(start)
+    assert b"content-encoding" not in h
+    assert h[b"vary"] == b"Accept-Encoding"
+    assert data == b"{}"
+
+
+def test_existing_vary_is_extended():
+    start, _, _ = _run(_app([b"x" * 100], extra_headers=[(b"vary", b"Origin")]))
+    assert _headers(start)[b"vary"] == b"Origin, Accept-Encoding"
+
+
+@pytest.mark.parametrize("content_type, extra, status", [
+    (b"image/png", (), 200),
+    (b"application/x-msgpack", (), 200),
+    (b"image/svg+xml", ((b"content-encoding", b"br"),), 200),  # precompressed glyph
+    (b"application/json", (), 206),
+])
+def test_passthrough(content_type, extra, status):
+    body = b"x" * 1000
+    start, data, _ = _run(_app([body], content_type, status, extra))
+    h = _headers(start)
+    assert h.get(b"content-encoding") in (None, b"br")
+    assert b"vary" not in h
+    assert data == body
+
+
+def test_no_accept_encoding_is_untouched():
+    body = b"x" * 1000
+    start, data, _ = _run(_app([body]), accept=None)
+    assert b"content-encoding" not in _headers(start)
+    assert data == body
+
+
+def test_streaming_body_flushes_every_chunk():
+    lines = [b'{"query":"%d","results":[]}\n' % i for i in range(5)]
+    start, data, bodies = _run(_app(lines, b"application/x-ndjson"))
+    h = _headers(start)
+    assert h[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in h
+    assert len(bodies) == len(lines)
+    # each chunk decodes on its own as soon as it arrives (sync flush), not only at the end
+    d = zlib.decompressobj(31)
+    for line, msg in zip(lines, bodies):
+        assert d.decompress(msg["body"]) == line
+    assert gzip.decompress(data) == b"".join(lines)
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli not installed")
+def test_brotli_preferred_when_accepted():
+    body = b"x" * 1000
+    start, data, _ = _run(_app([body]), accept="gzip, br")
+    assert _headers(start)[b"content-encoding"] == b"br"
+    assert compression.brotli.decompress(data) == body
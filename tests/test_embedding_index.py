@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+import pytest
+
+import embedding_index
+from codepoint_filter import CodepointFilter
+from embedding_index import EmbeddingIndex, cross_distances
+
+N, D = 200, 16
+
+
+def _index(space="cosine", seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"{0x4E00 + i:04X}" for i in range(N)]
+    return EmbeddingIndex(ids, rng.normal(size=(N, D)).astype(np.float32), space=space)
+
+
+def _brute(index, q, mask=None, exclude=None):
+    """Reference: full distance row, masked / excluded rows set to inf, stable sort."""
+    d = cross_distances(index.prepare(q), index.matrix, index.space)[0].astype(np.float64)
+    if mask is not None:
+        d[~mask] = np.inf
+    if exclude is not None:
+        d[exclude] = np.inf
+    order = np.argsort(d, kind="stable")
+    return order[np.isfinite(d[order])], d
+
+
+# narrow masks take the gather path (score only masked rows), wide ones score everything then select
+MASKS = {
+    "none": None,
+    "narrow": np.arange(N) % 10 == 3,
+    "wide": np.arange(N) % 10 != 3,
+    "single": np.arange(N) == 17,
+    "empty": np.zeros(N, dtype=bool),
+}
+
+
+@pytest.mark.parametrize("space", ["cosine", "l2", "ip"])
+@pytest.mark.parametrize("mask_name", list(MASKS))
+@pytest.mark.parametrize("exclude_self", [False, True])
+def test_topk_matches_brute_force(space, mask_name, exclude_self):
+    index = _index(space)
+    mask = MASKS[mask_name]
+    for r in [0, 17, 23, 199]:
+        # one query at a time, as the API searches
+        rows, dists = index.topk(index.matrix[[r]], 10, exclude=np.array([r]) if exclude_self else None, mask=mask)
+        want, d = _brute(index, index.matrix[r], mask, r if exclude_self else None)
+        want = want[:10]
+        assert rows[0].tolist() == want.tolist()
+        assert np.allclose(dists[0], d[want], atol=1e-5)
+        if mask is not None:
+            assert mask[rows[0]].all()
+
+
+@pytest.mark.parametrize("mask_name", ["none", "narrow", "wide"])
+def test_topk_batch_matches_single_queries(mask_name):
+    index = _index()
+    mask = MASKS[mask_name]
+    rows_q = np.array([0, 3, 13, 150])
+    rows, dists = index.topk(index.matrix[rows_q], 5, exclude=rows_q, mask=mask)
+    for i, r in enumerate(rows_q):
+        single, _ = index.topk(index.matrix[[r]], 5, exclude=np.array([r]), mask=mask)
+        assert rows[i].tolist() == single[0].tolist()
+
+
+def test_topk_k_larger_than_mask():
+    index = _index()
+    mask = MASKS["narrow"]  # 20 rows
+    rows, dists = index.topk(index.matrix[[3]], 50, exclude=np.array([3]), mask=mask)
+    assert rows.shape == (1, 19)  # row 3 is in the mask and excluded
+    rows, _ = index.topk(index.matrix[[0]], 50, exclude=np.array([0]), mask=mask)
+    assert rows.shape == (1, 20)  # row 0 is not in the mask: nothing to drop
+
+
+def test_topk_empty_mask_and_zero_k():
+    index = _index()
+    rows, dists = index.topk(index.matrix[:2], 5, exclude=np.array([0, 1]), mask=MASKS["empty"])
+    assert rows.shape == dists.shape == (2, 0)
+    rows, dists = index.topk(index.matrix[:2], 0)
+    assert rows.shape == (2, 0)
+
+
+@pytest.mark.parametrize("space", ["cosine", "l2"])
+@pytest.mark.parametrize("mask_name", list(MASKS))
+def test_range_search_matches_brute_force(space, mask_name):
+    index = _index(space)
+    mask = MASKS[mask_name]
+    q = index.matrix[17]
+    _, d = _brute(index, q, mask, 17)
+    radius = float(np.quantile(d[np.isfinite(d)], 0.3)) if np.isfinite(d).any() else 1.0
+    rows, dists = index.range_search(index.prepare(q)[0], radius, 1000, exclude=17, mask=mask)
+    want = [r for r in np.argsort(d, kind="stable") if d[r] <= radius]
+    assert rows.tolist() == want
+    assert np.allclose(dists, d[want], atol=1e-5)
+    assert 17 not in rows.tolist()
+
+
+def test_range_search_caps_at_max_results_nearest_first():
+    index = _index()
+    q = index.prepare(index.matrix[5])[0]
+    rows_all, d_all = index.range_search(q, 10.0, 1000, exclude=5)
+    rows, d = index.range_search(q, 10.0, 7, exclude=5)
+    assert rows.tolist() == rows_all[:7].tolist()
+    assert np.all(np.diff(d) >= 0)
+    rows, _ = index.range_search(q, 10.0, 0)
+    assert len(rows) == 0
+
+
+def test_range_search_exclude_outside_mask_is_ignored():
+    index = _index()
+    mask = MASKS["narrow"]
+    q = index.prepare(index.matrix[0])[0]
+    rows, _ = index.range_search(q, 10.0, 1000, exclude=0, mask=mask)
+    assert sorted(rows.tolist()) == np.flatnonzero(mask).tolist()
+
+
+def test_row_mask_cache_and_eviction(monkeypatch):
+    monkeypatch.setattr(embedding_index, "_MASK_CACHE_SIZE", 4)
+    index = _index()
+    filters = [CodepointFilter.build(ranges=[f"{0x4E00 + i:04X}-{0x4E00 + i + 5:04X}"]) for i in range(32)]
+    first = index.row_mask(filters[0])
+    assert index.row_mask(filters[0]) is first
+    assert first.sum() == 6
+
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(200):
+                flt = filters[(i + offset) % len(filters)]
+                assert index.row_mask(flt).sum() == 6
+        except Exception as e:  # pragma: no cover - the failure being tested for
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(index._masks) <= 4
@@ -0,0 +1,225 @@
+import threading
+
+import pytest
+
+from index_registry import (IndexRegistry, IndexSpec, LoadedIndex, parse_index_specs, publish_version,
+                            resolve_index_dir)
+
+class FakeDB:
+    """Just enough of ChromaVectorDB for LoadedIndex: ~1 MB of estimated footprint per 1000 vectors."""
+
+    def __init__(self, db_path, vectors=1000, dim=214):
+        self.db_path = db_path
+        self.vectors = vectors
+        self.dim = dim
+        self.exact_index = None
+        self.closed = False
+
+    def get_stats(self):
+        return {"total_images": self.vectors}
+
+    def dimension(self):
+        return self.dim
+
+    def hnsw_config(self):
+        return {"max_neighbors": 16}
+
+    def close(self):
+        assert not self.closed, "closed twice"
+        self.closed = True
+
+
+class Opener:
+    def __init__(self, vectors=1000):
+        self.vectors = vectors
+        self.opened = []
+        self.calls = 0
+
+    def __call__(self, spec):
+        self.calls += 1
+        path, version = resolve_index_dir(spec.db_path)
+        ix = LoadedIndex(spec, FakeDB(path, self.vectors), version)
+        self.opened.append(ix)
+        return ix
+
+
+def _registry(tmp_path, names=("a", "b", "c"), budget_mb=0, vectors=1000):
+    specs = []
+    for name in names:
+        (tmp_path / name).mkdir(exist_ok=True)
+        specs.append(IndexSpec(name, str(tmp_path / name)))
+    opener = Opener(vectors)
+    return IndexRegistry(specs, opener, memory_budget_mb=budget_mb), opener
+
+
+def test_parse_index_specs():
+    specs = parse_index_specs("vit=./a, clip = ./b#hanzi_clip,")
+    assert specs == [IndexSpec("vit", "./a"), IndexSpec("clip", "./b", "hanzi_clip")]
+    for bad in ("vit", "=./a", "vit=", "a=./x,a=./y"):
+        with pytest.raises(ValueError):
+            parse_index_specs(bad)
+
+
+def test_resolve_and_default(tmp_path):
+    registry, _ = _registry(tmp_path)
+    assert registry.resolve(None) == "a"
+    assert registry.resolve("b") == "b"
+    with pytest.raises(KeyError):
+        registry.resolve("nope")
+    with pytest.raises(ValueError):
+        IndexRegistry([IndexSpec("a", "x")], Opener(), default="b")
+    with pytest.raises(ValueError):
+        IndexRegistry([], Opener())
+
+
+def test_acquire_opens_once_and_counts_holders(tmp_path):
+    registry, opener = _registry(tmp_path)
+    first = registry.acquire("a")
+    second = registry.acquire()
+    assert first is second
+    assert opener.calls == 1
+    assert first._holders == 2
+    registry.release(first)
+    registry.release(second)
+    assert first._holders == 0
+    assert not first.db.closed  # no budget: stays loaded
+
+
+def test_concurrent_first_use_opens_once(tmp_path):
+    registry, opener = _registry(tmp_path)
+    got = []
+
+    def worker():
+        with registry.use("b") as ix:
+            got.append(ix)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert opener.calls == 1
+    assert len(got) == 8 and all(ix is got[0] for ix in got)
+
+
+def test_lru_eviction_over_budget(tmp_path):
+    # each index is estimated at ~1.0 MB, so a 2 MB budget keeps two of them
+    registry, opener = _registry(tmp_path, budget_mb=2)
+    for name in ("a", "b"):
+        with registry.use(name):
+            pass
+    with registry.use("a"):  # a is now the most recently used
+        pass
+    with registry.use("c"):
+        pass
+    a, b, c = opener.opened
+    assert b.db.closed and b._retired
+    assert not a.db.closed and not c.db.closed
+    assert [s["loaded"] for s in registry.stats()] == [True, False, True]
+    # the evicted index reopens on its next use
+    with registry.use("b") as ix:
+        assert ix is not b
+    assert opener.calls == 4
+
+
+def test_index_in_use_is_never_evicted_for_itself(tmp_path):
+    registry, opener = _registry(tmp_path, names=("a",), budget_mb=1, vectors=5000)  # over budget alone
+    with registry.use("a") as ix:
+        assert not ix._retired
+    assert not ix.db.closed
+    assert registry.stats()[0]["loaded"]
+
+
+def test_evicted_while_held_closes_on_last_release(tmp_path):
+    registry, opener = _registry(tmp_path, budget_mb=1)
+    held = registry.acquire("a")
+    held_again = registry.acquire("a")
+    with registry.use("b"):
+        pass
+    # "a" was dropped from the registry but two requests still hold it
+    assert held._retired
+    assert not held.db.closed
+    assert not registry.stats()[0]["loaded"]
+    registry.release(held)
+    assert not held.db.closed
+    registry.release(held_again)
+    assert held.db.closed
+
+
+def test_stats(tmp_path):
+    registry, _ = _registry(tmp_path)
+    with registry.use("b"):
+        pass
+    stats = {s["name"]: s for s in registry.stats()}
+    assert stats["a"]["default"] and not stats["a"]["loaded"] and stats["a"]["memory_mb"] is None
+    assert stats["b"]["loaded"] and stats["b"]["vectors"] == 1000
+    assert stats["b"]["memory_mb"] == pytest.approx(1.0, abs=0.1)
+
+
+# ---- versioned roots and reload ----
+
+def _versioned(tmp_path, *versions):
+    root = tmp_path / "a"
+    for v in versions:
+        (root / v).mkdir(parents=True)
+    return root
+
+
+def test_resolve_index_dir(tmp_path):
+    root = _versioned(tmp_path, "v1", "v2")
+    assert resolve_index_dir(str(root)) == (str(root), None)
+    publish_version(str(root), "v1")
+    assert resolve_index_dir(str(root)) == (str(root / "v1"), "v1")
+    publish_version(str(root), "v2")
+    assert resolve_index_dir(str(root)) == (str(root / "v2"), "v2")
+    assert not (root / ".tmp-CURRENT").exists()
+    with pytest.raises(FileNotFoundError):
+        publish_version(str(root), "v3")
+    for bad in ("../x", ".hidden", ""):
+        (root / "CURRENT").write_text(bad)
+        with pytest.raises(ValueError):
+            resolve_index_dir(str(root))
+
+
+def test_reload_swaps_only_when_version_changed(tmp_path):
+    root = _versioned(tmp_path, "v1", "v2")
+    publish_version(str(root), "v1")
+    registry, opener = _registry(tmp_path, names=("a",))
+    assert registry.reload("a") == {"name": "a", "reloaded": False, "version": None}  # not loaded yet
+    assert opener.calls == 0
+    with registry.use("a") as ix:
+        assert ix.version == "v1"
+    assert registry.reload("a")["reloaded"] is False
+    assert registry.reload_changed() == []
+    publish_version(str(root), "v2")
+    assert registry.reload_changed() == [{"name": "a", "reloaded": True, "previous": "v1", "version": "v2"}]
+    old, fresh = opener.opened
+    assert old.db.closed and not fresh.db.closed
+    with registry.use("a") as ix:
+        assert ix is fresh and ix.db.db_path == str(root / "v2")
+
+
+def test_forced_reload_of_unversioned_directory(tmp_path):
+    registry, opener = _registry(tmp_path, names=("a",))
+    with registry.use("a"):
+        pass
+    assert registry.reload("a")["reloaded"] is False
+    assert registry.reload("a", force=True)["reloaded"] is True
+    assert opener.calls == 2
+    assert opener.opened[0].db.closed
+
+
+def test_reload_while_held_keeps_old_version_until_release(tmp_path):
+    root = _versioned(tmp_path, "v1", "v2")
+    publish_version(str(root), "v1")
+    registry, opener = _registry(tmp_path, names=("a",))
+    held = registry.acquire("a")
+    publish_version(str(root), "v2")
+    registry.reload("a")
+    # new requests see v2 while the in-flight one finishes on v1
+    with registry.use("a") as ix:
+        assert ix.version == "v2"
+    assert held._retired and not held.db.closed
+    registry.release(held)
+    assert held.db.closed
+    assert not opener.opened[1].db.closed
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+from query_stream import QueryStreamResponse
+
+
+def _run(chunks, max_token=64, disconnect_after=None):
+    """Stream `chunks` as the request body; returns the NDJSON objects written and the tokens handled."""
+    handled = []
+    sent = []
+
+    def handle(token):
+        handled.append(token)
+        return {"q": token}
+
+    async def main():
+        pending = list(chunks)
+        received = 0
+
+        async def receive():
+            nonlocal received
+            if disconnect_after is not None and received >= disconnect_after:
+                return {"type": "http.disconnect"}
+            if not pending:
+                await asyncio.Event().wait()  # a client that stays connected after the body
+            received += 1
+            body = pending.pop(0)
+            return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/search/stream", "headers": []}
+        await QueryStreamResponse(handle, max_token=max_token)(scope, receive, send)
+
+    asyncio.run(main())
+    assert sent[0]["type"] == "http.response.start"
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return [json.loads(line) for line in body.splitlines()], handled
+
+
+@pytest.mark.parametrize("chunks, tokens", [
+    ([b"4E00\n4E01\n"], ["4E00", "4E01"]),
+    ([b"4E00, 4E01\t U+4E02"], ["4E00", "4E01", "U+4E02"]),
+    ([b'["\xe4\xb8\x80", "4E01"]'], ["一", "4E01"]),  # a JSON array of strings streams as-is
+    ([b"'4E00','4E01'"], ["4E00", "4E01"]),
+    ([b"4E", b"00\n4E0", b"1"], ["4E00", "4E01"]),  # tokens split across chunk boundaries
+    ([b"\xe4", b"\xb8\x80,\xe4\xb8", b"\x81"], ["一", "丁"]),  # multibyte characters split across chunks
+    ([b",,\n\n  ,", b"", b"4E00,,"], ["4E00"]),  # runs of separators and empty chunks
+    ([b""], []),
+    ([b"[]"], []),
+])
+def test_token_splitting(chunks, tokens):
+    lines, handled = _run(chunks)
+    assert handled == tokens
+    assert lines == [{"q": t} for t in tokens]
+
+
+def test_invalid_utf8_is_replaced_not_fatal():
+    lines, handled = _run([b"\xff\xfe,4E00"])
+    assert handled == ["��", "4E00"]
+
+
+def test_overlong_token_ends_stream_with_error():
+    lines, handled = _run([b"4E00,", b"X" * 40, b"X" * 40], max_token=64)
+    assert handled == ["4E00"]
+    assert lines[0] == {"q": "4E00"}
+    assert "longer than 64 bytes" in lines[-1]["error"]
+
+
+def test_token_at_the_limit_is_accepted():
+    lines, handled = _run([b"A" * 64, b""], max_token=64)
+    assert handled == ["A" * 64]
+
+
+def test_disconnect_mid_body_stops_queries():
+    lines, handled = _run([b"4E00,", b"4E01,", b"4E02"], disconnect_after=1)
+    assert handled == ["4E00"]
@@ -0,0 +1,137 @@
+import io
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import result_codec
+from result_codec import (EMPTY_NEIGHBORS, Neighbors, batch_payload, dumps, json_response, search_payload, similarity,
+                          similarities)
+
+
+def _neighbors():
+    return Neighbors(["丁", "丂", "?"], ["4E01", "4E02", "XYZ"], [0.0023, 0.25, 1.5])
+
+
+def test_neighbors_count_and_len():
+    n = _neighbors()
+    assert n.count == 3
+    assert len(n) == 3  # the tuple's three columns, not the neighbor count
+    assert Neighbors(["a"], ["0061"], [0.1]).count == 1
+    assert len(Neighbors(["a"], ["0061"], [0.1])) == 3
+    assert EMPTY_NEIGHBORS.count == 0
+    chars, unicodes, distances = n
+    assert distances == [0.0023, 0.25, 1.5]
+
+
+def test_codepoints_fall_back_to_char_or_replacement():
+    assert Neighbors(["丁", "x", "ab"], ["4E01", "nothex", "zz"], [0, 0, 0]).codepoints() == [0x4E01, ord("x"), 0xFFFD]
+
+
+@pytest.mark.parametrize("distance, expected", [
+    (0.0, 100.0), (0.0023, 99.8), (0.25, 75.0), (1.0, 0.0), (1.5, 0.0), (-0.2, 100.0),
+])
+def test_similarity_is_clamped_and_rounded(distance, expected):
+    assert similarity(distance) == expected
+
+
+def test_vectorized_similarities_match_scalar():
+    d = np.array([-0.5, 0.0, 0.0023, 0.33333, 0.999, 1.0, 2.0])
+    assert similarities(d).tolist() == [similarity(x) for x in d.tolist()]
+
+
+def test_search_payload_key_order():
+    payload = search_payload("一", _neighbors())
+    assert list(payload) == ["query", "results"]
+    assert list(payload["results"][0]) == ["char", "unicode", "distance", "similarity"]
+    assert payload["results"][0] == {"char": "丁", "unicode": "U+4E01", "distance": 0.0023, "similarity": 99.8}
+
+
+def test_batch_payload_keeps_empty_results():
+    payload = batch_payload(["一", "二"], [_neighbors(), EMPTY_NEIGHBORS])
+    assert payload["queries"] == ["一", "二"]
+    assert [len(r) for r in payload["results"]] == [3, 0]
+
+
+def test_dumps_matches_stdlib_compact_json(monkeypatch):
+    obj = search_payload("一", _neighbors())
+    fast = dumps(obj)
+    monkeypatch.setattr(result_codec, "orjson", None)
+    slow = dumps(obj)
+    assert json.loads(fast) == json.loads(slow) == obj
+    assert b" " not in slow and "丁".encode() in slow  # compact, not ASCII-escaped
+
+
+def test_stdlib_fallback_rejects_nan(monkeypatch):
+    monkeypatch.setattr(result_codec, "orjson", None)
+    with pytest.raises(ValueError):
+        dumps({"distance": float("nan")})
+
+
+def test_json_response():
+    r = json_response({"ok": True}, status_code=201)
+    assert r.status_code == 201
+    assert r.media_type == "application/json"
+    assert json.loads(r.body) == {"ok": True}
+
+
+# ---- columnar batch bodies (msgpack / npz) ----
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, result_codec.JSON_TYPE),
+    ("", result_codec.JSON_TYPE),
+    ("*/*", result_codec.JSON_TYPE),
+    ("application/x-npz", result_codec.NPZ_TYPE),
+    ("application/json;q=0.5, application/x-npz", result_codec.NPZ_TYPE),
+    ("application/*;q=0.1, application/x-npz;q=0.2", result_codec.NPZ_TYPE),
+    ("application/*, application/json;q=0", result_codec.MSGPACK_TYPE if result_codec.msgpack else
+     result_codec.NPZ_TYPE),
+    ("text/html", None),
+    ("application/x-npz;q=0", None),
+])
+def test_negotiate_format(accept, expected):
+    assert result_codec.negotiate_format(accept) == expected
+
+
+def test_batch_columns_offsets():
+    cols = result_codec.batch_columns([_neighbors(), EMPTY_NEIGHBORS, Neighbors(["a"], ["0061"], [0.5])])
+    assert cols["offsets"].dtype == np.dtype("<u4")
+    assert cols["offsets"].tolist() == [0, 3, 3, 4]
+    assert cols["codepoints"].tolist() == [0x4E01, 0x4E02, ord("?"), 0x61]
+    assert cols["distances"].dtype == np.dtype("<f4")
+    assert np.allclose(cols["distances"], [0.0023, 0.25, 1.5, 0.5])
+
+
+def test_batch_columns_empty():
+    cols = result_codec.batch_columns([])
+    assert cols["offsets"].tolist() == [0]
+    assert len(cols["codepoints"]) == len(cols["distances"]) == 0
+
+
+def test_npz_roundtrip():
+    body = result_codec.encode_batch(result_codec.NPZ_TYPE, ["一", "二"], [_neighbors(), EMPTY_NEIGHBORS])
+    z = np.load(io.BytesIO(body))
+    assert z["queries"].tolist() == ["一", "二"]
+    assert z["offsets"].tolist() == [0, 3, 3]
+    assert z["codepoints"].tolist()[:2] == [0x4E01, 0x4E02]
+
+
+def test_msgpack_roundtrip():
+    msgpack = pytest.importorskip("msgpack")
+    body = result_codec.encode_batch(result_codec.MSGPACK_TYPE, ["一"], [_neighbors()])
+    m = msgpack.unpackb(body)
+    assert m["queries"] == ["一"]
+    cols = {k: np.frombuffer(m[k], m["dtypes"][k]) for k in ("offsets", "codepoints", "distances")}
+    assert cols["offsets"].tolist() == [0, 3]
+    assert cols["codepoints"].tolist()[:2] == [0x4E01, 0x4E02]
+    assert np.allclose(cols["distances"], [0.0023, 0.25, 1.5])
+
+
+def test_batch_response_406_and_vary():
+    with pytest.raises(HTTPException) as e:
+        result_codec.batch_response("text/html", ["一"], [_neighbors()])
+    assert e.value.status_code == 406
+    r = result_codec.batch_response(None, ["一"], [_neighbors()])
+    assert r.media_type == result_codec.JSON_TYPE
+    assert r.headers["vary"] == "Accept"
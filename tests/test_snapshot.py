@@ -0,0 +1,100 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from embedding_index import EmbeddingIndex
+from snapshot import CHROMA_SQLITE_FILE, NeighborTable, SnapshotDB, save_snapshot, source_identity
+
+
+def _chroma(path, rows):
+    """A chroma.sqlite3 with only the tables source_identity() reads; rows = [(collection, seq_id), ...]."""
+    conn = sqlite3.connect(path / CHROMA_SQLITE_FILE)
+    conn.executescript("""
+        CREATE TABLE collections (id TEXT PRIMARY KEY, name TEXT);
+        CREATE TABLE segments (id TEXT PRIMARY KEY, collection TEXT);
+        CREATE TABLE embeddings (id INTEGER PRIMARY KEY, segment_id TEXT, seq_id INTEGER);
+        INSERT INTO collections VALUES ('c1', 'hanzi_images'), ('c2', 'hanzi_clip');
+        INSERT INTO segments VALUES ('s1', 'c1'), ('s2', 'c2');
+    """)
+    segment = {"hanzi_images": "s1", "hanzi_clip": "s2"}
+    conn.executemany("INSERT INTO embeddings (segment_id, seq_id) VALUES (?, ?)",
+                     [(segment[name], seq) for name, seq in rows])
+    conn.commit()
+    return conn
+
+
+def test_source_identity(tmp_path):
+    assert source_identity(str(tmp_path), "hanzi_images") is None  # no chroma.sqlite3
+    conn = _chroma(tmp_path, [("hanzi_images", 1), ("hanzi_images", 7), ("hanzi_clip", 9)])
+    assert source_identity(str(tmp_path), "hanzi_images") == "count=2 seq=7"
+    assert source_identity(str(tmp_path), "hanzi_clip") == "count=1 seq=9"
+    assert source_identity(str(tmp_path), "missing") == "count=0 seq=0"
+    # a write (even one that keeps the count, e.g. an upsert) changes the identity
+    conn.execute("UPDATE embeddings SET seq_id = 12 WHERE seq_id = 1")
+    conn.commit()
+    assert source_identity(str(tmp_path), "hanzi_images") == "count=2 seq=12"
+    conn.close()
+
+
+def _index(n=6, d=4):
+    rng = np.random.default_rng(1)
+    return EmbeddingIndex([f"{0x4E00 + i:04X}" for i in range(n)], rng.normal(size=(n, d)).astype(np.float32))
+
+
+def test_save_load_roundtrip(tmp_path):
+    index = _index()
+    rows = np.tile(np.arange(1, 4, dtype=np.int32), (6, 1))
+    dists = np.linspace(0, 1, 18, dtype=np.float32).reshape(6, 3)
+    path = tmp_path / "snapshot.npz"
+    save_snapshot(str(path), index, "hanzi_images", rows, dists, source="count=6 seq=6")
+    assert not (tmp_path / ".tmp-snapshot.npz").exists()
+    db = SnapshotDB.load(str(path))
+    assert db.source == "count=6 seq=6"
+    assert db.collection_name == "hanzi_images"
+    assert db.db_path == str(tmp_path)
+    assert db.exact_index.ids == index.ids
+    assert np.allclose(db.exact_index.matrix, index.matrix)
+    assert db.neighbor_table.k == 3
+    assert db.get_stats()["total_images"] == 6
+
+
+def test_load_without_source_or_neighbors(tmp_path):
+    path = tmp_path / "snapshot.npz"
+    save_snapshot(str(path), _index(), "hanzi_images")
+    db = SnapshotDB.load(str(path))
+    assert db.source is None
+    assert db.neighbor_table is None
+
+
+@pytest.mark.parametrize("k, found", [(-1, False), (0, False), (1, True), (3, True), (4, False)])
+def test_neighbor_table_lookup(k, found):
+    table = NeighborTable(np.array([[1, 2, 3], [0, 2, 3]]), np.array([[0.1, 0.2, 0.3], [0.1, 0.4, 0.5]]))
+    result = table.lookup(1, k)
+    if not found:
+        assert result is None
+        return
+    rows, dists = result
+    assert rows.tolist() == [0, 2, 3][:k]
+    assert np.allclose(dists, [0.1, 0.4, 0.5][:k])
+
+
+def test_neighbor_table_shape_mismatch():
+    with pytest.raises(ValueError):
+        NeighborTable(np.zeros((2, 3)), np.zeros((2, 2)))
+
+
+def test_api_detects_stale_snapshot(tmp_path):
+    import api_main
+
+    path = tmp_path / "snapshot.npz"
+    save_snapshot(str(path), _index(), "hanzi_images", source="count=2 seq=7")
+    db = SnapshotDB.load(str(path))
+    # only the snapshot was published: nothing to compare against
+    assert api_main._snapshot_stale(db, str(tmp_path), "hanzi_images") is None
+    conn = _chroma(tmp_path, [("hanzi_images", 1), ("hanzi_images", 7)])
+    assert api_main._snapshot_stale(db, str(tmp_path), "hanzi_images") is None
+    conn.execute("INSERT INTO embeddings (segment_id, seq_id) VALUES ('s1', 8)")
+    conn.commit()
+    conn.close()
+    assert "count=3 seq=8" in api_main._snapshot_stale(db, str(tmp_path), "hanzi_images")
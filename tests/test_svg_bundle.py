@@ -0,0 +1,98 @@
+import gzip
+import os
+
+import pytest
+
+from svg_bundle import MAGIC, SvgBundleReader, SvgBundleWriter, merge_bundles
+
+
+def _write(path, items, codec="none", meta=None):
+    with SvgBundleWriter(str(path), codec=codec, meta=meta) as w:
+        for cp, svg in items:
+            w.add(cp, svg)
+    return str(path)
+
+
+def test_roundtrip_sorted_index_and_meta(tmp_path):
+    path = _write(tmp_path / "g.hzsb", [(0x4E01, "<svg>b</svg>"), (0x41, b"<svg>a</svg>")], meta={"size": 64})
+    with SvgBundleReader(path) as r:
+        assert len(r) == 2
+        assert r.codepoints() == [0x41, 0x4E01]
+        assert r.get(0x41) == b"<svg>a</svg>"
+        assert r.get(0x4E01) == b"<svg>b</svg>"
+        assert r.meta == {"size": 64, "codec": "none", "version": 1}
+
+
+def test_missing_codepoints(tmp_path):
+    path = _write(tmp_path / "g.hzsb", [(0x41, "a"), (0x43, "c")])
+    with SvgBundleReader(path) as r:
+        for cp in (0, 0x42, 0x44, 0x10FFFF):
+            assert cp not in r
+            assert r.get(cp) is None
+            assert r.get_raw(cp) is None
+
+
+def test_empty_bundle(tmp_path):
+    path = _write(tmp_path / "g.hzsb", [])
+    with SvgBundleReader(path) as r:
+        assert len(r) == 0
+        assert r.codepoints() == []
+        assert r.get(0x41) is None
+
+
+def test_duplicate_codepoint_last_write_wins(tmp_path):
+    path = _write(tmp_path / "g.hzsb", [(0x41, "old"), (0x41, "new")])
+    with SvgBundleReader(path) as r:
+        assert len(r) == 1
+        assert r.get(0x41) == b"new"
+
+
+def test_gzip_codec_stores_compressed_payloads(tmp_path):
+    svg = "<svg>" + "M0 0L1 1" * 50 + "</svg>"
+    path = _write(tmp_path / "g.hzsb", [(0x41, svg)], codec="gzip")
+    with SvgBundleReader(path) as r:
+        assert r.codec == "gzip"
+        assert gzip.decompress(r.get_raw(0x41)) == svg.encode()
+        assert r.get(0x41) == svg.encode()
+
+
+def test_unknown_codec_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        SvgBundleWriter(str(tmp_path / "g.hzsb"), codec="lz4")
+
+
+def test_failed_write_leaves_no_file(tmp_path):
+    path = tmp_path / "g.hzsb"
+    with pytest.raises(RuntimeError):
+        with SvgBundleWriter(str(path)) as w:
+            w.add(0x41, "a")
+            raise RuntimeError("boom")
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("data", [b"", MAGIC, b"not a bundle at all, just some bytes"])
+def test_reader_rejects_non_bundles(tmp_path, data):
+    path = tmp_path / "bad.hzsb"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        SvgBundleReader(str(path))
+
+
+def test_merge_shards(tmp_path):
+    a = _write(tmp_path / "a.hzsb", [(0x43, "c"), (0x41, "a")], meta={"size": 128})
+    b = _write(tmp_path / "b.hzsb", [(0x42, "b")], meta={"size": 128})
+    out = str(tmp_path / "all.hzsb")
+    assert merge_bundles([a, b], out) == 3
+    assert not os.path.exists(a) and not os.path.exists(b)
+    with SvgBundleReader(out) as r:
+        assert r.codepoints() == [0x41, 0x42, 0x43]
+        assert [r.get(cp) for cp in (0x41, 0x42, 0x43)] == [b"a", b"b", b"c"]
+        assert r.meta["size"] == 128
+
+
+def test_merge_rejects_mixed_codecs(tmp_path):
+    a = _write(tmp_path / "a.hzsb", [(0x41, "a")])
+    b = _write(tmp_path / "b.hzsb", [(0x42, "b")], codec="gzip")
+    with pytest.raises(ValueError):
+        merge_bundles([a, b], str(tmp_path / "all.hzsb"))
+    assert os.path.exists(a) and os.path.exists(b)
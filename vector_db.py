@@ -1,10 +1,27 @@
 import os
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import chromadb
 import numpy as np
 from tqdm import tqdm
 
+# 集合元数据中的 HNSW 参数（键名 "hnsw:<参数>"）：创建集合时生效，随索引一起保存
+HNSW_PARAMS = ("space", "M", "construction_ef", "search_ef", "num_threads", "batch_size", "sync_threshold",
+               "resize_factor")
+# 元数据键名 -> 集合配置（configuration_json["hnsw"]）中的名称
+_HNSW_CONFIG_NAMES = {"M": "max_neighbors", "construction_ef": "ef_construction", "search_ef": "ef_search"}
+
+
+def hnsw_metadata(params: Optional[Dict] = None) -> Dict:
+    """创建集合用的元数据：默认 cosine 距离，加上给定的 HNSW 参数（值为 None 的使用 Chroma 默认值）"""
+    meta = {"hnsw:space": "cosine"}
+    for name, value in (params or {}).items():
+        if name not in HNSW_PARAMS:
+            raise ValueError(f"unknown HNSW parameter: {name}")
+        if value is not None:
+            meta[f"hnsw:{name}"] = value
+    return meta
+
 
 class ChromaVectorDB:
     """使用ChromaDB作为向量数据库"""
@@ -14,10 +31,19 @@ class ChromaVectorDB:
         db_path: str = "./chroma_db",
         collection_name: str = "hanzi_images",
         allow_memory_fallback: bool = True,
+        hnsw_params: Optional[Dict] = None,
     ):
-        """初始化ChromaDB客户端，确保路径存在且可写，必要时回退到内存模式。"""
+        """初始化ChromaDB客户端，确保路径存在且可写，必要时回退到内存模式。
+
+        hnsw_params: 新建集合时使用的 HNSW 参数（见 HNSW_PARAMS），如 {"M": 32, "construction_ef": 200}。
+        """
         self.collection_name = collection_name
         self.db_path = os.path.abspath(db_path)
+        self.hnsw_params = dict(hnsw_params or {})
+        hnsw_metadata(self.hnsw_params)  # 参数名错误尽早报错
+        self._persistent = False
+        # 可选的内存精确索引（load_exact_index），用于向量化的阈值检索
+        self.exact_index = None
 
         # 确保目录存在并可写
         os.makedirs(self.db_path, exist_ok=True)
@@ -38,6 +64,7 @@ class ChromaVectorDB:
         # 尝试持久化客户端
         try:
             self.client = chromadb.PersistentClient(path=self.db_path)
+            self._persistent = True
         except Exception as e:
             msg = f"无法打开持久化数据库: {self.db_path} ({e})"
             if not allow_memory_fallback:
@@ -53,12 +80,48 @@ class ChromaVectorDB:
         try:
             self.collection = self.client.get_collection(name=self.collection_name)
             print(f"已加载现有集合: {self.collection_name}")
+            if self.hnsw_params:
+                print("警告: 集合已存在，HNSW 构建参数不变（重新构建集合后生效）")
         except Exception:
             self.collection = self.client.create_collection(
-                name=self.collection_name, metadata={"hnsw:space": "cosine"}
+                name=self.collection_name, metadata=hnsw_metadata(self.hnsw_params)
             )
             print(f"创建新集合: {self.collection_name}")
 
+    def recreate_collection(self):
+        """删除并按 hnsw_params 重新创建集合（清空全部数据）"""
+        self.client.delete_collection(self.collection_name)
+        self.exact_index = None
+        self.collection = self.client.create_collection(
+            name=self.collection_name, metadata=hnsw_metadata(self.hnsw_params)
+        )
+
+    def hnsw_config(self) -> Dict:
+        """集合实际使用的 HNSW 参数（space / max_neighbors / ef_construction / ef_search ...）"""
+        try:
+            hnsw = dict((self.collection.configuration_json or {}).get("hnsw") or {})
+        except Exception:
+            hnsw = {}
+        # 旧版 Chroma 没有集合配置：从元数据读取
+        for key, value in (self.collection.metadata or {}).items():
+            if key.startswith("hnsw:"):
+                name = key[len("hnsw:"):]
+                hnsw.setdefault(_HNSW_CONFIG_NAMES.get(name, name), value)
+        return hnsw
+
+    def set_search_ef(self, ef_search: int):
+        """修改集合的 ef_search（写入集合配置）。
+
+        已载入的 HNSW 段沿用打开时的 ef_search，因此持久化客户端随后重新打开；同一目录仍被其他
+        客户端使用时，新值要等这些客户端都关闭后才生效。
+        """
+        self.collection.modify(configuration={"hnsw": {"ef_search": int(ef_search)}})
+        close = getattr(self.client, "close", None)
+        if self._persistent and close is not None:
+            close()
+            self.client = chromadb.PersistentClient(path=self.db_path)
+            self.collection = self.client.get_collection(name=self.collection_name)
+
     def add_images(self, image_paths: List[str], vectors: List[np.ndarray], metadatas: List[Dict]):
         """批量添加图像向量到数据库"""
         ids = [os.path.basename(path).replace(".png", "") for path in image_paths]
@@ -76,14 +139,18 @@ class ChromaVectorDB:
                 ids=ids[i:end_idx],
             )
 
-    def search_similar(self, query_vector: np.ndarray, top_k: int = 10):
-        """搜索相似图像"""
+    def search_similar(self, query_vector: np.ndarray, top_k: int = 10, ef_search: Optional[int] = None):
+        """搜索相似图像
+
+        ef_search: 本次查询的 HNSW 检索宽度。HNSW 按 max(ef_search, n_results) 检索，因此多取候选再截断；
+        低于集合的 ef_search 时无效（全局修改见 set_search_ef）。
+        """
         results = self.collection.query(
-            query_embeddings=[query_vector.tolist()], n_results=top_k
+            query_embeddings=[query_vector.tolist()], n_results=max(top_k, ef_search or 0)
         )
 
         similar_images = []
-        for i in range(len(results["ids"][0])):
+        for i in range(min(top_k, len(results["ids"][0]))):
             similar_images.append(
                 {
                     "id": results["ids"][0][i],
@@ -94,6 +161,59 @@ class ChromaVectorDB:
 
         return similar_images
 
+    def load_exact_index(self, batch_size: int = 5000):
+        """把全部向量载入内存（EmbeddingIndex），之后 search_range 走精确的向量化路径"""
+        from embedding_index import EmbeddingIndex
+
+        self.exact_index = EmbeddingIndex.from_vector_db(self, batch_size)
+        return self.exact_index
+
+    def search_range(self, query_vector: np.ndarray, max_distance: float, max_results: int = 1000,
+                     exclude_id: str | None = None) -> Tuple[List[str], List[float]]:
+        """阈值检索：返回距离 <= max_distance 的全部向量 (ids, distances)，按距离升序，最多 max_results 个"""
+        index = self.exact_index
+        if index is not None:
+            exclude = index.row_of.get(str(exclude_id).upper()) if exclude_id is not None else None
+            rows, dists = index.range_search(index.prepare(query_vector)[0], max_distance, max_results, exclude)
+            return [index.ids[r] for r in rows], dists.tolist()
+
+        # HNSW 只支持 top-k：逐步扩大 n_results，直到最远结果超出半径或达到上限
+        total = self.collection.count()
+        want = max_results + (1 if exclude_id is not None else 0)
+        n = min(total, max(32, min(want, 256)))
+        vec = np.asarray(query_vector, dtype=float).tolist()
+        while True:
+            res = self.collection.query(query_embeddings=[vec], n_results=n, include=["distances"])
+            ids = res["ids"][0]
+            dists = res["distances"][0]
+            if n >= total or n >= want or (dists and dists[-1] > max_distance):
+                break
+            n = min(total, want, n * 4)
+        out_ids: List[str] = []
+        out_dists: List[float] = []
+        for rid, dist in zip(ids, dists):
+            if dist > max_distance:
+                break
+            if exclude_id is not None and str(rid).upper() == str(exclude_id).upper():
+                continue
+            out_ids.append(rid)
+            out_dists.append(float(dist))
+            if len(out_ids) >= max_results:
+                break
+        return out_ids, out_dists
+
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """按 id 一次性批量取向量，返回 (找到的 ids, 矩阵)；不存在的 id 不出现在结果中"""
+        index = self.exact_index
+        if index is not None:
+            found = [i for i in ids if i in index.row_of]
+            return found, index.matrix[[index.row_of[i] for i in found]]
+        res = self.collection.get(ids=list(ids), include=["embeddings"])
+        found = list(res.get("ids") or [])
+        if not found:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return found, np.asarray(res["embeddings"], dtype=np.float32)
+
     def get_embedding_by_id(self, unicode_id: str):
         """根据Unicode ID获取向量"""
         try:
@@ -127,6 +247,57 @@ class ChromaVectorDB:
         # 使用该向量搜索相似项
         return self.search_similar(target_data["embedding"], top_k)
 
+    def distance_space(self) -> str:
+        """集合使用的距离度量：cosine / l2 / ip（Chroma 默认 l2）"""
+        meta = self.collection.metadata or {}
+        space = meta.get("hnsw:space")
+        if not space:
+            try:
+                space = (self.collection.configuration_json or {}).get("hnsw", {}).get("space")
+            except Exception:
+                space = None
+        return space or "l2"
+
+    def iter_embeddings(self, batch_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """分页读出全部向量，每页返回 (ids, float32 矩阵)"""
+        offset = 0
+        while True:
+            page = self.collection.get(limit=batch_size, offset=offset, include=["embeddings"])
+            ids = list(page.get("ids") or [])
+            if not ids:
+                return
+            yield ids, np.asarray(page["embeddings"], dtype=np.float32)
+            offset += len(ids)
+
+    def load_embedding_matrix(self, batch_size: int = 5000) -> Tuple[List[str], np.ndarray]:
+        """一次性读出全部向量，返回 (ids, N×D float32 矩阵)"""
+        all_ids: List[str] = []
+        blocks: List[np.ndarray] = []
+        for ids, emb in self.iter_embeddings(batch_size):
+            all_ids.extend(ids)
+            blocks.append(emb)
+        if not blocks:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return all_ids, np.concatenate(blocks)
+
+    def dimension(self) -> int:
+        """向量维度（取一条向量查看；空集合返回 0）"""
+        page = self.collection.get(limit=1, include=["embeddings"])
+        embeddings = page.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            return 0
+        return len(embeddings[0])
+
+    def close(self):
+        """释放客户端（同一目录的其他客户端仍在使用时，Chroma 按引用计数保留底层实例）"""
+        self.exact_index = None
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"警告: 关闭向量数据库失败: {e}")
+
     def get_stats(self):
         """获取数据库统计信息"""
         count = self.collection.count()